@@ -27,11 +27,14 @@ folders as you wish.
 '''
 # [[[ END_MAIN_PY_DOC ]]]
 
+import argparse
+import signal
 import sys
 import os
+import time
 
 try:
-    from PyQt4 import QtGui
+    from PyQt4 import QtCore, QtGui
 except:
     # The error_out module exits the application with a message to indicate how to fix
     # the problem.  It's complex enough that we moved it to it's own file, but this is
@@ -43,15 +46,539 @@ except:
 # throughout the rest of the framework can perform "regular" imports.
 sys.path.insert(0, os.path.abspath(os.path.dirname(__file__)))
 try:
+    import constants
     from view.qt_configs import qdarkstyle
     from view.display import CitizenPacMainWindow
-    from controller import CitizenPac
+    from controller import CitizenPac, HeadlessCitizenPac
+    from replay import InputRecorder, ReplayLog, ReplayPlayer
+    from botapi import BotServer
+    from shmexport import StateExporter
+    from tracing import Tracer
+    from slowframes import FrameWatchdog
+    from profiling import ProfileSession
+    from allocations import AllocationTracker
+    from leaks import LeakDetector
+    from latency import LatencyProbe
+    from simulation import SimulationDriver
+    from autopilot import Autopilot
+    from frameexport import FrameExporter
+    from soak import SoakRunner
+    from model import Settings
+    from netplay import GameServer, NetClient, NetDriver, parseAddress
+    from spectate import SpectatorServer, SpectatorClient, SpectatorDriver
 except Exception as e:
     sys.stderr.write("Unable to perform all imports: {}\n".format(e))
     sys.exit(1)
 
 
-def main():
+def parseArguments(argv):
+    """
+    Parses the command line options.
+
+    :Parameters:
+        ``argv`` (list)
+            The command line arguments, excluding the program name.
+
+    :Return:
+        :class:`argparse.Namespace`
+            The parsed options.
+    """
+    parser = argparse.ArgumentParser(prog="citizenpac", description="Play CitizenPac.")
+    # A recording always starts from a freshly generated game, so it cannot be combined
+    # with resuming a saved one
+    replay = parser.add_mutually_exclusive_group()
+    replay.add_argument(
+        "--resume", metavar="FILE",
+        help="Restore the game saved in FILE (if it exists), and save the game to FILE "
+             "whenever it is paused or the application exits."
+    )
+    replay.add_argument(
+        "--record", metavar="FILE",
+        help="Record all input to the replay log FILE."
+    )
+    replay.add_argument(
+        "--replay", metavar="FILE",
+        help="Play back the replay log FILE instead of reading the keyboard."
+    )
+    parser.add_argument(
+        "--export-shm", metavar="FILE",
+        help="Publish the state of the game every tick into the memory mapped FILE, "
+             "e.g. /dev/shm/citizenpac (see the shmexport module)."
+    )
+    parser.add_argument(
+        "--bot-server", metavar="NAME",
+        help="Let bots play through the local socket NAME (see the botapi module)."
+    )
+    parser.add_argument(
+        "--spectate-server", metavar="NAME",
+        help="Stream the game to any number of --spectate windows through the local "
+             "socket NAME (see the spectate module).  Also works with --serve."
+    )
+    parser.add_argument(
+        "--trace", metavar="FILE", default=os.environ.get("CITIZENPAC_TRACE"),
+        help="Record how long every phase of every tick takes, and write it to FILE "
+             "in the Chrome trace event format on exit (see the tracing module).  "
+             "Defaults to the CITIZENPAC_TRACE environment variable."
+    )
+    parser.add_argument(
+        "--watchdog", metavar="FILE",
+        help="Sample the stack of every tick or paint that overruns the time budget, and "
+             "log the samples as collapsed stacks to the rotating log FILE (see the "
+             "slowframes module)."
+    )
+    parser.add_argument(
+        "--watchdog-threshold", metavar="N", type=float,
+        help="With --watchdog: the budget, in multiples of the game refresh rate "
+             "(default: constants.WATCHDOG_THRESHOLD)."
+    )
+    parser.add_argument(
+        "--profile", metavar="DIR",
+        help="Profile the game with cProfile from the first press of the space bar (or "
+             "the start of --replay), and write pstats, module totals and collapsed "
+             "stacks for flame graphs to DIR (see the profiling module)."
+    )
+    parser.add_argument(
+        "--profile-seconds", metavar="N", type=float,
+        help="With --profile: stop profiling after N seconds (default: "
+             "constants.PROFILE_SECONDS, or the whole recording with --replay)."
+    )
+    parser.add_argument(
+        "--allocations", metavar="FILE",
+        help="Measure the memory allocated per tick and per paint with tracemalloc, "
+             "from the first tick on, and write a report to FILE (see the allocations "
+             "module)."
+    )
+    parser.add_argument(
+        "--allocation-ticks", metavar="N", type=int,
+        help="With --allocations: the number of ticks to measure (default: "
+             "constants.ALLOCATION_WINDOW_TICKS)."
+    )
+    parser.add_argument(
+        "--allocation-budget", metavar="BYTES", type=int,
+        help="With --allocations: fail (exit code 1) if the 95th percentile tick "
+             "allocates more than BYTES."
+    )
+    parser.add_argument(
+        "--leaks", metavar="FILE",
+        help="Take a heap snapshot at the start, after every lost life and when the game "
+             "is won, and log them and whatever keeps growing between them to FILE (see "
+             "the leaks module)."
+    )
+    parser.add_argument(
+        "--latency", metavar="FILE",
+        help="Measure how long movement keys take to show up on screen, and write the "
+             "distribution to FILE on exit (see the latency module)."
+    )
+    parser.add_argument(
+        "--threaded", action="store_true",
+        help="Advance the game on a worker thread at a fixed rate, and only show its "
+             "latest state in the window (see the simulation module)."
+    )
+    parser.add_argument(
+        "--soak", metavar="FILE",
+        help="Let the autopilot play game after game through the same calls as the "
+             "keyboard, and log tick times, memory and live Qt objects to the CSV FILE "
+             "every --soak-interval seconds (see the soak module).  With --headless, "
+             "without a window and rendering every tick offscreen."
+    )
+    parser.add_argument(
+        "--soak-interval", metavar="SECONDS", type=float,
+        default=constants.SOAK_INTERVAL,
+        help="With --soak: the seconds between two samples (default: %(default)s)."
+    )
+    parser.add_argument(
+        "--soak-seconds", metavar="N", type=float,
+        help="With --soak: stop after N seconds, and fail (exit code 1) if anything "
+             "drifted (default: run until closed or interrupted)."
+    )
+    parser.add_argument(
+        "--soak-max-rss", metavar="MB", type=float,
+        default=constants.SOAK_MAX_RSS_GROWTH / (1024.0 * 1024.0),
+        help="With --soak: flag resident memory growth beyond MB (default: "
+             "%(default)s)."
+    )
+    parser.add_argument(
+        "--soak-max-qt", metavar="N", type=int, default=constants.SOAK_MAX_QT_GROWTH,
+        help="With --soak: flag growth of the live Qt objects beyond N (default: "
+             "%(default)s)."
+    )
+    parser.add_argument(
+        "--soak-max-slowdown", metavar="X", type=float,
+        default=constants.SOAK_MAX_TICK_SLOWDOWN,
+        help="With --soak: flag a 95th percentile tick X times slower than at the start "
+             "(default: %(default)s)."
+    )
+    parser.add_argument(
+        "--headless", action="store_true",
+        help="With --replay, --autopilot or --soak: play without a window, as fast as "
+             "possible, and print how long it took."
+    )
+    parser.add_argument(
+        "--autopilot", metavar="SECONDS", type=float,
+        help="With --headless, instead of --replay: let the autopilot play a new game "
+             "for up to SECONDS seconds of game time."
+    )
+    export = parser.add_mutually_exclusive_group()
+    export.add_argument(
+        "--export", metavar="DIR",
+        help="With --headless: render the game and write the frames as PNG files to DIR "
+             "(see the frameexport module)."
+    )
+    export.add_argument(
+        "--export-pipe", metavar="COMMAND",
+        help="With --headless: render the game and write the raw frames to the standard "
+             "input of the shell COMMAND, e.g. ffmpeg (see the frameexport module)."
+    )
+    parser.add_argument(
+        "--export-fps", metavar="N", type=float, default=constants.EXPORT_FPS,
+        help="With --export or --export-pipe: the frames per second of game time "
+             "(default: %(default)s)."
+    )
+    parser.add_argument(
+        "--seek", metavar="TICK", type=int,
+        help="With --replay: jump to TICK before playing back the rest."
+    )
+    net = parser.add_mutually_exclusive_group()
+    net.add_argument(
+        "--serve", metavar="[HOST:]PORT",
+        help="Run a networked game without a window, for --players players who join "
+             "on the UDP port PORT of localhost (or HOST) with --connect (see the "
+             "netplay module)."
+    )
+    net.add_argument(
+        "--connect", metavar="HOST:PORT",
+        help="Join the networked game served at HOST:PORT, and play it in the window."
+    )
+    net.add_argument(
+        "--spectate", metavar="NAME",
+        help="Watch the game streamed on the local socket NAME by --spectate-server, "
+             "in the window."
+    )
+    parser.add_argument(
+        "--players", metavar="N", type=int,
+        help="With --serve: the number of players, i.e. of CitizenPacs (default: "
+             "{}).".format(constants.NET_PLAYERS)
+    )
+    parser.add_argument(
+        "--net-seconds", metavar="N", type=float,
+        help="With --serve, --connect or --spectate: quit after N seconds."
+    )
+    args = parser.parse_args(argv)
+    if args.seek is not None and not args.replay:
+        parser.error("--seek requires --replay")
+    if args.autopilot is not None and (args.replay or not args.headless):
+        parser.error("--autopilot requires --headless, and cannot be combined with "
+                     "--replay")
+    if args.headless and not args.replay and args.autopilot is None and not args.soak:
+        parser.error("--headless requires --replay, --autopilot or --soak")
+    if args.soak_seconds is not None and not args.soak:
+        parser.error("--soak-seconds requires --soak")
+    # A soak run plays (and restarts) fresh games on its own
+    notSoak = ["--" + name.replace("_", "-") for name in
+               ("resume", "record", "replay", "threaded") if getattr(args, name)]
+    if args.autopilot is not None:
+        notSoak.append("--autopilot")
+    if args.soak and notSoak:
+        parser.error("--soak cannot be combined with {}".format(", ".join(notSoak)))
+    if (args.export or args.export_pipe) and not args.headless:
+        parser.error("--export and --export-pipe require --headless")
+    if args.export_fps <= 0:
+        parser.error("--export-fps must be positive")
+    if args.watchdog_threshold is not None and not args.watchdog:
+        parser.error("--watchdog-threshold requires --watchdog")
+    if args.profile_seconds is not None and not args.profile:
+        parser.error("--profile-seconds requires --profile")
+    if (args.allocation_ticks is not None or args.allocation_budget is not None) and \
+            not args.allocations:
+        parser.error("--allocation-ticks and --allocation-budget require --allocations")
+    if args.latency and args.replay:
+        parser.error("--latency measures keyboard input, which --replay ignores")
+    # The scene does not tick while the worker thread plays, nothing would be observed
+    perTick = ["--" + name.replace("_", "-") for name in
+               ("record", "replay", "export_shm", "bot_server", "spectate_server",
+                "profile", "allocations", "leaks", "latency") if getattr(args, name)]
+    if args.threaded and perTick:
+        parser.error("--threaded cannot be combined with options that observe every "
+                     "tick: {}".format(", ".join(perTick)))
+    if args.players is not None and not args.serve:
+        parser.error("--players requires --serve")
+    if args.players is not None and not 1 <= args.players <= 255:
+        parser.error("--players must be between 1 and 255")
+    if args.net_seconds is not None and not (args.serve or args.connect or
+                                             args.spectate):
+        parser.error("--net-seconds requires --serve, --connect or --spectate")
+    if args.spectate_server and args.headless:
+        parser.error("--spectate-server requires the event loop, it cannot be combined "
+                     "with --headless")
+    # Only the server advances a networked game, nothing else may drive or observe it
+    notNet = ["--" + name.replace("_", "-") for name in
+              ("resume", "record", "replay", "threaded", "soak", "headless", "export",
+               "export_pipe", "seek") if getattr(args, name)] + perTick
+    if args.autopilot is not None:
+        notNet.append("--autopilot")
+    if args.serve and args.watchdog:
+        notNet.append("--watchdog")
+    if args.serve and args.spectate_server:
+        # The server ticks the scene, spectators can watch it
+        notNet.remove("--spectate-server")
+    if (args.serve or args.connect or args.spectate) and notNet:
+        parser.error("--serve, --connect and --spectate cannot be combined with "
+                     "{}".format(", ".join(sorted(set(notNet)))))
+    try:
+        if args.serve:
+            args.serve = parseAddress(args.serve)
+        if args.connect:
+            args.connect = parseAddress(args.connect, None)
+    except RuntimeError as e:
+        parser.error(str(e))
+    return args
+
+
+def trackAllocations(args, game):
+    """
+    Creates the :class:`allocations.AllocationTracker` asked for by ``args``.
+
+    :Return:
+        :class:`allocations.AllocationTracker`
+            The tracker, ``None`` if tracemalloc is not available (this is reported on
+            ``stderr``).
+    """
+    ticks = args.allocation_ticks
+    if ticks is None:
+        ticks = constants.ALLOCATION_WINDOW_TICKS
+    try:
+        return AllocationTracker(game.scene, args.allocations, ticks,
+                                 args.allocation_budget)
+    except RuntimeError as e:
+        sys.stderr.write("{}\n".format(e))
+        return None
+
+
+def soakRunner(args, game, offscreen):
+    """
+    :Return:
+        :class:`soak.SoakRunner`
+            The soak run asked for by ``args``, playing ``game``.
+    """
+    return SoakRunner(game, args.soak, args.soak_interval,
+                      int(args.soak_max_rss * 1024 * 1024), args.soak_max_qt,
+                      args.soak_max_slowdown, offscreen)
+
+
+def playAutopilot(game, seconds):
+    """
+    Lets the autopilot play ``game``, resuming it after every lost life, until it is won
+    or lost or ``seconds`` seconds of game time have passed.
+
+    :Return:
+        ``int``
+            The number of ticks that were played.
+    """
+    Autopilot(game)
+    scene    = game.scene
+    maxTicks = int(seconds * 1000.0 / game.settings.refreshRate)
+    while scene.tick < maxTicks and not game.gameFinished and game.livesLeft > 0:
+        # Paused at the start, and after every lost life
+        game.gameRunningSwitched()
+        game.run(maxTicks - scene.tick)
+    return scene.tick
+
+
+def playHeadless(args):
+    """
+    Plays back the replay log ``args.replay`` (or lets the autopilot play a new game, or
+    soak) without a window, as fast as possible, and reports the outcome and the number
+    of ticks per second on ``stdout``.
+
+    :Parameters:
+        ``args`` (:class:`argparse.Namespace`)
+            The parsed command line options.
+
+    :Return:
+        ``int``
+            The exit code, ``1`` if the allocation budget was exceeded or could not be
+            checked, if there are possible leaks, if the frames could not be exported or
+            if the soak run drifted, ``0`` otherwise.
+    """
+    # A QApplication is still required for the scene, but it does not need a display
+    app    = QtGui.QApplication([], False)  # noqa F841
+    player = None
+    if args.replay:
+        log    = ReplayLog.load(args.replay)
+        game   = HeadlessCitizenPac(log.width, log.height, log.seed)
+        game.setRewindEnabled(False)
+        player = ReplayPlayer(game, log)
+        if args.seek is not None:
+            player.seek(args.seek)
+    else:
+        game = HeadlessCitizenPac(*constants.HEADLESS_BOARD)
+        # Like in the window, the kiosk keeps its history while soaking
+        game.setRewindEnabled(bool(args.soak))
+    if args.trace:
+        game.setTracer(Tracer(args.trace))
+    if args.profile:
+        profile = ProfileSession(game, args.profile, args.profile_seconds,
+                                 player.finished if player else None)
+        profile.start()
+    if args.allocations:
+        tracker = trackAllocations(args, game)
+        if tracker is None:
+            return 1
+    if args.leaks:
+        leaks = LeakDetector(game, args.leaks)
+    exporter = None
+    if args.export or args.export_pipe:
+        try:
+            exporter = FrameExporter(game, args.export, args.export_pipe,
+                                     args.export_fps)
+        except (RuntimeError, OSError) as e:
+            sys.stderr.write("{}\n".format(e))
+            return 1
+    soak = None
+    if args.soak:
+        soak = soakRunner(args, game, True)
+
+    failed  = False
+    start   = time.time()
+    if player:
+        ticks = player.run()
+    elif soak:
+        ticks = soak.run(args.soak_seconds)
+    else:
+        ticks = playAutopilot(game, args.autopilot)
+    if exporter is not None:
+        try:
+            exporter.close()
+        except RuntimeError as e:
+            # A frame could not be exported
+            sys.stderr.write("{}\n".format(e))
+            failed = True
+    elapsed = max(time.time() - start, 1e-9)
+    if args.trace:
+        game.scene.tracer.close()
+    if args.profile:
+        profile.stop()
+    if args.allocations:
+        tracker.finish()
+    if args.leaks:
+        leaks.close()
+    if soak:
+        soak.close()
+
+    sys.stdout.write(
+        "{} {} ticks in {:.3f}s ({:.0f} ticks/s).  Final tick {}, lives left {}, "
+        "food eaten {}/{}.\n".format("Played back" if player else "Played", ticks,
+                                     elapsed, ticks / elapsed, game.scene.tick,
+                                     game.livesLeft, game.scene.numFoodEaten(),
+                                     len(game.scene.food))
+    )
+    if soak:
+        sys.stdout.write("Soaked {} games ({} won, {} lost, {} lives lost).\n".format(
+            soak.games, soak.wins, soak.losses, soak.livesLost
+        ))
+    elif not player:
+        sys.stdout.write("The autopilot played seed {}.\n".format(game.seed))
+    if exporter is not None and not failed:
+        video = exporter.frames / exporter.fps
+        sys.stdout.write(
+            "Exported {} frames of {}x{} ({:.1f}s at {:g} fps), {:.1f}x real time.\n"
+            .format(exporter.frames, exporter.width, exporter.height, video,
+                    exporter.fps, video / elapsed)
+        )
+    if failed:
+        return 1
+    try:
+        if args.allocations:
+            tracker.check()
+        if args.leaks:
+            leaks.check()
+        if soak:
+            soak.check()
+    except RuntimeError as e:
+        sys.stderr.write("{}\n".format(e))
+        return 1
+    return 0
+
+
+def serve(args):
+    """
+    Runs the server of a networked game (``--serve``) without a window, until it is
+    interrupted (``Ctrl+C``) or ``args.net_seconds`` seconds have passed, and reports how
+    much was sent to every player on ``stdout``.
+
+    :Parameters:
+        ``args`` (:class:`argparse.Namespace`)
+            The parsed command line options.
+
+    :Return:
+        ``int``
+            The exit code, ``1`` if the server could not be started, ``0`` otherwise.
+    """
+    app      = QtGui.QApplication([], False)
+    settings = Settings()
+    settings.numPlayers = args.players if args.players is not None else \
+        constants.NET_PLAYERS
+    game = HeadlessCitizenPac(*constants.HEADLESS_BOARD, settings=settings)
+    # Nobody can rewind a game that others are playing
+    game.setRewindEnabled(False)
+    if args.trace:
+        game.setTracer(Tracer(args.trace))
+    try:
+        server = GameServer(game, args.serve[1], args.serve[0])
+    except RuntimeError as e:
+        sys.stderr.write("{}\n".format(e))
+        return 1
+    spectators = None
+    if args.spectate_server:
+        try:
+            spectators = SpectatorServer(game, args.spectate_server)
+        except RuntimeError as e:
+            server.close()
+            sys.stderr.write("{}\n".format(e))
+            return 1
+        sys.stdout.write("Spectators can connect to [{}].\n".format(
+            spectators.fullServerName()
+        ))
+
+    # The timer runs Python code every tick, which is when the handler gets to run
+    signal.signal(signal.SIGINT, lambda *_: app.quit())
+    if args.net_seconds is not None:
+        QtCore.QTimer.singleShot(int(args.net_seconds * 1000), app.quit)
+    sys.stdout.write("Serving seed {} for {} players on [{}:{}].\n".format(
+        game.seed, settings.numPlayers, args.serve[0], server.port()
+    ))
+    sys.stdout.flush()
+    server.start()
+    app.exec_()
+    server.close()
+    if spectators is not None:
+        spectatorReport = spectators.report()
+        spectators.close()
+    if args.trace:
+        game.scene.tracer.close()
+
+    sys.stdout.write("Served {} ticks, lives left {}, food eaten {}/{}.\n".format(
+        game.scene.tick, game.livesLeft, game.scene.numFoodEaten(), len(game.scene.food)
+    ))
+    for report in server.report():
+        sys.stdout.write(
+            "Player {} ({}): {} packets, {} bytes in {:.1f}s, {:.0f} bytes/s.\n".format(
+                report["player"] + 1, report["address"], report["packets"],
+                report["bytes"], report["seconds"], report["bytesPerSecond"]
+            )
+        )
+    if spectators is not None:
+        sys.stdout.write(
+            "Streamed {} frames ({} keyframes), {} bytes to {} spectators, {} frames "
+            "skipped.\n".format(spectatorReport["frames"], spectatorReport["keyframes"],
+                                spectatorReport["bytesEncoded"],
+                                spectatorReport["spectators"],
+                                spectatorReport["framesSkipped"])
+        )
+    return 0
+
+
+def main(argv=None):
     """
     PyQt does not delete objects in the right order reliably, occasionally it can raise
     a segmentation fault (among other errors) upon exit of the program.
@@ -59,7 +586,17 @@ def main():
     By placing everything in a self contained method and calling that from below in the
     ``if __name__ == "__main__"`` block, we force that this method completes execution
     and bypass this problem.
+
+    :Parameters:
+        ``argv`` (list)
+            The command line arguments, defaults to ``sys.argv[1:]``.
     """
+    args = parseArguments(sys.argv[1:] if argv is None else argv)
+    if args.headless:
+        return playHeadless(args)
+    if args.serve:
+        return serve(args)
+
     ####################################################################################
     # Is the game running slowly?  Un-comment the line below this.                     #
     # QtGui.QApplication.setGraphicsSystem("raster")                                   #
@@ -68,12 +605,164 @@ def main():
     app.setStyleSheet(qdarkstyle.load_stylesheet(pyside=False))
 
     cpMainWindow = CitizenPacMainWindow()
-    controller = CitizenPac(app, cpMainWindow)  # noqa F841
+    if args.replay:
+        log        = ReplayLog.load(args.replay)
+        controller = CitizenPac(app, cpMainWindow, seed=log.seed,
+                                sceneSize=(log.width, log.height))
+    elif args.connect or args.spectate:
+        try:
+            if args.connect:
+                client = NetClient(*args.connect)
+            else:
+                client = SpectatorClient(args.spectate)
+        except RuntimeError as e:
+            sys.stderr.write("{}\n".format(e))
+            return 1
+        # The same board as the server's
+        settings = Settings()
+        settings.numPlayers = client.numPlayers
+        controller = CitizenPac(app, cpMainWindow, seed=client.seed,
+                                sceneSize=(client.width, client.height),
+                                settings=settings)
+        role = "player {}".format(client.player + 1) if args.connect else "spectator"
+        cpMainWindow.setWindowTitle("{} - {}".format(cpMainWindow.windowTitle(), role))
+    else:
+        controller = CitizenPac(app, cpMainWindow)
+
+    if args.trace:
+        tracer = Tracer(args.trace)
+        controller.setTracer(tracer)
+        app.aboutToQuit.connect(tracer.close)
+
+    if args.watchdog:
+        watchdog = FrameWatchdog(controller.scene, args.watchdog, args.watchdog_threshold)
+        controller.watchFrames(watchdog)
+        app.aboutToQuit.connect(watchdog.close)
+
+    # Kiosk mode: pick up where the previous run left off
+    if args.resume:
+        if os.path.exists(args.resume):
+            try:
+                controller.restoreState(args.resume)
+            except Exception as e:
+                sys.stderr.write("Unable to resume from [{}]: {}\n".format(args.resume, e))
+        controller.statePath = args.resume
+        app.aboutToQuit.connect(lambda: controller.saveState(args.resume))
+
+    if args.threaded:
+        driver = SimulationDriver(controller)
+        app.aboutToQuit.connect(driver.close)
+
+    if args.connect or args.spectate:
+        driverClass = NetDriver if args.connect else SpectatorDriver
+        netDriver   = driverClass(controller, client)
+        app.aboutToQuit.connect(netDriver.close)
+        if args.net_seconds is not None:
+            QtCore.QTimer.singleShot(int(args.net_seconds * 1000), app.quit)
+
+    if args.record or args.replay:
+        # Replay logs only ever move forward
+        controller.setRewindEnabled(False)
+    if args.record:
+        recorder = InputRecorder(controller, args.record)
+        app.aboutToQuit.connect(recorder.close)
+    elif args.replay:
+        player = ReplayPlayer(controller, log)
+        if args.seek is not None:
+            player.seek(args.seek)
+        player.start()
+
+    if args.profile:
+        if args.replay:
+            profile = ProfileSession(controller, args.profile, args.profile_seconds,
+                                     player.finished)
+            profile.start()
+        else:
+            seconds = args.profile_seconds
+            if seconds is None:
+                seconds = constants.PROFILE_SECONDS
+            profile = ProfileSession(controller, args.profile, seconds)
+        app.aboutToQuit.connect(profile.stop)
+
+    if args.allocations:
+        tracker = trackAllocations(args, controller)
+        if tracker is None:
+            return 1
+        controller.watchFrames(tracker)
+        app.aboutToQuit.connect(tracker.finish)
+
+    if args.leaks:
+        leaks = LeakDetector(controller, args.leaks)
+        app.aboutToQuit.connect(leaks.close)
+
+    if args.latency:
+        probe = LatencyProbe(controller.scene, args.latency)
+        controller.watchFrames(probe)
+        app.aboutToQuit.connect(probe.close)
+
+    if args.soak:
+        soak = soakRunner(args, controller, False)
+        app.aboutToQuit.connect(soak.close)
+        if args.soak_seconds is not None:
+            QtCore.QTimer.singleShot(int(args.soak_seconds * 1000), app.quit)
+
+    if args.export_shm:
+        exporter = StateExporter(controller, args.export_shm)
+        app.aboutToQuit.connect(exporter.close)
+
+    if args.bot_server:
+        try:
+            botServer = BotServer(controller, args.bot_server)
+        except RuntimeError as e:
+            sys.stderr.write("{}\n".format(e))
+            return 1
+        sys.stdout.write("Bots can connect to [{}].\n".format(botServer.fullServerName()))
+        app.aboutToQuit.connect(botServer.close)
+
+    if args.spectate_server:
+        try:
+            spectators = SpectatorServer(controller, args.spectate_server)
+        except RuntimeError as e:
+            sys.stderr.write("{}\n".format(e))
+            return 1
+        sys.stdout.write("Spectators can connect to [{}].\n".format(
+            spectators.fullServerName()
+        ))
+        app.aboutToQuit.connect(spectators.close)
 
     cpMainWindow.show()
     cpMainWindow.raise_()
     # cpMainWindow.setActiveWindow()
-    return app.exec_()
+    if args.soak:
+        soak.start()
+    code = app.exec_()
+    if args.connect:
+        report = client.report()
+        sys.stdout.write(
+            "Received {} packets, {} bytes in {:.1f}s, {:.0f} bytes/s ({} full "
+            "snapshots).  Latency p50 {:.1f}ms, p95 {:.1f}ms, p99 {:.1f}ms.\n".format(
+                report["packets"], report["bytes"], report["seconds"],
+                report["bytesPerSecond"], report["fullSnapshots"], *report["latency"]
+            )
+        )
+    elif args.spectate:
+        report = client.report()
+        sys.stdout.write(
+            "Received {} frames ({} keyframes), {} bytes in {:.1f}s, {:.0f} "
+            "bytes/s.\n".format(report["frames"], report["keyframes"], report["bytes"],
+                                report["seconds"], report["bytesPerSecond"])
+        )
+    if args.connect or args.spectate:
+        if client.closed:
+            sys.stderr.write("{}\n".format(client.closed))
+
+    if args.soak and args.soak_seconds is not None:
+        try:
+            soak.check()
+        except RuntimeError as e:
+            sys.stderr.write("{}\n".format(e))
+            return 1
+    return code
 
 
 if __name__ == '__main__':
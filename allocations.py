@@ -0,0 +1,261 @@
+'''
+The ``allocations`` module measures how much memory the game allocates per tick and
+per paint, which is what drives the garbage collector pauses felt as stutter.  An
+:class:`allocations.AllocationTracker` uses ``tracemalloc`` over a window of
+``ticks`` ticks, starting with the first tick, and then writes a report:
+
+- per tick and per paint, the *peak*: the most memory in use at any moment during the
+  tick above what was in use when it started.  Temporaries (``QPointF``,
+  ``QPainterPath``, ...) count here even though they are freed before the tick ends.
+  Only available where ``tracemalloc`` can reset its peak (Python 3.9 or newer).
+- per tick and per paint, what is *retained*: the memory still in use when it ends.
+- per source line of the game, the memory allocated during the window and still in use
+  at its end.
+- the number of garbage collections per generation (Python 3.4 or newer).
+
+The ``tracemalloc`` module is part of Python 3.4 and newer; on Python 2 it requires
+``pytracemalloc`` and a patched interpreter.  Tracing slows the game down a lot, so the
+absolute tick rate during the window means nothing.
+
+In tests, give a budget and call :func:`allocations.AllocationTracker.check`:
+
+.. code-block:: py
+
+   tracker = AllocationTracker(game.scene, ticks=500, budget=4096)
+   ReplayPlayer(game, log).run(500)
+   tracker.finish()
+   tracker.check()  # raises a RuntimeError if the budget was exceeded
+'''
+
+import gc
+import os
+
+import constants
+from model import SceneObserver
+from perfstats import RollingSamples
+
+try:
+    import tracemalloc
+except ImportError:
+    # Python 2 without pytracemalloc
+    tracemalloc = None
+
+__all__ = ["AllocationTracker"]
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+''' Only allocations made by files below this directory are reported per line. '''
+
+TOP_LINES = 25
+''' How many source lines the report lists. '''
+
+
+def _gcCollections():
+    # gc.get_stats() is Python 3.4 or newer
+    if not hasattr(gc, "get_stats"):
+        return None
+    return [generation["collections"] for generation in gc.get_stats()]
+
+
+class AllocationTracker(SceneObserver):
+    '''
+    Measures the allocations of ``scene`` over its next ``ticks`` ticks, see the module
+    documentation.  Paints are only measured if they are reported to it, see
+    :func:`controller.GameController.watchFrames`.
+
+    :Parameters:
+        ``scene`` (:class:`model.Scene`)
+            The scene to measure.  The tracker registers itself.
+
+        ``path`` (str)
+            The file to write the report to when the window is over, ``None`` for none.
+
+        ``ticks`` (int)
+            The length of the window.
+
+        ``budget`` (int)
+            The most bytes the 95th percentile tick may allocate (its peak, or what it
+            retains where the peak is not available), see
+            :func:`allocations.AllocationTracker.check`.  ``None`` for no budget.
+
+        ``frames`` (int)
+            How many frames of every allocation's traceback ``tracemalloc`` stores, if
+            this tracker starts it.
+
+    :Attributes:
+        ``state`` (str)
+            ``"waiting"``, ``"measuring"`` or ``"done"``.
+
+        ``tickPeaks`` / ``tickRetained`` / ``paintPeaks`` / ``paintRetained``
+        (:class:`perfstats.RollingSamples`)
+            The bytes per tick / paint.
+
+        ``lines`` (list)
+            Once done, the :class:`tracemalloc.StatisticDiff` of the game's source lines
+            that retained the most memory.
+
+        ``collections`` (list)
+            Once done, the number of garbage collections per generation during the
+            window, ``None`` if unknown.
+    '''
+    def __init__(self, scene, path=None, ticks=constants.ALLOCATION_WINDOW_TICKS,
+                 budget=None, frames=1):
+        if tracemalloc is None:
+            raise RuntimeError(
+                "Tracking allocations requires the tracemalloc module (Python 3.4 or "
+                "newer, or pytracemalloc)."
+            )
+        self.scene         = scene
+        self.path          = path
+        self.ticks         = ticks
+        self.budget        = budget
+        self.frames        = frames
+        self.hasPeak       = hasattr(tracemalloc, "reset_peak")
+        self.tickPeaks     = RollingSamples(ticks)
+        self.tickRetained  = RollingSamples(ticks)
+        self.paintPeaks    = RollingSamples(ticks)
+        self.paintRetained = RollingSamples(ticks)
+        self.state         = "waiting"
+        self.lines         = []
+        self.collections   = None
+        self.mark          = 0
+        self.tracing       = False
+        self.before        = None
+        self.gcBefore      = None
+        scene.addObserver(self)
+
+    def __begin(self):
+        self.state = "measuring"
+        if not tracemalloc.is_tracing():
+            tracemalloc.start(self.frames)
+            self.tracing = True
+        self.gcBefore = _gcCollections()
+        self.before   = tracemalloc.take_snapshot()
+
+    def __start(self):
+        if self.hasPeak:
+            tracemalloc.reset_peak()
+        self.mark = tracemalloc.get_traced_memory()[0]
+
+    def __record(self, peaks, retained):
+        current, peak = tracemalloc.get_traced_memory()
+        if self.hasPeak:
+            peaks.add(peak - self.mark)
+        retained.add(current - self.mark)
+
+    def tickStarted(self, scene):
+        if self.state == "waiting":
+            self.__begin()
+        if self.state == "measuring":
+            self.__start()
+
+    def tickFinished(self, scene):
+        if self.state != "measuring":
+            return
+        self.__record(self.tickPeaks, self.tickRetained)
+        if self.tickRetained.count >= self.ticks:
+            self.finish()
+
+    def paintStarted(self):
+        '''
+        Marks the start of a paint, see :class:`tracing.PaintTracer`.
+        '''
+        if self.state == "measuring":
+            self.__start()
+
+    def paintFinished(self, start, end):
+        '''
+        Records the paint that just finished, see :class:`tracing.PaintTracer`.
+        '''
+        if self.state == "measuring":
+            self.__record(self.paintPeaks, self.paintRetained)
+
+    def finish(self):
+        '''
+        Ends the window early (or on time), and writes the report.  Calling this more
+        than once, or before the first tick, does nothing.
+        '''
+        if self.state != "measuring":
+            return
+        self.state = "done"
+        self.scene.removeObserver(self)
+
+        after    = tracemalloc.take_snapshot()
+        gcAfter  = _gcCollections()
+        if self.tracing:
+            tracemalloc.stop()
+        if self.gcBefore is not None and gcAfter is not None:
+            self.collections = [b - a for a, b in zip(self.gcBefore, gcAfter)]
+
+        # The game's own files, except for this one
+        game        = [tracemalloc.Filter(True, os.path.join(ROOT, "*")),
+                       tracemalloc.Filter(False, os.path.join(ROOT, "allocations.py"))]
+        stats       = after.filter_traces(game).compare_to(
+            self.before.filter_traces(game), "lineno"
+        )
+        self.lines  = [stat for stat in stats if stat.size_diff][:TOP_LINES]
+        self.before = None
+
+        if self.path is not None:
+            with open(self.path, "w") as f:
+                f.write(self.report())
+
+    def worstTick(self):
+        '''
+        :Return:
+            ``float``
+                The 95th percentile of the bytes allocated per tick: the peak, or what
+                is retained where the peak is not available.
+        '''
+        samples = self.tickPeaks if self.hasPeak else self.tickRetained
+        return samples.percentiles(95)[0]
+
+    def check(self):
+        '''
+        Raises a ``RuntimeError`` if the ``budget`` was exceeded.
+        '''
+        if self.budget is not None and self.worstTick() > self.budget:
+            raise RuntimeError(
+                "The 95th percentile tick allocated {:.0f} bytes, over the budget of {} "
+                "bytes.".format(self.worstTick(), self.budget)
+            )
+
+    def report(self):
+        '''
+        :Return:
+            ``str``
+                The human readable report.
+        '''
+        out = ["Allocations over {} ticks and {} paints.".format(
+            min(self.tickRetained.count, self.ticks), self.paintRetained.count
+        ), "", "{:<24} {:>12} {:>12} {:>12}".format("bytes", "p50", "p95", "max")]
+        rows = [("tick peak", self.tickPeaks), ("tick retained", self.tickRetained),
+                ("paint peak", self.paintPeaks), ("paint retained", self.paintRetained)]
+        for name, samples in rows:
+            if samples.count == 0:
+                continue
+            out.append("{:<24} {:>12.0f} {:>12.0f} {:>12.0f}".format(
+                name, *samples.percentiles(50, 95, 100)
+            ))
+        if not self.hasPeak:
+            out.append("(peaks require Python 3.9 or newer)")
+
+        if self.collections is not None:
+            out.append("")
+            out.append("Garbage collections per generation: {}".format(
+                ", ".join(str(n) for n in self.collections)
+            ))
+        if self.budget is not None:
+            out.append("")
+            out.append("Budget: {} bytes per tick (p95), {}.".format(
+                self.budget, "exceeded" if self.worstTick() > self.budget else "met"
+            ))
+
+        out.append("")
+        out.append("Retained at the end of the window, by line:")
+        for stat in self.lines:
+            frame = stat.traceback[0]
+            out.append("  {}:{:<6} {:>+12} B {:>+8} blocks".format(
+                os.path.relpath(frame.filename, ROOT), frame.lineno, stat.size_diff,
+                stat.count_diff
+            ))
+        return "\n".join(out) + "\n"
@@ -0,0 +1,124 @@
+'''
+The ``autopilot`` module plays CitizenPac without a keyboard, e.g. for headless sweeps
+and soak tests.  It is deliberately simple: head for the nearest Food that has not been
+eaten yet, and run away from any Ghost that gets too close.  It does not press the
+space bar; whoever drives the game decides when to resume after a lost life.
+'''
+
+import constants
+from model import SceneObserver
+
+__all__ = ["Autopilot"]
+
+DANGER_RADIUS = 80.0
+''' The default distance at which a Ghost is avoided rather than the Food approached. '''
+
+DIRECTIONS    = [constants.MOVE_NORTH, constants.MOVE_SOUTH, constants.MOVE_EAST,
+                 constants.MOVE_WEST]
+
+
+def directionFlags(dx, dy, deadband):
+    '''
+    :Return:
+        ``int``
+            The ``moveFlags`` that move along :math:`(dx, dy)` (in scene coordinates,
+            :math:`y` points down), ignoring components smaller than ``deadband``.
+    '''
+    flags = 0
+    if dx > deadband:
+        flags |= constants.MOVE_EAST
+    elif dx < -deadband:
+        flags |= constants.MOVE_WEST
+    if dy > deadband:
+        flags |= constants.MOVE_SOUTH
+    elif dy < -deadband:
+        flags |= constants.MOVE_NORTH
+    return flags or constants.STATIONARY
+
+
+class Autopilot(SceneObserver):
+    '''
+    Sets the ``moveFlags`` of CitizenPac at the start of every tick of ``game``.
+
+    :Parameters:
+        ``game`` (:class:`controller.GameController`)
+            The game to play.  Its scene must already have been generated.  The
+            autopilot registers itself.
+
+        ``danger`` (float)
+            How close a Ghost may get before CitizenPac runs away from it.
+
+        ``keys`` (bool)
+            Steer like the keyboard does, pressing and releasing single directions with
+            :func:`view.actors.Actor.queueMove`, instead of setting the ``moveFlags``.
+
+    :Attributes:
+        ``target`` (int)
+            The index of the Food being approached, ``None`` before the first tick.
+    '''
+    def __init__(self, game, danger=DANGER_RADIUS, keys=False):
+        self.game   = game
+        self.danger = danger
+        self.keys   = keys
+        self.target = None
+        game.scene.addObserver(self)
+
+    def tickStarted(self, scene):
+        if not self.game.gameRunning:
+            return
+        flags   = self.steer(scene)
+        citizen = scene.citizenPac
+        if not self.keys:
+            citizen.moveFlags = flags
+            return
+        current = citizen.moveFlags
+        for direction in DIRECTIONS:
+            pressed = bool(flags & direction)
+            if pressed != bool(current & direction):
+                citizen.queueMove(direction, pressed)
+
+    def steer(self, scene):
+        '''
+        :Return:
+            ``int``
+                The ``moveFlags`` CitizenPac should have for the next tick.
+        '''
+        citizen  = scene.citizenPac
+        x, y     = citizen.x(), citizen.y()
+        deadband = scene.settings.gameSpeed * 0.5
+
+        # Run away first
+        closest = None
+        for ghost in scene.ghosts:
+            dx = x - ghost.x()
+            dy = y - ghost.y()
+            distance = dx * dx + dy * dy
+            if closest is None or distance < closest[0]:
+                closest = (distance, dx, dy)
+        if closest is not None and closest[0] < self.danger * self.danger:
+            return directionFlags(closest[1], closest[2], deadband)
+
+        # The target only changes once it has been eaten
+        eaten  = scene.foodEatenMask
+        target = self.target
+        if target is None or target >= len(eaten) or eaten[target]:
+            target = None
+            best   = None
+            for food in scene.food:
+                if eaten[food.index]:
+                    continue
+                dx = food.x() - x
+                dy = food.y() - y
+                distance = dx * dx + dy * dy
+                if best is None or distance < best:
+                    best   = distance
+                    target = food.index
+            self.target = target
+        if target is None:
+            return constants.STATIONARY
+        food = scene.food[target]
+        return directionFlags(food.x() - x, food.y() - y, deadband)
+
+    def close(self):
+        ''' Stops steering. '''
+        self.game.scene.removeObserver(self)
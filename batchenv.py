@@ -0,0 +1,270 @@
+'''
+The ``batchenv`` module steps many independent games at once, for training and
+evaluating automated players.  A :class:`batchenv.BatchEnv` holds ``N`` games of the
+same board as NumPy arrays and advances all of them with one call to
+:func:`batchenv.BatchEnv.step`, applying the rules of :func:`model.Scene.advance`,
+:func:`model.Scene.wrapActor` and :func:`view.actors.GhostActor.timerEvent` to whole
+arrays at a time.  NumPy is only needed for this module.
+
+The rules are the same, the random numbers are not: the Ghosts are steered by one
+``numpy.random.RandomState`` for the whole batch, so a game in the batch does not
+reproduce a :class:`controller.HeadlessCitizenPac` with the same seed.  The state
+mirrors :class:`simulation.Simulation`; unlike the window the games never pause, a game
+simply continues after a lost life.  The Food animation is not simulated, it does not
+affect the game.
+
+:func:`batchenv.BatchEnv.step` takes the ``moveFlags`` of every CitizenPac and returns
+
+- ``observation``: ``float32`` of shape ``(N, 2 * numMovers + 2)``, the :math:`(x, y)` of
+  CitizenPac and then every Ghost, the lives left and the fraction of Food eaten.  The
+  Food eaten itself is available as bitsets from
+  :func:`batchenv.BatchEnv.foodEatenBits`.
+- ``reward``: ``float32`` of shape ``(N,)``, the score gained during the step.
+- ``done``: ``bool`` of shape ``(N,)``, whether the game was won or lost during the
+  step.  Those games are reset right away; their observation is already the first one
+  of the next game.
+
+``benchmarks/batched.py`` measures the throughput in game-steps per second.
+'''
+
+import constants
+from simulation import Simulation
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+__all__ = ["BatchEnv"]
+
+DIRECTIONS = [constants.MOVE_NORTH, constants.MOVE_SOUTH, constants.MOVE_EAST,
+              constants.MOVE_WEST]
+
+
+def _overlap(a, b):
+    # Rectangles (left, top, right, bottom) along the last axis, broadcast
+    return ((a[..., 0] < b[..., 2]) & (b[..., 0] < a[..., 2]) &
+            (a[..., 1] < b[..., 3]) & (b[..., 1] < a[..., 3]))
+
+
+class BatchEnv(object):
+    '''
+    ``n`` games of the board of ``game``.
+
+    :Parameters:
+        ``game`` (:class:`controller.GameController`)
+            A generated game, only its board (the start positions, the bounding
+            rectangles and the Food) and its settings are used.
+
+        ``n`` (int)
+            The number of games.
+
+        ``seed`` (int)
+            The seed of the random numbers steering the Ghosts.
+
+    :Attributes:
+        ``positions`` (``float64``, ``(N, numMovers, 2)``)
+            :math:`(x, y)` of every mover, CitizenPac first.
+
+        ``flags`` (``uint8``, ``(N, numMovers)``)
+            The ``moveFlags`` of every mover.
+
+        ``foodEatenMask`` (``bool``, ``(N, numFood)``)
+            Which Food has been eaten.
+
+        ``foodEaten``, ``livesLeft``, ``ticks`` (``int64``, ``(N,)``)
+            The number of Food eaten, the lives left and the ticks of every game.
+
+        ``speed`` (``float64``, ``(N,)``)
+            The game speed of every game, see :class:`model.Settings`.
+
+        ``episodes`` (int)
+            How many games have been finished (won or lost) so far.
+    '''
+    def __init__(self, game, n, seed=None):
+        if numpy is None:
+            raise RuntimeError("The batched environment requires NumPy.")
+        if game.settings.numPlayers != 1:
+            raise RuntimeError("The batched environment supports one CitizenPac only.")
+
+        board = Simulation(game)
+
+        self.n              = n
+        self.width          = board.width
+        self.height         = board.height
+        self.speedIncr      = game.speedIncr
+        self.settings       = game.settings
+        self.ghostMoveTicks = board.ghostMoveTicks
+        self.random         = numpy.random.RandomState(seed)
+        self.directions     = numpy.array(DIRECTIONS, dtype=numpy.uint8)
+        self.starts         = numpy.array(board.starts, dtype=numpy.float64)
+        self.moverRects     = numpy.array(board.moverRects, dtype=numpy.float64)
+        self.foodRects      = numpy.array(board.foodRects,
+                                          dtype=numpy.float64).reshape(-1, 4)
+
+        numMovers, numFood  = len(self.starts), len(self.foodRects)
+        self.positions      = numpy.empty((n, numMovers, 2), dtype=numpy.float64)
+        self.flags          = numpy.empty((n, numMovers), dtype=numpy.uint8)
+        self.foodEatenMask  = numpy.empty((n, numFood), dtype=bool)
+        self.foodEaten      = numpy.empty(n, dtype=numpy.int64)
+        self.livesLeft      = numpy.empty(n, dtype=numpy.int64)
+        self.ticks          = numpy.empty(n, dtype=numpy.int64)
+        self.speed          = numpy.empty(n, dtype=numpy.float64)
+        self.episodes       = 0
+        self.reset()
+
+    def reset(self, games=None):
+        '''
+        Starts new games.
+
+        :Parameters:
+            ``games``
+                The games to reset (anything that indexes the first axis of the
+                arrays, e.g. a boolean mask), ``None`` for all of them.
+
+        :Return:
+            ``numpy.ndarray``
+                The observation of all games, see the module documentation.
+        '''
+        if games is None:
+            games = slice(None)
+        self.livesLeft[games] = self.settings.numLives
+        self.ticks[games]     = 0
+        self.__restart(games)
+        return self.observe()
+
+    def __restart(self, games):
+        # A lost life: see model.Scene.reset and controller.GameController.lostLife
+        self.positions[games]     = self.starts
+        self.flags[games]         = constants.STATIONARY
+        self.foodEatenMask[games] = False
+        self.foodEaten[games]     = 0
+        self.speed[games]         = self.settings.gameSpeedStart
+
+    def observe(self):
+        '''
+        :Return:
+            ``numpy.ndarray``
+                The observation of all games, see the module documentation.
+        '''
+        n           = self.n
+        observation = numpy.empty((n, self.positions.shape[1] * 2 + 2),
+                                  dtype=numpy.float32)
+        observation[:, :-2] = self.positions.reshape(n, -1)
+        observation[:, -2]  = self.livesLeft
+        observation[:, -1]  = self.foodEaten / float(max(1, self.foodRects.shape[0]))
+        return observation
+
+    def foodEatenBits(self):
+        '''
+        :Return:
+            ``numpy.ndarray``
+                ``uint8`` of shape ``(N, ceil(numFood / 8))``, the Food eaten of every
+                game as a bitset (``numpy.packbits``, most significant bit first).
+        '''
+        return numpy.packbits(self.foodEatenMask, axis=1)
+
+    def step(self, actions):
+        '''
+        Advances every game by one tick.
+
+        :Parameters:
+            ``actions``
+                The ``moveFlags`` for CitizenPac in every game, anything that converts
+                to ``uint8`` of shape ``(N,)``.
+
+        :Return:
+            ``tuple``
+                ``(observation, reward, done)``, see the module documentation.
+        '''
+        self.flags[:, 0] = actions
+        self.__turn_ghosts()
+
+        lost  = self.__ghost_collisions()
+        eaten = self.__eat(~lost)
+        won   = self.foodEaten == self.foodRects.shape[0]
+
+        # Nothing moves in the tick a life is lost
+        moving = ~lost
+        self.__wrap(moving)
+        self.__move(moving)
+        self.ticks += 1
+
+        if lost.any():
+            self.livesLeft[lost] -= 1
+            self.__restart(lost)
+        done = won | (self.livesLeft <= 0)
+        if done.any():
+            self.episodes += int(done.sum())
+            self.reset(done)
+
+        reward = (eaten * self.settings.foodValue).astype(numpy.float32)
+        return self.observe(), reward, done
+
+    def __turn_ghosts(self):
+        # See view.actors.GhostActor.timerEvent, for every Ghost of the games due
+        ticks = self.ticks
+        due   = numpy.flatnonzero((ticks > 0) & (ticks % self.ghostMoveTicks == 0))
+        if not len(due) or self.flags.shape[1] < 2:
+            return
+        flags = self.flags[due, 1:]
+        shape = flags.shape
+
+        # A random order of the four directions per Ghost, and which of them are set
+        order = numpy.argsort(self.random.random_sample(shape + (4,)), axis=-1)
+        dirs  = self.directions[order]
+        isSet = (flags[..., None] & dirs) == dirs
+        rows  = numpy.indices(shape)
+
+        # Remove the first direction that is set, if none is the Ghost stops
+        first   = dirs[rows[0], rows[1], numpy.argmax(isSet, axis=-1)]
+        removed = numpy.where(isSet.any(axis=-1), flags & ~first,
+                              constants.STATIONARY).astype(numpy.uint8)
+        # Or add the first one that is not set yet
+        first   = dirs[rows[0], rows[1], numpy.argmax(~isSet, axis=-1)]
+        added   = numpy.where((~isSet).any(axis=-1), flags | first, flags)
+
+        remove = self.random.random_sample(shape) < 0.5
+        self.flags[due, 1:] = numpy.where(remove, removed, added)
+
+    def __citizen_rects(self):
+        return self.moverRects[0] + numpy.tile(self.positions[:, 0, :], 2)
+
+    def __ghost_collisions(self):
+        # See model.Scene.__process_collisions, the bounding rectangles overlap
+        citizen = self.__citizen_rects()[:, None, :]
+        ghosts  = self.moverRects[None, 1:, :] + numpy.tile(self.positions[:, 1:, :], 2)
+        return _overlap(citizen, ghosts).any(axis=1)
+
+    def __eat(self, games):
+        # Returns how much Food every game ate
+        citizen = self.__citizen_rects()[:, None, :]
+        food    = self.foodRects[None, :, :]
+        new     = _overlap(citizen, food) & ~self.foodEatenMask & games[:, None]
+        eaten   = new.sum(axis=1)
+        self.foodEatenMask |= new
+        self.foodEaten     += eaten
+        settings = self.settings
+        if settings.useSpeedBoost:
+            self.speed = settings.gameSpeedStart + self.speedIncr * self.foodEaten
+        return eaten
+
+    def __wrap(self, games):
+        # See model.Scene.wrapActor
+        positions = self.positions
+        for axis, size in ((0, self.width), (1, self.height)):
+            values  = positions[..., axis]
+            shift   = numpy.where(values < -0.5 * size, size, 0.0)
+            shift  -= numpy.where(values > 0.5 * size, size, 0.0)
+            values += shift * games[:, None]
+
+    def __move(self, games):
+        # See view.actors.Actor.advance
+        flags = self.flags
+        dx    = ((flags & constants.MOVE_EAST) != 0).astype(numpy.float64) - \
+            ((flags & constants.MOVE_WEST) != 0)
+        dy    = ((flags & constants.MOVE_SOUTH) != 0).astype(numpy.float64) - \
+            ((flags & constants.MOVE_NORTH) != 0)
+        step  = (self.speed * games)[:, None]
+        self.positions[..., 0] += step * dx
+        self.positions[..., 1] += step * dy
@@ -0,0 +1,77 @@
+'''
+Throughput of :class:`batchenv.BatchEnv` in game-steps per second, for a range of batch
+sizes.  Run from the game's directory (NumPy is required):
+
+.. code-block:: console
+
+   $ python benchmarks/batched.py --output batched.json
+   $ python benchmarks/batched.py --sizes 4096,65536 --repeat 15
+
+Every step of a batch of ``N`` games is ``N`` game-steps; the ``ops`` of the results are
+steps of the whole batch per second, the table printed to ``stderr`` also shows the
+game-steps per second in millions.  CitizenPac moves in a random (but fixed) direction
+in every game, so Food is eaten, lives are lost and games are reset like in a real run.
+'''
+
+import argparse
+import sys
+
+import harness
+
+from PyQt4 import QtGui
+
+import constants
+from batchenv import BatchEnv, numpy
+from controller import HeadlessCitizenPac
+
+SEED  = 1
+''' The seed of the board and of the batch. '''
+
+SIZES = "1,64,1024,16384"
+''' The default batch sizes. '''
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Batched environment throughput.")
+    parser.add_argument("--output", metavar="FILE",
+                        help="Write the JSON results to FILE instead of stdout.")
+    parser.add_argument("--sizes", metavar="N,...", default=SIZES,
+                        help="The batch sizes (default: %(default)s).")
+    parser.add_argument("--board", metavar="WxH", default="780x700",
+                        help="The board size (default: %(default)s).")
+    parser.add_argument("--repeat", metavar="N", type=int, default=harness.REPEAT,
+                        help="The number of repeats (default: %(default)s).")
+    parser.add_argument("--min-time", metavar="SECONDS", type=float,
+                        default=harness.MIN_TIME,
+                        help="The minimum duration of a repeat (default: %(default)s).")
+    args = parser.parse_args(argv)
+
+    app     = QtGui.QApplication([], False)  # noqa F841
+    width, height = [int(value) for value in args.board.lower().split("x")]
+    game    = HeadlessCitizenPac(width, height, SEED)
+    moves   = [constants.MOVE_NORTH, constants.MOVE_SOUTH, constants.MOVE_EAST,
+               constants.MOVE_WEST, constants.MOVE_NORTH | constants.MOVE_EAST,
+               constants.MOVE_SOUTH | constants.MOVE_WEST]
+    results = {}
+    steps   = {}
+    for size in [int(value) for value in args.sizes.split(",") if value]:
+        try:
+            env = BatchEnv(game, size, SEED)
+        except RuntimeError as e:
+            sys.stderr.write("{}\n".format(e))
+            return 1
+        actions = numpy.random.RandomState(SEED).choice(moves, size).astype(numpy.uint8)
+        name    = "BatchEnv.step[{}]".format(size)
+        results[name] = harness.measure(lambda: env.step(actions), args.repeat,
+                                        args.min_time)
+        steps[name]   = results[name]["ops"] * size
+
+    harness.printTable(results)
+    for name in sorted(steps, key=lambda name: int(name.split("[")[1][:-1])):
+        sys.stderr.write("{:<24} {:>8.3f} M game-steps/s\n".format(name, steps[name] / 1e6))
+    harness.write(results, args.output, gameSteps=steps)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
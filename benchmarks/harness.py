@@ -0,0 +1,138 @@
+'''
+The ``harness`` module holds what every benchmark script in this directory shares:
+finding the game's modules, timing a callable, and writing the results as JSON.
+
+A benchmark is timed like ``timeit`` does it: the callable is run ``number`` times in a
+row with the garbage collector disabled, and that is repeated ``repeat`` times.
+``number`` is picked so that one repeat takes at least ``minTime`` seconds, which keeps
+the timer's resolution out of the results.  The per-call statistics are computed over
+the repeats.
+'''
+
+import gc
+import json
+import math
+import os
+import platform
+import sys
+from timeit import default_timer
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+''' The directory of the game. '''
+
+# The game's modules import each other as top level modules, see __main__.py
+if ROOT not in sys.path:
+    sys.path.insert(0, ROOT)
+
+REPEAT   = 7
+''' The default number of repeats. '''
+
+MIN_TIME = 0.1
+''' The default minimum duration (in seconds) of one repeat. '''
+
+
+def _run(func, number):
+    # Start every run with the same (empty) amount of garbage
+    gc.collect()
+    enabled = gc.isenabled()
+    gc.disable()
+    try:
+        start = default_timer()
+        for _ in range(number):
+            func()
+        return default_timer() - start
+    finally:
+        if enabled:
+            gc.enable()
+
+
+def measure(func, repeat=REPEAT, minTime=MIN_TIME):
+    '''
+    Times ``func``, see the module documentation.
+
+    :Parameters:
+        ``func`` (callable)
+            Called without arguments.
+
+        ``repeat`` (int)
+            How many times to repeat the measurement.
+
+        ``minTime`` (float)
+            The minimum duration of one repeat, in seconds.
+
+    :Return:
+        ``dict``
+            ``mean``, ``median``, ``stddev``, ``min`` and ``max`` seconds per call,
+            ``ops`` (calls per second, from the mean), and the ``number`` of calls per
+            repeat.
+    '''
+    # Warm up, and find how many calls fill minTime
+    number = 1
+    while True:
+        elapsed = _run(func, number)
+        if elapsed >= minTime:
+            break
+        number = number * 10 if elapsed <= 0.0 else \
+            max(number + 1, int(number * 1.2 * minTime / elapsed))
+
+    times  = sorted(_run(func, number) / number for _ in range(repeat))
+    mean   = sum(times) / len(times)
+    middle = len(times) // 2
+    median = times[middle] if len(times) % 2 else 0.5 * (times[middle - 1] + times[middle])
+    stddev = math.sqrt(sum((t - mean) ** 2 for t in times) / max(1, len(times) - 1))
+    return {
+        "mean": mean, "median": median, "stddev": stddev, "min": times[0],
+        "max": times[-1],
+        "ops": 1.0 / mean if mean > 0.0 else float("inf"), "number": number,
+        "repeat": repeat
+    }
+
+
+def environment():
+    '''
+    :Return:
+        ``dict``
+            What the results were measured on.
+    '''
+    from PyQt4 import QtCore
+    return {
+        "python": platform.python_version(),
+        "implementation": platform.python_implementation(),
+        "platform": platform.platform(),
+        "machine": platform.machine(),
+        "qt": QtCore.QT_VERSION_STR,
+        "pyqt": QtCore.PYQT_VERSION_STR
+    }
+
+
+def write(results, path=None, **sections):
+    '''
+    Writes ``results`` (and the :func:`harness.environment`) as JSON to ``path``, or to
+    ``stdout`` if it is ``None``.  Any keyword arguments are written as additional top
+    level sections.
+    '''
+    data = {"environment": environment(), "results": results}
+    data.update(sections)
+    # Explicit separators, Python 2 leaves trailing spaces otherwise
+    text = json.dumps(data, indent=2, separators=(",", ": "), sort_keys=True)
+    if path is None:
+        sys.stdout.write(text + "\n")
+    else:
+        with open(path, "w") as f:
+            f.write(text + "\n")
+
+
+def printTable(results, stream=sys.stderr):
+    '''
+    Prints a human readable summary of ``results`` (as returned by
+    :func:`harness.measure`, by name) to ``stream``.
+    '''
+    width = max([len(name) for name in results] + [9])
+    stream.write("{:<{w}} {:>12} {:>10} {:>12}\n".format("benchmark", "mean (us)",
+                                                         "stddev %", "ops/s", w=width))
+    for name in sorted(results):
+        result = results[name]
+        stream.write("{:<{w}} {:>12.2f} {:>10.1f} {:>12.0f}\n".format(
+            name, result["mean"] * 1e6, 100.0 * result["stddev"] / result["mean"],
+            result["ops"], w=width
+        ))
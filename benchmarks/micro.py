@@ -0,0 +1,170 @@
+'''
+Microbenchmarks of the game's core functions.  Run from the game's directory:
+
+.. code-block:: console
+
+   $ python benchmarks/micro.py --output before.json
+   $ python benchmarks/micro.py --filter Food --repeat 15
+
+The results (mean, stddev, min, max seconds per call and calls per second, see
+:func:`harness.measure`) are written as JSON to ``--output`` or ``stdout``, and a table
+is printed to ``stderr``.  Every game is generated with the same seed, so two runs
+measure exactly the same work.
+'''
+
+import argparse
+import sys
+
+import harness
+
+from PyQt4 import QtGui
+
+import constants
+import snapshot
+from controller import HeadlessCitizenPac
+from model import Settings, generateFoodGrid
+from simulation import Simulation
+from view.actors import CitizenPacActor, GhostActor, SplineDrawer
+
+SEED = 1
+''' The seed of every generated game. '''
+
+BOARD_SIZES = [(780, 700), (1280, 1024), (1920, 1080), (3840, 2160)]
+''' The board sizes :func:`model.generateFoodGrid` is measured for. '''
+
+SPARSITIES  = [2.5, 5.0, 10.0]
+''' The values of :data:`constants.FOOD_SPARSITY` it is measured for. '''
+
+LOOKAHEAD   = 30
+''' How many ticks a clone of :class:`simulation.Simulation` is advanced. '''
+
+
+def foodGridBenchmarks():
+    def grid(width, height, sparsity):
+        settings = Settings()
+        settings.foodSparsity = sparsity
+        return lambda: generateFoodGrid(width, height, settings)
+
+    return [
+        ("generateFoodGrid[{}x{},sparsity={}]".format(width, height, sparsity),
+         grid(width, height, sparsity))
+        for width, height in BOARD_SIZES for sparsity in SPARSITIES
+    ]
+
+
+def splineBenchmarks():
+    scale = constants.SPLINE_COORD_SCALE
+    return [
+        ("parseResourceJson[{}]".format(cls.__name__),
+         lambda cls=cls: SplineDrawer.parseResourceJson(cls.DATA_FILE, scale, -scale))
+        for cls in (CitizenPacActor, GhostActor)
+    ]
+
+
+def sceneBenchmarks(cleanup):
+    game  = HeadlessCitizenPac(780, 700, SEED)
+    game.setRewindEnabled(False)
+    scene = game.scene
+    rect  = scene.sceneRect()
+    ghost = scene.ghosts[0]
+    food  = scene.food[0]
+
+    def wrapOutside():
+        # Just past the right edge, so that it is wrapped around every time
+        ghost.setPos(rect.right() + 1.0, 0.0)
+        scene.wrapActor(ghost, rect.width(), rect.height())
+
+    def actorAdvance():
+        ghost.setPos(0.0, 0.0)
+        ghost.moveFlags = constants.MOVE_NORTH | constants.MOVE_EAST
+        ghost.advance(1)
+
+    # Food paints itself around its own origin
+    image   = QtGui.QImage(64, 64, QtGui.QImage.Format_ARGB32_Premultiplied)
+    painter = QtGui.QPainter(image)
+    painter.setRenderHint(QtGui.QPainter.Antialiasing)
+    painter.translate(32.0, 32.0)
+    cleanup.append(painter.end)
+
+    # A separate game for advancing, so that it does not move the actors used above
+    running = HeadlessCitizenPac(780, 700, SEED)
+    running.setRewindEnabled(False)
+    initial = snapshot.capture(running)
+
+    def sceneAdvance():
+        # Losing a life pauses the game, and a paused tick skips most of the work
+        if not running.gameRunning:
+            if running.gameFinished or running.livesLeft <= 0:
+                running.restoreSnapshot(initial)
+            running.gameRunningSwitched()
+        running.scene.advance()
+
+    return [
+        ("Scene.wrapActor[inside]",
+         lambda: scene.wrapActor(ghost, rect.width(), rect.height())),
+        ("Scene.wrapActor[outside]", wrapOutside),
+        ("Scene.wrapRelevantActors", scene.wrapRelevantActors),
+        ("Actor.advance", actorAdvance),
+        # Food has no advance of its own anymore, the animation is shared
+        ("FoodAnimation.advance", scene.foodAnimation.advance),
+        ("Food.paint", lambda: food.paint(painter, None, None)),
+        # Includes the occasional reset when CitizenPac runs into a Ghost, and the restart
+        # when the game is over
+        ("Scene.advance", sceneAdvance)
+    ]
+
+
+def simulationBenchmarks():
+    game = HeadlessCitizenPac(780, 700, SEED)
+    game.setRewindEnabled(False)
+    simulation = Simulation(game)
+    simulation.setRunning(True)
+
+    def lookahead():
+        # What a planner does for every move it considers
+        clone = simulation.clone()
+        clone.state.flags[0] = constants.MOVE_EAST
+        for _ in range(LOOKAHEAD):
+            clone.advance()
+
+    return [
+        ("Simulation.clone", simulation.clone),
+        ("Simulation.clone+advance[{}]".format(LOOKAHEAD), lookahead)
+    ]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Microbenchmarks of CitizenPac.")
+    parser.add_argument("--output", metavar="FILE",
+                        help="Write the JSON results to FILE instead of stdout.")
+    parser.add_argument("--repeat", metavar="N", type=int, default=harness.REPEAT,
+                        help="The number of repeats (default: %(default)s).")
+    parser.add_argument("--min-time", metavar="SECONDS", type=float,
+                        default=harness.MIN_TIME,
+                        help="The minimum duration of a repeat (default: %(default)s).")
+    parser.add_argument("--filter", metavar="TEXT",
+                        help="Only run the benchmarks whose name contains TEXT.")
+    args = parser.parse_args(argv)
+
+    app     = QtGui.QApplication([], False)  # noqa F841
+    cleanup = []
+    benchmarks = foodGridBenchmarks() + splineBenchmarks() + sceneBenchmarks(cleanup) + \
+        simulationBenchmarks()
+
+    results = {}
+    try:
+        for name, func in benchmarks:
+            if args.filter and args.filter not in name:
+                continue
+            results[name] = harness.measure(func, args.repeat, args.min_time)
+    finally:
+        for func in cleanup:
+            func()
+
+    harness.printTable(results)
+    harness.write(results, args.output)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,175 @@
+'''
+Bandwidth and latency of a networked game (:mod:`netplay`) on ``localhost``.  Run from
+the game's directory:
+
+.. code-block:: console
+
+   $ python benchmarks/netplay.py --output netplay.json
+   $ python benchmarks/netplay.py --players 4 --loss 0.05
+
+A :class:`netplay.GameServer` and ``--players`` :class:`netplay.NetClient` instances run
+in this process on real UDP sockets, in lockstep: in every round every client sends its
+input, the server receives it and ticks, and every client receives what the server sent.
+The players change direction at random, the game is resumed after every lost life and
+starts over when it is over.  ``--loss`` drops that fraction of the datagrams the
+clients receive, to show what asking for full snapshots costs.
+
+The ``ops`` of the results are rounds per second.  Per client, the bytes and packets
+received per tick, the bytes per second at the game's refresh rate, the full snapshots,
+and the 50th, 95th and 99th percentile latency from sending input to receiving the
+first state that includes it are printed to ``stderr`` and written as ``clients``.  In
+lockstep the latency is a round trip through the sockets plus one tick; a real server
+adds the wait for its next tick, up to one refresh period.
+'''
+
+import argparse
+import random
+import sys
+import threading
+
+import harness
+
+from PyQt4 import QtGui
+
+import constants
+import snapshot
+from controller import HeadlessCitizenPac
+from model import Settings
+from netplay import GameServer, NetClient
+
+SEED  = 1
+''' The seed of the board and of the players' moves. '''
+
+TURN  = 0.05
+''' The probability that a player changes direction in a round. '''
+
+MOVES = [constants.MOVE_NORTH, constants.MOVE_SOUTH, constants.MOVE_EAST,
+         constants.MOVE_WEST, constants.MOVE_NORTH | constants.MOVE_EAST,
+         constants.MOVE_SOUTH | constants.MOVE_WEST]
+
+
+class _Lossy(object):
+    '''
+    Wraps the socket of a client, and drops a fraction of what it receives.
+    '''
+    def __init__(self, socket, loss, rng):
+        self.socket = socket
+        self.loss   = loss
+        self.random = rng
+
+    def __getattr__(self, name):
+        return getattr(self.socket, name)
+
+    def recv(self, size):
+        while True:
+            data = self.socket.recv(size)
+            if self.random.random() >= self.loss:
+                return data
+
+
+def join(app, server, players):
+    '''
+    :Return:
+        ``list``
+            ``players`` :class:`netplay.NetClient` instances joined to ``server``.  They
+            join on a thread, while this one lets the server answer.
+    '''
+    address = ("127.0.0.1", server.port())
+    clients = []
+    thread  = threading.Thread(
+        target=lambda: clients.extend(NetClient(*address) for _ in range(players))
+    )
+    thread.start()
+    while thread.is_alive():
+        app.processEvents()
+        server.receive()
+        thread.join(0.001)
+    if len(clients) != players:
+        raise RuntimeError("Only {} of {} players joined.".format(len(clients), players))
+    return clients
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Networked game bandwidth and latency.")
+    parser.add_argument("--output", metavar="FILE",
+                        help="Write the JSON results to FILE instead of stdout.")
+    parser.add_argument("--players", metavar="N", type=int, default=constants.NET_PLAYERS,
+                        help="The number of players (default: %(default)s).")
+    parser.add_argument("--loss", metavar="P", type=float, default=0.0,
+                        help="The fraction of datagrams the clients drop (default: "
+                             "%(default)s).")
+    parser.add_argument("--repeat", metavar="N", type=int, default=harness.REPEAT,
+                        help="The number of repeats (default: %(default)s).")
+    parser.add_argument("--min-time", metavar="SECONDS", type=float,
+                        default=harness.MIN_TIME,
+                        help="The minimum duration of a repeat (default: %(default)s).")
+    args = parser.parse_args(argv)
+
+    app      = QtGui.QApplication([], False)
+    settings = Settings()
+    settings.numPlayers = args.players
+    game     = HeadlessCitizenPac(*constants.HEADLESS_BOARD, seed=SEED, settings=settings)
+    game.setRewindEnabled(False)
+    initial  = snapshot.capture(game)
+    try:
+        server  = GameServer(game, 0)
+        clients = join(app, server, args.players)
+    except RuntimeError as e:
+        sys.stderr.write("{}\n".format(e))
+        return 1
+    rng = random.Random(SEED)
+    if args.loss > 0.0:
+        for client in clients:
+            client.socket = _Lossy(client.socket, args.loss, rng)
+
+    ticks = [0]
+
+    def playRound():
+        for client in clients:
+            if rng.random() < TURN:
+                client.setMove(rng.choice(MOVES))
+        if not game.gameRunning:
+            if game.gameFinished or game.livesLeft <= 0:
+                game.restoreSnapshot(initial)
+            # Paused at the start, and after every lost life
+            clients[0].togglePause()
+        for client in clients:
+            client.send()
+        app.processEvents()
+        server.receive()
+        server.step()
+        ticks[0] += 1
+        for client in clients:
+            client.poll()
+
+    name    = "netplay.round[{}]".format(args.players)
+    results = {name: harness.measure(playRound, args.repeat, args.min_time)}
+    rate    = 1000.0 / settings.refreshRate
+    reports = []
+    for client in clients:
+        report = client.report()
+        reports.append({
+            "player": client.player, "bytesPerTick": report["bytes"] / float(ticks[0]),
+            "packetsPerTick": report["packets"] / float(ticks[0]),
+            "bytesPerSecond": report["bytes"] * rate / ticks[0],
+            "fullSnapshots": report["fullSnapshots"], "latencyMs": report["latency"]
+        })
+        client.close()
+    server.close()
+
+    harness.printTable(results)
+    sys.stderr.write("{} ticks, {:g}% loss\n".format(ticks[0], 100.0 * args.loss))
+    for report in reports:
+        sys.stderr.write(
+            "player {}: {:6.1f} bytes/tick {:4.2f} packets/tick {:8.0f} bytes/s "
+            "{:5d} full  latency p50 {:.3f}ms p95 {:.3f}ms p99 {:.3f}ms\n".format(
+                report["player"] + 1, report["bytesPerTick"], report["packetsPerTick"],
+                report["bytesPerSecond"], report["fullSnapshots"], *report["latencyMs"]
+            )
+        )
+    harness.write(results, args.output, clients=reports)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
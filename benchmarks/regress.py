@@ -0,0 +1,199 @@
+'''
+A performance regression gate.  Run from the game's directory:
+
+.. code-block:: console
+
+   $ python benchmarks/regress.py                    # compare with the baseline
+   $ python benchmarks/regress.py --update-baseline  # measure a new baseline
+
+Three scenarios are measured on a 780 by 700 board (:data:`regress.BOARD`):
+
++-------------+-----------------------------------------------------------------------+
+| Scenario    | Measures                                                              |
++=============+=======================================================================+
+| ``ticks``   | :data:`regress.TICKS` ticks of a running headless game, always        |
+|             | starting from the same state with the same seed.  CitizenPac heads    |
+|             | north east (:data:`regress.MOVE`), eats Food and runs into a Ghost.   |
++-------------+-----------------------------------------------------------------------+
+| ``paint``   | One offscreen frame of the decorated scene, see ``render.py``.        |
++-------------+-----------------------------------------------------------------------+
+| ``startup`` | Creating a headless game: generating the scene, parsing the splines.  |
++-------------+-----------------------------------------------------------------------+
+
+Each is repeated ``--runs`` times (see :func:`harness.measure`), and its median is
+compared with the median stored in the baseline (``baseline.json`` next to this file).
+A scenario regressed if it got slower by more than ``--tolerance`` *and* by more than
+:data:`regress.NOISE_SIGMAS` standard deviations of the two measurements combined, so
+that a noisy scenario does not fail on noise alone.  The exit code is ``1`` if any
+scenario regressed, and ``2`` if there is no baseline yet.
+
+Baselines are only meaningful on the machine they were measured on; the environment
+is stored with them and a warning is printed when it differs.  Commit the baseline of
+the machine the gate runs on, and refresh it with ``--update-baseline`` whenever a
+change is known to make things slower (or faster) on purpose.
+'''
+
+import argparse
+import json
+import math
+import os
+import sys
+
+import harness
+import render
+
+from PyQt4 import QtGui
+
+import constants
+import snapshot
+from controller import HeadlessCitizenPac
+from model import seedRandom
+
+BASELINE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "baseline.json")
+''' The default baseline file. '''
+
+BOARD = (780, 700)
+''' The size of the board of every scenario. '''
+
+SEED = 1
+''' The seed of every generated game. '''
+
+TICKS = 100
+''' The number of ticks played by the ``ticks`` scenario. '''
+
+MOVE = constants.MOVE_NORTH | constants.MOVE_EAST
+'''
+The ``moveFlags`` of CitizenPac in the ``ticks`` scenario.  On the board of
+:data:`regress.SEED` it eats four Food and loses a life after 94 ticks, so the Ghost
+collisions, the Food scan and the reset are all measured.
+'''
+
+RUNS = 9
+''' The default number of runs per scenario. '''
+
+TOLERANCE = 0.1
+''' The default relative slowdown that is tolerated. '''
+
+NOISE_SIGMAS = 3.0
+''' A slowdown must also exceed this many combined standard deviations to count. '''
+
+
+def scenarios():
+    '''
+    :Return:
+        ``list``
+            ``(name, callable)`` for every scenario, see the module documentation.
+    '''
+    width, height = BOARD
+
+    running = HeadlessCitizenPac(width, height, SEED)
+    running.setRewindEnabled(False)
+    start   = snapshot.capture(running)
+
+    def ticks():
+        # The Ghosts steer with the random module, so reseed it as well
+        seedRandom(SEED)
+        running.restoreSnapshot(start)
+        scene = running.scene
+        for _ in range(TICKS):
+            # Restoring pauses the game, and so does a lost life
+            if not running.gameRunning:
+                running.gameRunningSwitched()
+            scene.citizenPac.moveFlags = MOVE
+            scene.advance()
+
+    game, _ = render.buildScene(width, height)
+
+    return [
+        ("ticks", ticks),
+        ("paint", render.frameRenderer(game.scene, width, height, True, False)),
+        ("startup", lambda: HeadlessCitizenPac(width, height, SEED))
+    ]
+
+
+def compare(baseline, current, tolerance):
+    '''
+    :Return:
+        ``list``
+            ``(name, base, now, change, limit, status)`` for every scenario in
+            ``current``: the medians in seconds, the relative change, the relative
+            slowdown allowed, and ``"ok"``, ``"REGRESSED"``, ``"faster"`` or ``"new"``.
+    '''
+    rows = []
+    for name in sorted(current):
+        now = current[name]
+        if name not in baseline:
+            rows.append((name, None, now["median"], None, None, "new"))
+            continue
+        base   = baseline[name]
+        noise  = NOISE_SIGMAS * math.sqrt(base["stddev"] ** 2 + now["stddev"] ** 2)
+        limit  = max(tolerance, noise / base["median"])
+        change = now["median"] / base["median"] - 1.0
+        if change > limit:
+            status = "REGRESSED"
+        elif change < -limit:
+            status = "faster"
+        else:
+            status = "ok"
+        rows.append((name, base["median"], now["median"], change, limit, status))
+    return rows
+
+
+def printComparison(rows, stream=sys.stdout):
+    stream.write("{:<10} {:>14} {:>14} {:>9} {:>9}  {}\n".format(
+        "scenario", "baseline (us)", "current (us)", "change", "limit", "status"
+    ))
+    for name, base, now, change, limit, status in rows:
+        stream.write("{:<10} {:>14} {:>14.2f} {:>9} {:>9}  {}\n".format(
+            name, "-" if base is None else "{:.2f}".format(base * 1e6), now * 1e6,
+            "-" if change is None else "{:+.1%}".format(change),
+            "-" if limit is None else "{:.1%}".format(limit), status
+        ))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Performance regression gate.")
+    parser.add_argument("--baseline", metavar="FILE", default=BASELINE,
+                        help="The baseline JSON (default: benchmarks/baseline.json).")
+    parser.add_argument("--update-baseline", action="store_true",
+                        help="Measure and store a new baseline instead of comparing.")
+    parser.add_argument("--runs", metavar="N", type=int, default=RUNS,
+                        help="The number of runs per scenario (default: %(default)s).")
+    parser.add_argument("--tolerance", metavar="FRACTION", type=float, default=TOLERANCE,
+                        help="The relative slowdown tolerated (default: %(default)s).")
+    parser.add_argument("--min-time", metavar="SECONDS", type=float,
+                        default=harness.MIN_TIME,
+                        help="The minimum duration of a run (default: %(default)s).")
+    args = parser.parse_args(argv)
+
+    baseline = None
+    if not args.update_baseline:
+        if not os.path.exists(args.baseline):
+            sys.stderr.write("There is no baseline [{}] yet, run with --update-baseline "
+                             "first.\n".format(args.baseline))
+            return 2
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+
+    # The paint scenario needs fonts and images
+    app     = QtGui.QApplication([])  # noqa F841
+    current = {}
+    for name, func in scenarios():
+        current[name] = harness.measure(func, args.runs, args.min_time)
+
+    if args.update_baseline:
+        harness.write(current, args.baseline)
+        harness.printTable(current, sys.stdout)
+        return 0
+
+    if baseline["environment"] != harness.environment():
+        sys.stderr.write("Warning: the baseline was measured on a different environment:"
+                         "\n  {}\n".format(json.dumps(baseline["environment"],
+                                                      sort_keys=True)))
+    rows = compare(baseline["results"], current, args.tolerance)
+    printComparison(rows)
+    return 1 if any(row[-1] == "REGRESSED" for row in rows) else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,195 @@
+'''
+Frames per second of the complete scene rendered offscreen, so that renderer changes can
+be compared on the same machine without a window, a compositor or vsync in the loop.
+Run from the game's directory (a display is still required for fonts and images, e.g.
+``xvfb-run`` on a server):
+
+.. code-block:: console
+
+   $ python benchmarks/render.py --output render.json
+   $ python benchmarks/render.py --sizes 1920x1080 --repeat 15
+
+For every board size a game is generated with the board filling the frame, and dressed
+up like the paused game in the window: the splash image as the background and the two
+messages on top (see :class:`controller.CitizenPac`).  Each frame is rendered with
+``QGraphicsScene.render`` into a ``QImage``, with antialiasing on and off.  With the
+opacity effect on, the frame is rendered into a layer first and then drawn with an
+opacity of ``0.6``, which is what the ``QGraphicsOpacityEffect`` of the view does.
+The ``ops`` of a frame are its frames per second.
+
+The cost per item type (antialiasing on, no effect) is found by rendering the scene
+with only the items of that type visible, minus the cost of rendering it with nothing
+visible at all.  It is written to the ``items`` section of the JSON.
+'''
+
+import argparse
+import sys
+
+import harness
+
+from PyQt4 import QtCore, QtGui
+
+from controller import HeadlessCitizenPac
+
+SEED  = 1
+''' The seed of every generated game. '''
+
+SIZES = "780x700,1280x1024,1920x1080,3840x2160"
+''' The default frame sizes. '''
+
+SPLASH_IMAGE = ":/view/qt_configs/images/citizen_pac.png"
+
+OPACITY = 0.6
+''' The opacity of the paused game, see :func:`controller.CitizenPac.displayRunning`. '''
+
+
+def buildScene(width, height):
+    '''
+    Generates a game of ``width`` by ``height`` and decorates it like the paused game.
+
+    :Return:
+        ``tuple``
+            The game, and a ``dict`` of the scene's items by type: ``food``,
+            ``ghosts``, ``citizenPac`` and ``text``.
+    '''
+    game  = HeadlessCitizenPac(width, height, SEED)
+    game.setRewindEnabled(False)
+    scene = game.scene
+
+    # The same decorations as controller.CitizenPac.__decorate
+    brush = QtGui.QBrush(QtGui.QColor(0, 0, 0))
+    pen   = QtGui.QPen(QtGui.QColor(255, 255, 255), QtCore.Qt.SolidLine)
+    pen.setWidth(2)
+    messages = []
+    for text in ("3 Lives Remaining...", "Press <space> to Play!"):
+        message = QtGui.QGraphicsSimpleTextItem()
+        message.setFont(QtGui.QFont("mono", 36))
+        message.setText(text)
+        message.setBrush(brush)
+        message.setPen(pen)
+        scene.addItem(message)
+        messages.append(message)
+    bounds = messages[0].boundingRect()
+    messages[0].setPos(-bounds.width() * 0.5, -bounds.height() * 0.5)
+    messages[1].setPos(-messages[1].boundingRect().width() * 0.5, bounds.height())
+
+    scene.setBackgroundBrush(QtGui.QBrush(QtGui.QImage(SPLASH_IMAGE)))
+    return game, {
+        "food": list(scene.food), "ghosts": list(scene.ghosts),
+        "citizenPac": [scene.citizenPac], "text": messages
+    }
+
+
+def frameRenderer(scene, width, height, antialias, opacity):
+    '''
+    :Return:
+        callable
+            Renders one complete frame of ``scene``.
+    '''
+    target = QtGui.QImage(width, height, QtGui.QImage.Format_ARGB32_Premultiplied)
+    layer  = QtGui.QImage(width, height, QtGui.QImage.Format_ARGB32_Premultiplied)
+    source = scene.sceneRect()
+    frame  = QtCore.QRectF(0.0, 0.0, width, height)
+    hints  = QtGui.QPainter.Antialiasing | QtGui.QPainter.TextAntialiasing | \
+        QtGui.QPainter.SmoothPixmapTransform
+
+    def render():
+        image = layer if opacity else target
+        image.fill(0)
+        painter = QtGui.QPainter(image)
+        painter.setRenderHints(hints, antialias)
+        scene.render(painter, frame, source)
+        painter.end()
+        if opacity:
+            target.fill(0)
+            painter = QtGui.QPainter(target)
+            painter.setOpacity(OPACITY)
+            painter.drawImage(0, 0, layer)
+            painter.end()
+    return render
+
+
+def itemCosts(game, items, width, height, repeat, minTime):
+    '''
+    :Return:
+        ``dict``
+            For every item type, the ``count`` of items and the seconds per frame
+            (``frame``) and per item (``item``) they cost.  The background is one item.
+    '''
+    scene      = game.scene
+    background = scene.backgroundBrush()
+    render     = frameRenderer(scene, width, height, True, False)
+
+    def only(kind):
+        for name, group in items.items():
+            for item in group:
+                item.setVisible(name == kind)
+        scene.setBackgroundBrush(background if kind == "background" else QtGui.QBrush())
+        return harness.measure(render, repeat, minTime)["mean"]
+
+    try:
+        empty = only(None)
+        costs = {}
+        for kind in ["background"] + sorted(items):
+            count = 1 if kind == "background" else len(items[kind])
+            frame = max(0.0, only(kind) - empty)
+            costs[kind] = {"count": count, "frame": frame,
+                           "item": frame / count if count else 0.0}
+    finally:
+        for group in items.values():
+            for item in group:
+                item.setVisible(True)
+        scene.setBackgroundBrush(background)
+    return costs
+
+
+def parseSize(text):
+    width, height = text.lower().split("x")
+    return int(width), int(height)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Offscreen rendering benchmark.")
+    parser.add_argument("--output", metavar="FILE",
+                        help="Write the JSON results to FILE instead of stdout.")
+    parser.add_argument("--sizes", metavar="WxH,...", default=SIZES,
+                        help="The frame sizes (default: %(default)s).")
+    parser.add_argument("--repeat", metavar="N", type=int, default=harness.REPEAT,
+                        help="The number of repeats (default: %(default)s).")
+    parser.add_argument("--min-time", metavar="SECONDS", type=float,
+                        default=harness.MIN_TIME,
+                        help="The minimum duration of a repeat (default: %(default)s).")
+    args = parser.parse_args(argv)
+
+    # Fonts and images need the GUI parts of Qt
+    app     = QtGui.QApplication([])  # noqa F841
+    results = {}
+    items   = {}
+    for size in args.sizes.split(","):
+        width, height = parseSize(size)
+        game, byType  = buildScene(width, height)
+        for antialias in (True, False):
+            for opacity in (False, True):
+                name = "frame[{}x{},aa={},opacity={}]".format(
+                    width, height, "on" if antialias else "off", "on" if opacity else "off"
+                )
+                results[name] = harness.measure(
+                    frameRenderer(game.scene, width, height, antialias, opacity),
+                    args.repeat, args.min_time
+                )
+        items["{}x{}".format(width, height)] = itemCosts(game, byType, width, height,
+                                                         args.repeat, args.min_time)
+
+    harness.printTable(results)
+    for size in sorted(items):
+        sys.stderr.write("{}:\n".format(size))
+        for kind, cost in sorted(items[size].items()):
+            sys.stderr.write("  {:<12} {:>6} x {:>10.2f} us = {:>10.2f} us\n".format(
+                kind, cost["count"], cost["item"] * 1e6, cost["frame"] * 1e6
+            ))
+    harness.write(results, args.output, items=items)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,200 @@
+'''
+How the cost of a tick and of a paint grows with the amount of Food and the number of
+Ghosts.  Run from the game's directory:
+
+.. code-block:: console
+
+   $ python benchmarks/scaling.py --output scaling.csv
+   $ python benchmarks/scaling.py --sizes 780x700,3840x2160 --ghosts 3,30
+
+Every combination of a board size (which determines the amount of Food, see
+:func:`model.generateFoodGrid`) and a number of Ghosts (:data:`constants.NUM_GHOSTS`)
+is played for ``--ticks`` ticks, timing every :func:`model.Scene.advance`, and rendered
+offscreen (``QGraphicsScene.render`` into a ``QImage`` of the board's size) every so
+often.  The game is resumed after every lost life and starts over when it is over, so
+every timed tick is a running one.  Ticks that reset the scene because CitizenPac ran
+into a Ghost are counted, but left out of the statistics: they are a different kind of
+work.
+
+The CSV has one row per combination.  Then, for each dimension, the mean times are
+fitted to :math:`t = a \\cdot n^k` by least squares in log-log space, once per value of
+the other dimension; the growth exponents :math:`k` are printed to ``stderr``.  A
+:math:`k` near ``1`` is linear, and anything clearly above it is superlinear.
+'''
+
+import argparse
+import csv
+import math
+import sys
+from timeit import default_timer
+
+import harness  # noqa F401, makes the game's modules importable
+
+from PyQt4 import QtGui
+
+import snapshot
+from controller import HeadlessCitizenPac
+from model import SceneObserver, Settings
+from perfstats import RollingSamples
+
+SEED   = 1
+''' The seed of every generated game. '''
+
+SIZES  = "780x700,1280x1024,1920x1080,2560x1440,3840x2160"
+''' The default board sizes. '''
+
+GHOSTS = "1,3,6,12,24"
+''' The default numbers of Ghosts. '''
+
+COLUMNS = ["width", "height", "food", "ghosts", "tick_mean", "tick_p50", "tick_p95",
+           "tick_p99", "paint_mean", "paint_p95", "resets"]
+
+
+class _ResetCounter(SceneObserver):
+    def __init__(self):
+        self.resets = 0
+
+    def sceneReset(self, scene):
+        self.resets += 1
+
+
+def measure(width, height, ghosts, ticks, paintEvery):
+    '''
+    Plays and renders one combination.
+
+    :Return:
+        ``dict``
+            The values of the row, see ``COLUMNS``.  Times are in seconds.
+    '''
+    settings = Settings()
+    settings.numGhosts = ghosts
+    game = HeadlessCitizenPac(width, height, SEED, settings)
+    game.setRewindEnabled(False)
+    initial = snapshot.capture(game)
+    scene   = game.scene
+    counter = _ResetCounter()
+    scene.addObserver(counter)
+
+    image      = QtGui.QImage(width, height, QtGui.QImage.Format_ARGB32_Premultiplied)
+    tickTimes  = RollingSamples(ticks)
+    paintTimes = RollingSamples(max(1, ticks // paintEvery))
+    for tick in range(ticks):
+        # Losing a life pauses the game, and a paused tick skips most of the work
+        if not game.gameRunning:
+            if game.gameFinished or game.livesLeft <= 0:
+                game.restoreSnapshot(initial)
+            game.gameRunningSwitched()
+        resets = counter.resets
+        start  = default_timer()
+        scene.advance()
+        end    = default_timer()
+        if counter.resets == resets:
+            tickTimes.add(end - start)
+
+        if tick % paintEvery == 0:
+            image.fill(0)
+            painter = QtGui.QPainter(image)
+            start   = default_timer()
+            scene.render(painter)
+            end     = default_timer()
+            painter.end()
+            paintTimes.add(end - start)
+
+    p50, p95, p99 = tickTimes.percentiles(50, 95, 99)
+    return {
+        "width": width, "height": height, "food": len(scene.food), "ghosts": ghosts,
+        "tick_mean": tickTimes.mean(), "tick_p50": p50, "tick_p95": p95, "tick_p99": p99,
+        "paint_mean": paintTimes.mean(), "paint_p95": paintTimes.percentiles(95)[0],
+        "resets": counter.resets
+    }
+
+
+def growthExponent(points):
+    '''
+    :Parameters:
+        ``points`` (list)
+            ``(n, t)`` pairs, with at least two different positive ``n``.
+
+    :Return:
+        ``float``
+            The least squares slope of :math:`\\log t` against :math:`\\log n`, ``None``
+            if it cannot be computed.
+    '''
+    points = [(math.log(n), math.log(t)) for n, t in points if n > 0 and t > 0]
+    if len(set(x for x, _ in points)) < 2:
+        return None
+    mx = sum(x for x, _ in points) / len(points)
+    my = sum(y for _, y in points) / len(points)
+    sxx = sum((x - mx) ** 2 for x, _ in points)
+    sxy = sum((x - mx) * (y - my) for x, y in points)
+    return sxy / sxx
+
+
+def printExponents(rows, stream=sys.stderr):
+    '''
+    Prints the growth exponents of the tick and paint times along each dimension.
+    '''
+    dimensions = [("food", "ghosts"), ("ghosts", "food")]
+    for dimension, other in dimensions:
+        for metric in ("tick_mean", "paint_mean"):
+            for value in sorted(set(row[other] for row in rows)):
+                points = [(row[dimension], row[metric]) for row in rows
+                          if row[other] == value]
+                k = growthExponent(points)
+                if k is not None:
+                    stream.write("{:<10} vs {:<6} ({} = {:>5}): k = {:.2f}\n".format(
+                        metric, dimension, other, value, k
+                    ))
+
+
+def parseList(text, parse):
+    return [parse(item) for item in text.split(",") if item]
+
+
+def parseSize(text):
+    width, height = text.lower().split("x")
+    return int(width), int(height)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Measure how ticks and paints scale with Food and Ghosts."
+    )
+    parser.add_argument("--output", metavar="FILE",
+                        help="Write the CSV to FILE instead of stdout.")
+    parser.add_argument("--sizes", metavar="WxH,...", default=SIZES,
+                        help="The board sizes (default: %(default)s).")
+    parser.add_argument("--ghosts", metavar="N,...", default=GHOSTS,
+                        help="The numbers of Ghosts (default: %(default)s).")
+    parser.add_argument("--ticks", metavar="N", type=int, default=300,
+                        help="The ticks played per combination (default: %(default)s).")
+    parser.add_argument("--paint-every", metavar="N", type=int, default=10,
+                        help="Render every N ticks (default: %(default)s).")
+    args = parser.parse_args(argv)
+
+    app  = QtGui.QApplication([], False)  # noqa F841
+    rows = []
+    for width, height in parseList(args.sizes, parseSize):
+        for ghosts in parseList(args.ghosts, int):
+            row = measure(width, height, ghosts, args.ticks, args.paint_every)
+            sys.stderr.write("{}x{} food {} ghosts {}: tick {:.1f} us, paint {:.1f} "
+                             "us\n".format(width, height, row["food"], ghosts,
+                                           row["tick_mean"] * 1e6,
+                                           row["paint_mean"] * 1e6))
+            rows.append(row)
+
+    stream = sys.stdout if args.output is None else open(args.output, "w")
+    try:
+        writer = csv.DictWriter(stream, COLUMNS, lineterminator="\n")
+        writer.writeheader()
+        writer.writerows(rows)
+    finally:
+        if stream is not sys.stdout:
+            stream.close()
+
+    printExponents(rows)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,144 @@
+'''
+The cost of streaming a game to spectators (:mod:`spectate`), for a range of spectator
+counts.  Run from the game's directory (Unix only, the spectators use Unix domain
+sockets):
+
+.. code-block:: console
+
+   $ python benchmarks/spectate.py --output spectate.json
+   $ python benchmarks/spectate.py --spectators 0,8,64,256
+
+Every spectator is a process of its own that only reads the stream, so the measured
+time is the host's alone.  A round is one tick of a headless game played by the
+:class:`autopilot.Autopilot` plus one pass of the Qt event loop, which is when the
+sockets are written to; the game is resumed after every lost life and starts over when
+it is over.  ``tick[-]`` is the same without a :class:`spectate.SpectatorServer`, i.e.
+what encoding the frames costs is the difference to ``tick[0]``.
+
+Per spectator count the frames and bytes encoded per tick and the frames skipped by
+spectators that did not keep up are printed to ``stderr`` and written as ``streams``.
+'''
+
+import argparse
+import multiprocessing
+import os
+import socket
+import sys
+import tempfile
+from timeit import default_timer
+
+import harness
+
+from PyQt4 import QtGui
+
+import snapshot
+from autopilot import Autopilot
+from controller import HeadlessCitizenPac
+from spectate import SpectatorServer
+
+SEED        = 1
+''' The seed of the board. '''
+
+SPECTATORS  = "0,1,8,64"
+''' The default spectator counts. '''
+
+CONNECT_TIMEOUT = 10.0
+''' How long (in seconds) to wait for the spectators to connect. '''
+
+
+def _watch(path):
+    # One spectator: read until the server closes the connection
+    connection = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    connection.connect(path)
+    try:
+        while connection.recv(1 << 16):
+            pass
+    except socket.error:
+        pass
+    connection.close()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Spectator stream cost.")
+    parser.add_argument("--output", metavar="FILE",
+                        help="Write the JSON results to FILE instead of stdout.")
+    parser.add_argument("--spectators", metavar="N,...", default=SPECTATORS,
+                        help="The spectator counts (default: %(default)s).")
+    parser.add_argument("--repeat", metavar="N", type=int, default=harness.REPEAT,
+                        help="The number of repeats (default: %(default)s).")
+    parser.add_argument("--min-time", metavar="SECONDS", type=float,
+                        default=harness.MIN_TIME,
+                        help="The minimum duration of a repeat (default: %(default)s).")
+    args = parser.parse_args(argv)
+
+    app     = QtGui.QApplication([], False)
+    game    = HeadlessCitizenPac(780, 700, SEED)
+    initial = snapshot.capture(game)
+    pilot   = Autopilot(game)
+    ticks   = [0]
+
+    def playRound():
+        if not game.gameRunning:
+            if game.gameFinished or game.livesLeft <= 0:
+                game.restoreSnapshot(initial)
+            game.gameRunningSwitched()
+        game.scene.advance()
+        app.processEvents()
+        ticks[0] += 1
+
+    results = {"spectate.tick[-]": harness.measure(playRound, args.repeat,
+                                                   args.min_time)}
+    streams = []
+    name    = os.path.join(tempfile.gettempdir(), "citizenpac-spectate-bench")
+    for count in [int(value) for value in args.spectators.split(",") if value]:
+        try:
+            server = SpectatorServer(game, name)
+        except RuntimeError as e:
+            sys.stderr.write("{}\n".format(e))
+            return 1
+        path     = server.fullServerName()
+        watchers = [multiprocessing.Process(target=_watch, args=(path,))
+                    for _ in range(count)]
+        for watcher in watchers:
+            watcher.start()
+        deadline = default_timer() + CONNECT_TIMEOUT
+        while len(server.spectators) < count and default_timer() < deadline:
+            app.processEvents()
+        if len(server.spectators) < count:
+            sys.stderr.write("Only {} of {} spectators connected.\n".format(
+                len(server.spectators), count
+            ))
+            server.close()
+            return 1
+
+        start  = ticks[0]
+        before = server.report()
+        results["spectate.tick[{}]".format(count)] = harness.measure(
+            playRound, args.repeat, args.min_time
+        )
+        after  = server.report()
+        played = float(ticks[0] - start)
+        streams.append({
+            "spectators": count,
+            "framesPerTick": (after["frames"] - before["frames"]) / played,
+            "bytesPerTick": (after["bytesEncoded"] - before["bytesEncoded"]) / played,
+            "framesSkipped": after["framesSkipped"] - before["framesSkipped"]
+        })
+        server.close()
+        for watcher in watchers:
+            watcher.join()
+    pilot.close()
+
+    harness.printTable(results)
+    for stream in streams:
+        sys.stderr.write(
+            "{:4d} spectators: {:4.2f} frames/tick {:7.1f} bytes/tick {:6d} frames "
+            "skipped\n".format(stream["spectators"], stream["framesPerTick"],
+                               stream["bytesPerTick"], stream["framesSkipped"])
+        )
+    harness.write(results, args.output, streams=streams)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
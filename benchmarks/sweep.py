@@ -0,0 +1,317 @@
+'''
+Plays headless games for every combination of a set of game constants, on all cores.
+Run from the game's directory:
+
+.. code-block:: console
+
+   $ python benchmarks/sweep.py --param NUM_GHOSTS=1,3,6 --param MAX_SPEED=6,10 \\
+         --seeds 20 --output sweep.csv --summary summary.csv
+
+Every ``--param NAME=V1,V2,...`` adds a dimension, the games are every combination of
+the values times ``--seeds`` seeds.  The names that can be swept are the keys of
+:data:`sweep.PARAMETERS`.  Each game runs in a process of a ``multiprocessing.Pool``
+(one process per game, so that its peak memory is its own), is played by ``--player``
+and resumed after every lost life until it is won, lost, or ``--max-ticks`` ticks have
+passed.
+
+One CSV row per game (see ``COLUMNS``) is written to ``--output`` as soon as that game
+finishes, in whatever order they finish, so an interrupted sweep keeps everything it
+finished.  Afterwards the win rate, the mean time to clear and the mean ticks per second
+of every combination are printed to ``stderr``, and written to ``--summary``.
+
+``peak_rss_bytes`` is the peak resident memory of the process that played the game,
+which includes the interpreter and Qt; it is left empty where the ``resource`` module is
+not available.
+'''
+
+import argparse
+import csv
+import itertools
+import multiprocessing
+import random
+import sys
+from timeit import default_timer
+
+import harness  # noqa F401, makes the game's modules importable
+
+try:
+    import resource
+except ImportError:
+    # Windows
+    resource = None
+
+from PyQt4 import QtGui
+
+import constants
+from autopilot import Autopilot
+from controller import HeadlessCitizenPac
+from model import SceneObserver, Settings
+
+PARAMETERS = {
+    "FOOD_SPARSITY": float, "GAME_SPEED_START": float, "MAX_SPEED": float,
+    "NUM_GHOSTS": int, "DISPERSION_RADIUS": float, "GHOST_MOVE_TIME": int
+}
+''' The constants that can be swept, and how their values are parsed. '''
+
+SETTINGS = {
+    "FOOD_SPARSITY": ["foodSparsity"], "MAX_SPEED": ["maxSpeed"],
+    "GAME_SPEED_START": ["gameSpeedStart", "gameSpeed"], "NUM_GHOSTS": ["numGhosts"],
+    "DISPERSION_RADIUS": ["dispersionRadius"], "GHOST_MOVE_TIME": ["ghostMoveTime"]
+}
+''' The attributes of :class:`model.Settings` every constant of ``PARAMETERS`` sets. '''
+
+PLAYERS = ["autopilot", "random"]
+''' ``autopilot`` is :class:`autopilot.Autopilot`, ``random`` a seeded random walk. '''
+
+BOARD = "780x700"
+''' The default board size. '''
+
+MAX_TICKS = 60000
+''' The default limit of ticks per game, ten minutes of game time. '''
+
+COLUMNS = ["config", "seed", "player"] + sorted(PARAMETERS) + [
+    "won", "lives_left", "food_eaten", "food_total", "ticks", "clear_ticks",
+    "clear_seconds", "ticks_per_second", "peak_rss_bytes"
+]
+
+SUMMARY_COLUMNS = ["config", "player"] + sorted(PARAMETERS) + [
+    "games", "win_rate", "mean_clear_seconds", "mean_ticks_per_second",
+    "max_peak_rss_bytes"
+]
+
+_app = None
+
+
+class _RandomWalk(SceneObserver):
+    '''
+    Picks a random direction (or two) for CitizenPac every ``interval`` ticks.
+    '''
+    def __init__(self, game, seed, interval=50):
+        self.game     = game
+        self.random   = random.Random(seed)
+        self.interval = interval
+        game.scene.addObserver(self)
+
+    def tickStarted(self, scene):
+        if scene.tick % self.interval == 0 and self.game.gameRunning:
+            choice     = self.random.choice
+            vertical   = choice([0, constants.MOVE_NORTH, constants.MOVE_SOUTH])
+            horizontal = choice([0, constants.MOVE_EAST, constants.MOVE_WEST])
+            scene.citizenPac.moveFlags = (vertical | horizontal) or constants.STATIONARY
+
+
+def _initWorker():
+    global _app
+    # The scene needs a QApplication, but not a display
+    _app = QtGui.QApplication([], False)
+
+
+def _peakMemory():
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Kilobytes on Linux, bytes on macOS
+    return peak if sys.platform == "darwin" else peak * 1024
+
+
+def _settings(params):
+    settings = Settings()
+    for name, value in params.items():
+        for attribute in SETTINGS[name]:
+            setattr(settings, attribute, value)
+    return settings
+
+
+def playGame(task):
+    '''
+    Plays one game, in a worker process.
+
+    :Parameters:
+        ``task`` (tuple)
+            ``(config, params, seed, player, width, height, maxTicks)``, where
+            ``params`` maps names of :data:`sweep.PARAMETERS` to their values.
+
+    :Return:
+        ``dict``
+            The row of the game, see ``COLUMNS``.
+    '''
+    config, params, seed, player, width, height, maxTicks = task
+    game = HeadlessCitizenPac(width, height, seed, _settings(params))
+    game.setRewindEnabled(False)
+    if player == "autopilot":
+        Autopilot(game)
+    else:
+        _RandomWalk(game, seed)
+
+    scene = game.scene
+    start = default_timer()
+    while scene.tick < maxTicks and not game.gameFinished and game.livesLeft > 0:
+        # Paused at the start, and after every lost life
+        game.gameRunningSwitched()
+        game.run(maxTicks - scene.tick)
+    elapsed = max(default_timer() - start, 1e-9)
+
+    won   = game.gameFinished
+    clear = scene.tick if won else None
+    row   = {
+        "config": config, "seed": seed, "player": player, "won": int(won),
+        "lives_left": game.livesLeft, "food_eaten": scene.numFoodEaten(),
+        "food_total": len(scene.food), "ticks": scene.tick,
+        "clear_ticks": clear,
+        "clear_seconds": clear * game.settings.refreshRate / 1000.0 if won else None,
+        "ticks_per_second": scene.tick / elapsed, "peak_rss_bytes": _peakMemory()
+    }
+    row.update(params)
+    return row
+
+
+def parseParam(text):
+    '''
+    :Return:
+        ``tuple``
+            ``(name, values)`` of a ``NAME=V1,V2,...`` option.
+    '''
+    name, _, values = text.partition("=")
+    name = name.strip().upper()
+    if name not in PARAMETERS:
+        raise argparse.ArgumentTypeError("[{}] cannot be swept, choose from {}".format(
+            name, ", ".join(sorted(PARAMETERS))
+        ))
+    try:
+        return name, [PARAMETERS[name](value) for value in values.split(",") if value]
+    except ValueError as e:
+        raise argparse.ArgumentTypeError(str(e))
+
+
+def tasks(params, seeds, firstSeed, player, width, height, maxTicks):
+    '''
+    :Return:
+        ``list``
+            The arguments of :func:`sweep.playGame` for every game of the sweep.
+    '''
+    names  = [name for name, _ in params]
+    combos = itertools.product(*[values for _, values in params])
+    result = []
+    for index, values in enumerate(combos):
+        combo = dict(zip(names, values))
+        for seed in range(firstSeed, firstSeed + seeds):
+            result.append((index, combo, seed, player, width, height, maxTicks))
+    return result
+
+
+def summarize(rows):
+    '''
+    :Return:
+        ``list``
+            One row per configuration, see ``SUMMARY_COLUMNS``.
+    '''
+    configs = {}
+    for row in rows:
+        configs.setdefault(row["config"], []).append(row)
+    summary = []
+    for config in sorted(configs):
+        games  = configs[config]
+        clears = [game["clear_seconds"] for game in games if game["won"]]
+        peaks  = [game["peak_rss_bytes"] for game in games
+                  if game["peak_rss_bytes"] is not None]
+        row = {
+            "config": config, "player": games[0]["player"], "games": len(games),
+            "win_rate": float(len(clears)) / len(games),
+            "mean_clear_seconds": sum(clears) / len(clears) if clears else None,
+            "mean_ticks_per_second":
+                sum(game["ticks_per_second"] for game in games) / len(games),
+            "max_peak_rss_bytes": max(peaks) if peaks else None
+        }
+        for name in PARAMETERS:
+            row[name] = games[0].get(name)
+        summary.append(row)
+    return summary
+
+
+def printSummary(summary, stream=sys.stderr):
+    for row in summary:
+        params = ", ".join("{}={}".format(name, row[name]) for name in sorted(PARAMETERS)
+                           if row[name] is not None)
+        clear  = row["mean_clear_seconds"]
+        clear  = "-" if clear is None else "{:.1f}s".format(clear)
+        stream.write("config {:>4} ({}): won {:.0%} of {}, clear {}, {:.0f} ticks/s\n"
+                     .format(row["config"], params or "defaults", row["win_rate"],
+                             row["games"], clear, row["mean_ticks_per_second"]))
+
+
+def parseSize(text):
+    width, height = text.lower().split("x")
+    return int(width), int(height)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Sweep game constants with headless games."
+    )
+    parser.add_argument("--param", metavar="NAME=V1,V2,...", type=parseParam,
+                        action="append", default=[],
+                        help="A constant and the values to sweep, may be repeated.  "
+                             "One of: {}.".format(", ".join(sorted(PARAMETERS))))
+    parser.add_argument("--seeds", metavar="N", type=int, default=10,
+                        help="The number of seeds per combination "
+                             "(default: %(default)s).")
+    parser.add_argument("--first-seed", metavar="SEED", type=int, default=1,
+                        help="The first seed (default: %(default)s).")
+    parser.add_argument("--player", choices=PLAYERS, default=PLAYERS[0],
+                        help="Who plays (default: %(default)s).")
+    parser.add_argument("--board", metavar="WxH", type=parseSize, default=BOARD,
+                        help="The board size (default: %(default)s).")
+    parser.add_argument("--max-ticks", metavar="N", type=int, default=MAX_TICKS,
+                        help="Give up on a game after N ticks (default: %(default)s).")
+    parser.add_argument("--processes", metavar="N", type=int,
+                        help="The number of worker processes (default: one per core).")
+    parser.add_argument("--output", metavar="FILE",
+                        help="Write the CSV of every game to FILE instead of stdout.")
+    parser.add_argument("--summary", metavar="FILE",
+                        help="Also write the CSV summary per combination to FILE.")
+    args = parser.parse_args(argv)
+
+    width, height = args.board
+    todo = tasks(args.param, args.seeds, args.first_seed, args.player, width, height,
+                 args.max_ticks)
+    sys.stderr.write("Playing {} games on {} worker process(es).\n".format(
+        len(todo), args.processes or multiprocessing.cpu_count()
+    ))
+
+    rows   = []
+    stream = sys.stdout if args.output is None else open(args.output, "w")
+    # One game per process: the peak memory of the process is the peak of that game
+    pool   = multiprocessing.Pool(args.processes, _initWorker, maxtasksperchild=1)
+    try:
+        writer = csv.DictWriter(stream, COLUMNS, lineterminator="\n")
+        writer.writeheader()
+        for row in pool.imap_unordered(playGame, todo):
+            writer.writerow(row)
+            stream.flush()
+            rows.append(row)
+        pool.close()
+    except KeyboardInterrupt:
+        sys.stderr.write("Interrupted after {} of {} games.\n".format(len(rows),
+                                                                     len(todo)))
+        pool.terminate()
+    except BaseException:
+        # Joining a pool that is still running would raise instead of this
+        pool.terminate()
+        raise
+    finally:
+        pool.join()
+        if stream is not sys.stdout:
+            stream.close()
+
+    summary = summarize(rows)
+    printSummary(summary)
+    if args.summary:
+        with open(args.summary, "w") as f:
+            writer = csv.DictWriter(f, SUMMARY_COLUMNS, lineterminator="\n")
+            writer.writeheader()
+            writer.writerows(summary)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
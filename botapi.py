@@ -0,0 +1,259 @@
+'''
+The ``botapi`` module lets other programs on the same machine play the game: a
+:class:`botapi.BotServer` listens on a local socket (a Unix domain socket, or a named
+pipe on Windows), accepts commands for CitizenPac, and streams an observation frame to
+every connected bot after each tick.  It runs on the Qt event loop like the rest of the
+game, so neither reading commands nor sending frames ever blocks the GUI.
+
+Both directions use fixed size binary records, so there is no framing overhead and a
+bot can send any number of commands with a single write.  All values are little endian.
+
+**Server to bot**: one ``HELLO`` (magic ``b"CPBT"``, version, number of movers, number of
+Food), then observation frames.  A frame is the :func:`shmexport.frameStruct` part of a
+:mod:`shmexport` frame followed by the Food eaten mask, i.e. its size follows from the
+``HELLO``.  A frame is sent right after the ``HELLO``, and after every tick (see
+``SUBSCRIBE``).  A bot that does not keep up misses frames rather than slowing the game
+down; the sequence number of a frame is the tick it was taken after.
+
+**Bot to server**: ``COMMAND`` records of code, value and parameter:
+
++------------------+------------------------------------------------------------------+
+| Code             | Meaning                                                          |
++==================+==================================================================+
+| ``MOVE``         | Set the ``moveFlags`` of CitizenPac to the value.                |
++------------------+------------------------------------------------------------------+
+| ``PAUSE_TOGGLE`` | Same as releasing the space bar.                                 |
++------------------+------------------------------------------------------------------+
+| ``SUBSCRIBE``    | Send a frame after every parameter-th tick, ``0`` for none.  The |
+|                  | default is ``1``.                                                |
++------------------+------------------------------------------------------------------+
+
+A bot sending anything else is disconnected.  Commands are ignored while the scene's
+input is locked (e.g. while a recording is played back).  A bot's moves and pauses are
+recorded by a :class:`replay.InputRecorder` like keyboard input.
+
+For bots written in Python, :class:`botapi.BotClient` implements the bot side.
+'''
+
+import socket
+import struct
+
+from PyQt4 import QtCore, QtGui, QtNetwork
+
+import constants
+from model import SceneObserver
+from shmexport import frameStruct, frameValues
+
+__all__ = ["BotServer", "BotClient"]
+
+MAGIC   = b"CPBT"
+''' The first four bytes the server sends. '''
+
+VERSION = 1
+''' The version of the protocol spoken by :class:`botapi.BotServer`. '''
+
+HELLO   = struct.Struct("<4sHHI")
+COMMAND = struct.Struct("<BBH")
+
+MOVE         = 1
+PAUSE_TOGGLE = 2
+SUBSCRIBE    = 3
+
+MAX_PENDING  = 1 << 20
+''' A bot with more than this many bytes of frames not yet sent to it skips frames. '''
+
+MOVE_MASK = constants.STATIONARY | constants.MOVE_NORTH | constants.MOVE_SOUTH | \
+            constants.MOVE_EAST  | constants.MOVE_WEST
+
+
+class _Bot(object):
+    '''
+    The server side state of one connected bot.
+    '''
+    def __init__(self, connection):
+        self.connection = connection
+        self.pending    = bytearray()
+        self.interval   = 1
+
+
+class BotServer(SceneObserver):
+    '''
+    Accepts bots on the local socket ``name`` and lets them play ``game``.
+
+    :Parameters:
+        ``game`` (:class:`controller.GameController`)
+            The game to play.  Its scene must already have been generated.
+
+        ``name`` (str)
+            The name of the local socket.  On Unix this is a path, or a file name in the
+            temporary directory if it is not absolute; any stale socket is removed.
+    '''
+    def __init__(self, game, name):
+        scene = game.scene
+
+        self.game      = game
+        self.bots      = []
+        self.numMovers = len(scene.movers)
+        self.frame     = frameStruct(self.numMovers)
+        self.hello     = HELLO.pack(MAGIC, VERSION, self.numMovers, len(scene.food))
+
+        QtNetwork.QLocalServer.removeServer(name)
+        self.server = QtNetwork.QLocalServer()
+        if not self.server.listen(name):
+            raise RuntimeError(
+                "Unable to listen on [{}]: {}".format(name, self.server.errorString())
+            )
+        self.server.newConnection.connect(self.__accept)
+        scene.addObserver(self)
+
+    def fullServerName(self):
+        '''
+        :Return:
+            ``str``
+                The path (or pipe name) bots connect to.
+        '''
+        return str(self.server.fullServerName())
+
+    def __accept(self):
+        while self.server.hasPendingConnections():
+            connection = self.server.nextPendingConnection()
+            bot        = _Bot(connection)
+            self.bots.append(bot)
+            # Bind the bot now, the loop variable will have moved on by the time the
+            # signals fire
+            connection.readyRead.connect(lambda bot=bot: self.__read(bot))
+            connection.disconnected.connect(lambda bot=bot: self.__drop(bot))
+            connection.write(self.hello + self.__encodeFrame())
+
+    def __drop(self, bot):
+        if bot in self.bots:
+            self.bots.remove(bot)
+            bot.connection.deleteLater()
+
+    def __read(self, bot):
+        pending  = bot.pending
+        pending += bytes(bot.connection.readAll())
+        size     = COMMAND.size
+        usable   = len(pending) - len(pending) % size
+        for offset in range(0, usable, size):
+            code, value, param = COMMAND.unpack_from(pending, offset)
+            if not self.__execute(bot, code, value, param):
+                bot.connection.abort()
+                self.__drop(bot)
+                return
+        del pending[:usable]
+
+    def __execute(self, bot, code, value, param):
+        scene = self.game.scene
+        if code == SUBSCRIBE:
+            bot.interval = param
+        elif code == MOVE:
+            if value & ~MOVE_MASK:
+                return False
+            if not scene.inputLocked:
+                scene.citizenPac.moveFlags = value or constants.STATIONARY
+        elif code == PAUSE_TOGGLE:
+            # Through the scene, so that observers see it like the real key
+            scene.keyReleaseEvent(QtGui.QKeyEvent(QtCore.QEvent.KeyRelease,
+                                                  QtCore.Qt.Key_Space,
+                                                  QtCore.Qt.NoModifier))
+        else:
+            return False
+        return True
+
+    def __encodeFrame(self):
+        scene = self.game.scene
+        return self.frame.pack(*frameValues(self.game, scene.tick)) + \
+            bytes(scene.foodEatenMask)
+
+    def tickFinished(self, scene):
+        data = None
+        tick = scene.tick
+        for bot in self.bots:
+            if not bot.interval or tick % bot.interval:
+                continue
+            if bot.connection.bytesToWrite() > MAX_PENDING:
+                continue
+            if data is None:
+                data = self.__encodeFrame()
+            bot.connection.write(data)
+
+    def close(self):
+        '''
+        Disconnects every bot and stops listening.
+        '''
+        self.game.scene.removeObserver(self)
+        for bot in list(self.bots):
+            bot.connection.abort()
+            self.__drop(bot)
+        self.server.close()
+
+
+class BotClient(object):
+    '''
+    A minimal, blocking implementation of the bot side of the protocol for Unix domain
+    sockets.  It only uses the standard library socket module, so it works in any
+    process without a Qt event loop.
+
+    :Parameters:
+        ``path`` (str)
+            The socket to connect to, see :func:`botapi.BotServer.fullServerName`.
+
+    :Attributes:
+        ``numMovers`` (int), ``numFood`` (int)
+            The size of the scene, from the ``HELLO``.
+    '''
+    def __init__(self, path):
+        self.socket = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.socket.connect(path)
+        magic, version, self.numMovers, self.numFood = HELLO.unpack(
+            self.__receive(HELLO.size)
+        )
+        if magic != MAGIC or version != VERSION:
+            raise RuntimeError("Not a CitizenPac bot server, or an unsupported version.")
+        self.frame    = frameStruct(self.numMovers)
+        self.commands = []
+
+    def __receive(self, size):
+        data = b""
+        while len(data) < size:
+            chunk = self.socket.recv(size - len(data))
+            if not chunk:
+                raise RuntimeError("The bot server closed the connection.")
+            data += chunk
+        return data
+
+    def move(self, flags):
+        ''' Queues setting the ``moveFlags`` of CitizenPac, see :func:`botapi.BotClient.send`. '''
+        self.commands.append(COMMAND.pack(MOVE, flags, 0))
+
+    def togglePause(self):
+        ''' Queues pausing / resuming the game, see :func:`botapi.BotClient.send`. '''
+        self.commands.append(COMMAND.pack(PAUSE_TOGGLE, 0, 0))
+
+    def subscribe(self, interval):
+        ''' Queues receiving a frame every ``interval`` ticks (``0`` for none). '''
+        self.commands.append(COMMAND.pack(SUBSCRIBE, 0, interval))
+
+    def send(self):
+        '''
+        Sends every queued command with a single write.
+        '''
+        if self.commands:
+            self.socket.sendall(b"".join(self.commands))
+            del self.commands[:]
+
+    def receive(self):
+        '''
+        Waits for the next observation frame.
+
+        :Return:
+            ``tuple``
+                The values of the :func:`shmexport.frameStruct` part of the frame, and
+                the Food eaten mask as ``bytes``.
+        '''
+        values = self.frame.unpack(self.__receive(self.frame.size))
+        return values, self.__receive(self.numFood)
+
+    def close(self):
+        self.socket.close()
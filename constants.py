@@ -19,9 +19,16 @@ help test whether or not you are placing the food in the correct location or not
 
 __all__ = [
     "STATIONARY", "MOVE_NORTH", "MOVE_SOUTH", "MOVE_EAST", "MOVE_WEST",
-    "GAME_SPEED_START", "gameSpeed", "setGameSpeed", "MAX_SPEED", "USE_SPEED_BOOST",
+    "GAME_SPEED_START", "MAX_SPEED", "USE_SPEED_BOOST",
     "FOOD_RADIUS", "FOOD_SPARSITY", "SPLINE_COORD_SCALE",
-    "FOOD_VALUE", "FULL_GAME_MODE", "NUM_LIVES", "NUM_GHOSTS", "DISPERSION_RADIUS"
+    "FOOD_VALUE", "FULL_GAME_MODE", "NUM_LIVES", "NUM_GHOSTS", "NUM_PLAYERS",
+    "DISPERSION_RADIUS",
+    "REWIND_BUFFER_BYTES", "REWIND_KEYFRAME_INTERVAL", "REWIND_STEP_TICKS",
+    "PERF_OVERLAY_REFRESH", "WATCHDOG_THRESHOLD", "WATCHDOG_SAMPLE_INTERVAL",
+    "PROFILE_SECONDS", "ALLOCATION_WINDOW_TICKS", "LEAK_WINDOW", "SIMULATION_MAX_LAG",
+    "HEADLESS_BOARD", "EXPORT_FPS", "EXPORT_QUEUE_FRAMES", "SOAK_INTERVAL",
+    "SOAK_MAX_RSS_GROWTH", "SOAK_MAX_QT_GROWTH", "SOAK_MAX_TICK_SLOWDOWN", "NET_PORT",
+    "NET_PLAYERS", "NET_TIMEOUT", "SPECTATE_KEYFRAME_TICKS"
 ]
 
 ########################################################################################
@@ -44,16 +51,13 @@ MOVE_WEST  = (1 << 4)
 ''' Represents when :class:`view.actors.Actor` should move ``West``. '''
 
 ########################################################################################
-# Game Speed related constants / function.                                             #
+# Game Speed related constants.                                                        #
 ########################################################################################
 
 GAME_SPEED_START = 2.0
-''' The starting speed of the game.  Must always be strictly positive (:math:`> 0`).'''
-
-gameSpeed        = GAME_SPEED_START
 '''
-The current speed of the game, initialized as :data:`constants.GAME_SPEED_START`.  To
-update the value of the game speed, call :func:`constants.setGameSpeed`.
+The starting speed of the game.  Must always be strictly positive (:math:`> 0`).  The
+current speed of a game is ``settings.gameSpeed`` of its :class:`model.Settings`.
 '''
 
 MAX_SPEED        = 10.0
@@ -73,21 +77,6 @@ faster all of the actors move.  The game speed will start at
 '''
 
 
-def setGameSpeed(val):
-    '''
-    Wrapper method to allow updating the global variable :data:`constants.gameSpeed` in
-    this module from another module, without necessitating ``from Constants import *``.
-
-    This sets the value of :data:`constants.gameSpeed` to ``val``.
-
-    :Parameters:
-        ``val`` (float)
-            The value to set :data:`constants.gameSpeed` to.
-    '''
-    global gameSpeed
-    gameSpeed = val
-
-
 ########################################################################################
 # Actor sizing related constants.                                                      #
 ########################################################################################
@@ -155,6 +144,14 @@ You can set :data:`constants.FULL_GAME_MODE` to ``True`` if you want to create m
 for some reason.
 '''
 
+NUM_PLAYERS        = 1
+'''
+How many CitizenPacs to add to the map.  They are dispersed on the same circle as the
+Ghosts, and share the lives and the score.  More than one only makes sense when every
+CitizenPac has a player of its own, i.e. in a networked game (see the ``netplay``
+module).
+'''
+
 DISPERSION_RADIUS  = 222.222
 '''
 CitizenPac and the Ghosts are dispersed on a circle centered at the origin.  This
@@ -167,3 +164,121 @@ If the game is running slowly, INCREASE the value of this constant in order to g
 This time is in terms of MILLISECONDS, and the **larger** the value, the **slower**
 the game runs.  So if the game runs slowly, increase this constant.
 '''
+
+########################################################################################
+# Rewind related constants.                                                            #
+########################################################################################
+REWIND_BUFFER_BYTES      = 4 * 1024 * 1024
+'''
+The most memory (in bytes) the :class:`rewind.RewindBuffer` of a game may use.  Once it
+is full the oldest ticks are discarded; at the default game speed a tick takes about
+``100`` bytes, so this keeps roughly the last ten minutes of play.
+'''
+
+REWIND_KEYFRAME_INTERVAL = 500
+'''
+The number of ticks between two full snapshots in the :class:`rewind.RewindBuffer`.  All
+other ticks only store what changed, so a larger value uses less memory but makes
+rewinding slower.
+'''
+
+REWIND_STEP_TICKS        = 100
+''' How many ticks pressing ``<backspace>`` rewinds.  The game is paused afterward. '''
+
+########################################################################################
+# Performance overlay related constants.                                               #
+########################################################################################
+PERF_OVERLAY_REFRESH     = 250
+''' How often (in milliseconds) the performance overlay (``<F3>``) is updated. '''
+
+WATCHDOG_THRESHOLD       = 3.0
+'''
+A tick or paint taking longer than this many times :data:`constants.GAME_REFRESH_RATE` is
+sampled by the :class:`slowframes.FrameWatchdog` (``--watchdog``).
+'''
+
+WATCHDOG_SAMPLE_INTERVAL = 1
+''' How often (in milliseconds) the stack of a slow frame is sampled. '''
+
+PROFILE_SECONDS          = 30
+'''
+How many seconds of play a :class:`profiling.ProfileSession` (``--profile``) covers,
+counted from the first press of the space bar.
+'''
+
+ALLOCATION_WINDOW_TICKS  = 600
+'''
+How many ticks an :class:`allocations.AllocationTracker` (``--allocations``) measures.
+'''
+
+LEAK_WINDOW              = 3
+'''
+A :class:`leaks.LeakDetector` (``--leaks``) reports what grew between each of the last
+this many pairs of heap snapshots, i.e. over one whole game with
+:data:`constants.NUM_LIVES` lives.
+'''
+
+SIMULATION_MAX_LAG       = 5
+'''
+How many ticks the :class:`simulation.SimulationThread` (``--threaded``) may fall behind
+its fixed rate and still catch up.  Beyond that the missed ticks are dropped.
+'''
+
+HEADLESS_BOARD           = (780, 700)
+'''
+The board size of a headless game played by the autopilot (``--headless --autopilot``),
+the size of the board in the default window.
+'''
+
+EXPORT_FPS               = 30
+''' The frames per second of game time of a :class:`frameexport.FrameExporter`. '''
+
+EXPORT_QUEUE_FRAMES      = 16
+'''
+How many rendered frames a :class:`frameexport.FrameExporter` (``--export``) keeps
+waiting for the encoders before rendering blocks.  A frame of the default board is about
+2MB.
+'''
+
+SOAK_INTERVAL            = 60
+''' How often (in seconds) a :class:`soak.SoakRunner` (``--soak``) logs a sample. '''
+
+SOAK_MAX_RSS_GROWTH      = 64 * 1024 * 1024
+'''
+By how many bytes the resident memory may grow beyond the first sample of a soak run
+before it is flagged as drift.
+'''
+
+SOAK_MAX_QT_GROWTH       = 200
+'''
+By how many live Qt objects the count may grow beyond the first sample of a soak run
+before it is flagged as drift.
+'''
+
+SOAK_MAX_TICK_SLOWDOWN   = 2.0
+'''
+How many times slower than in the first sample of a soak run the 95th percentile tick
+may get before it is flagged as drift.
+'''
+
+########################################################################################
+# Network related constants.                                                           #
+########################################################################################
+NET_PORT                 = 47810
+''' The UDP port a :class:`netplay.GameServer` (``--serve``) listens on by default. '''
+
+NET_PLAYERS              = 2
+''' How many players a :class:`netplay.GameServer` accepts by default. '''
+
+NET_TIMEOUT              = 5.0
+'''
+How many seconds a :class:`netplay.NetClient` waits for the server to answer, and how
+many seconds without input the server waits before it frees the player's CitizenPac.
+'''
+
+SPECTATE_KEYFRAME_TICKS  = 100
+'''
+How many ticks apart a :class:`spectate.SpectatorServer` sends a full snapshot.  Between
+two of them it only sends deltas; a spectator that connects, or falls behind, catches up
+from the latest one.
+'''
@@ -4,11 +4,15 @@ The Controller in the Model-View-Controller paradigm.
 
 # FILE VERSION: released 5/5/2017 @ 13:00
 
+import os
 from PyQt4 import QtCore, QtGui
 
-import constants
-from model import Scene
-from view.display import GameStats
+import snapshot
+from model import Scene, Settings, seedRandom
+from perfstats import PerfMonitor
+from rewind import RewindBuffer
+from tracing import PaintTracer
+from view.display import GameStats, PerfOverlay
 
 
 class LostFocusFilter(QtCore.QObject):
@@ -59,10 +63,397 @@ class LostFocusFilter(QtCore.QObject):
         return False
 
 
-class CitizenPac(object):
+class GameController(object):
+    '''
+    The rules of the game, independent of how (or whether) the game is displayed.  The
+    :class:`model.Scene` reports collisions to the controller through
+    :func:`controller.GameController.foodConsumed`,
+    :func:`controller.GameController.lostLife` and
+    :func:`controller.GameController.gameWon`, which update the state below and then
+    call the ``display*`` methods.  Those do nothing here; subclasses override them to
+    show the result somewhere.
+
+    - :class:`controller.CitizenPac` is the real game with a window.
+    - :class:`controller.HeadlessCitizenPac` has no window at all and is advanced
+      explicitly, e.g. to play back a recording at full speed.
+
+    :Parameters:
+        ``settings`` (:class:`model.Settings`)
+            The configuration of this game, ``None`` for the defaults.
+
+    :Attributes:
+        ``settings`` (:class:`model.Settings`)
+            The configuration of this game and its current speed, shared with the
+            scene.
+
+        ``scene`` (:class:`model.Scene`)
+            The Model portion of the Model-View-Controller paradigm.  Created by the
+            subclass.
+
+        ``seed`` (int)
+            The seed the random number generators were seeded with before the scene was
+            generated, see :func:`model.seedRandom`.
+
+        ``gameRunning`` (bool)
+            Whether or not the game is currently running.
+
+        ``gameFinished`` (bool)
+            Whether or not the game has been completed (all food consumed, or have
+            run out of lives).
+
+        ``livesLeft`` (int)
+            The number of lives left.
+
+        ``speedIncr`` (float)
+            The game speed increment for the given game.  Refer to the documentation
+            for :data:`constants.USE_SPEED_BOOST`.
+
+        ``rewindBuffer`` (:class:`rewind.RewindBuffer`)
+            The recent history of the game, created with the scene.  ``None`` when
+            rewinding has been disabled with
+            :func:`controller.GameController.setRewindEnabled`.
+    '''
+    def __init__(self, settings=None):
+        self.settings     = settings if settings is not None else Settings()
+        self.scene        = None
+        self.seed         = None
+        self.gameRunning  = False
+        self.gameFinished = False
+        self.livesLeft    = self.settings.numLives
+        self.speedIncr    = 0.0
+        self.rewindBuffer = None
+
+    def generateScene(self, width, height):
+        '''
+        Sets the bounding region of ``self.scene`` (this is what defines the coordinate
+        system of the entire game), creates all of the actors, computes the
+        ``speedIncr`` now that the total amount of Food is known and starts recording
+        the history of the game in ``self.rewindBuffer``.
+
+        :Parameters:
+            ``width`` (float)
+                The width of the game board.
+
+            ``height`` (float)
+                The height of the game board.
+        '''
+        half_width  = width  * 0.5
+        half_height = height * 0.5
+        self.scene.setSceneRect(-half_width, -half_height, width, height)
+
+        self.scene.generate(width, height)
+        fLen = float(len(self.scene.food))
+        if fLen == 0.0:
+            self.speedIncr = 0.0
+        else:
+            settings       = self.settings
+            self.speedIncr = (settings.maxSpeed - settings.gameSpeedStart) / fLen
+
+        self.rewindBuffer = RewindBuffer(self)
+
+    def speedBoost(self):
+        '''
+        Computes by how much the game speed (``settings.gameSpeed``) has been boosted.
+
+        :Return:
+            ``float``
+                The boost as a percentage of the way from ``settings.gameSpeedStart`` to
+                ``settings.maxSpeed``.
+        '''
+        settings = self.settings
+        boost    = (settings.gameSpeed - settings.gameSpeedStart) / \
+                   (settings.maxSpeed - settings.gameSpeedStart)
+        return round(boost * 100.0)
+
+    ####################################################################################
+    #
+    ##
+    ### Display interface: called after the state changed, override to show it.
+    ##
+    #
+    ####################################################################################
+    def displayScore(self, score):
+        ''' Called with the new score after Food was eaten or the scene was reset. '''
+        pass
+
+    def displaySpeedBoost(self, boost):
+        ''' Called with :func:`controller.GameController.speedBoost` when it changed. '''
+        pass
+
+    def displayLives(self, lives):
+        ''' Called with the new number of lives left after a life was lost. '''
+        pass
+
+    def displayRunning(self, running):
+        ''' Called after :func:`controller.GameController.gameRunningSwitched`. '''
+        pass
+
+    def togglePerfOverlay(self):
+        ''' Called when ``<F3>`` is released, there is nothing to show without a window. '''
+        pass
+
+    def watchFrames(self, watchdog):
+        '''
+        Lets ``watchdog`` (e.g. a :class:`slowframes.FrameWatchdog`, an
+        :class:`allocations.AllocationTracker` or a :class:`latency.LatencyProbe`) watch
+        the paints as well as the ticks it observes on its own, through its
+        ``paintStarted`` and ``paintFinished`` methods.
+        There is nothing to paint without a window.
+        '''
+        pass
+
+    ####################################################################################
+    #
+    ##
+    ### Public interface: methods called by other components to signal to the controller
+    ##                    some form of important action occurred.
+    #
+    ####################################################################################
+    def appLostFocus(self):
+        '''
+        When the application has lost focus, make sure to force CitizenPac to stop
+        moving.  This is called from the :class:`controller.LostFocusFilter` instance
+        created in the constructor of :class:`controller.CitizenPac`.  Without this,
+        because of how the movement is being represented, CitizenPac would keep moving
+        on their own!  For example, if you hold the ``w`` key and then switch to a
+        different application, the ``w`` released event was never sent so CitizenPac
+        keeps moving ``North``.  Ignored while the scene's input is locked (e.g. during
+        a replay).
+        '''
+        if self.scene and self.scene.citizenPac and not self.scene.inputLocked:
+            self.scene.citizenPac.setStationary()
+
+    def errorOut(self):
+        '''
+        Called from **within** an ``except`` clause when something went wrong that the
+        game cannot recover from.  Without a window to show the error in, the exception
+        being handled is simply raised again.
+        '''
+        raise
+
+    def foodConsumed(self):
+        '''
+        This method computes the current score and (if ``settings.useSpeedBoost`` is
+        ``True``, see :data:`constants.USE_SPEED_BOOST`) current game speed.  The score
+        and speed are computed using the :func:`model.Scene.numFoodEaten` method.  This
+        method is also called by :func:`controller.GameController.lostLife` to reset the
+        score and speed boost since the food have all been reinitialized.
+        '''
+        # Calculate and set the current game score
+        settings  = self.settings
+        currScore = self.scene.numFoodEaten() * settings.foodValue
+        with self.scene.tracer.span("hud"):
+            self.displayScore(currScore)
+
+        # Increase the speed
+        if settings.useSpeedBoost:
+            # Calculate and set the current game speed
+            speed = settings.gameSpeedStart + (self.speedIncr * self.scene.numFoodEaten())
+            settings.gameSpeed = speed
+            with self.scene.tracer.span("hud"):
+                self.displaySpeedBoost(self.speedBoost())
+
+    def gameWon(self):
+        '''
+        When the game is won, this method triggers the game won message to be displayed
+        by setting ``self.gameFinished = True`` and calling the
+        :func:`controller.GameController.gameRunningSwitched` method.
+        '''
+        self.gameFinished = True
+        self.gameRunningSwitched()
+
+    def gameRunningSwitched(self):
+        '''
+        The game running state can be switched when one of three events occur:
+
+        1. The user hit the space bar, to pause or resume the game.
+        2. A life was lost (:func:`controller.GameController.lostLife`)
+        3. The game was won (:func:`controller.GameController.gameWon`)
+
+        The method then propagates to the scene whether or not the game is running, and
+        calls :func:`controller.GameController.displayRunning`.
+        '''
+        self.gameRunning = not self.gameRunning and self.livesLeft > 0.0 and not self.gameFinished
+        self.scene.setRunning(self.gameRunning)
+        with self.scene.tracer.span("hud"):
+            self.displayRunning(self.gameRunning)
+
+        for observer in self.scene.observers:
+            observer.runningSwitched(self.scene)
+
+    def lostLife(self):
+        '''
+        When CitizenPac collides with a ghost in the :func:`model.Scene.advance` method,
+        this method is called to update the scoreboards.  It proceeds by performing
+
+        1. Updating the number of lives left and switching the game running state via
+           :func:`controller.GameController.gameRunningSwitched`.
+        2. Resetting the entire scene via :func:`model.Scene.reset`.
+        3. Resetting the score and speed boost via
+           :func:`controller.GameController.foodConsumed`.
+        '''
+        # Decrease the lives and pause or end the game depending on number of lives
+        self.livesLeft -= 1
+        with self.scene.tracer.span("hud"):
+            self.displayLives(self.livesLeft)
+        self.gameRunningSwitched()
+
+        # Reset the scene
+        try:
+            self.scene.reset()
+        except:
+            self.errorOut()
+
+        # Reset the score and game speed
+        self.foodConsumed()
+
+    def saveState(self, path):
+        '''
+        Saves the complete state of the game to ``path`` using :func:`snapshot.save`.
+        A game that is already over (won or out of lives) is not worth resuming, so in
+        that case any existing file at ``path`` is removed instead.
+
+        :Parameters:
+            ``path`` (str)
+                The file to save the game to.
+        '''
+        if self.gameFinished or self.livesLeft <= 0:
+            if os.path.exists(path):
+                os.remove(path)
+            return
+
+        snapshot.save(self, path)
+
+    def restoreState(self, path):
+        '''
+        Restores a game previously saved with :func:`controller.GameController.saveState`,
+        see :func:`controller.GameController.restoreSnapshot`.
+
+        :Parameters:
+            ``path`` (str)
+                The file to restore the game from.
+        '''
+        with open(path, "rb") as f:
+            data = f.read()
+        self.restoreSnapshot(data)
+
+    def restoreSnapshot(self, data):
+        '''
+        Restores a state captured by :func:`snapshot.capture` and refreshes the displays
+        to match.  The game is paused afterward, just like after losing a life.
+
+        :Parameters:
+            ``data`` (bytes)
+                The encoded snapshot.
+        '''
+        snapshot.restore(self, data)
+
+        self.displayRunning(False)
+        self.displayLives(self.livesLeft)
+        self.displayScore(self.scene.numFoodEaten() * self.settings.foodValue)
+        if self.settings.useSpeedBoost:
+            self.displaySpeedBoost(self.speedBoost())
+
+        for observer in self.scene.observers:
+            observer.sceneRestored(self.scene)
+
+    def rewind(self, ticks):
+        '''
+        Jumps back ``ticks`` ticks using :func:`rewind.RewindBuffer.rewind`, leaving the
+        game paused.  Does nothing while the scene's input is locked, when rewinding is
+        disabled, or when nothing was recorded before the current tick.
+
+        :Parameters:
+            ``ticks`` (int)
+                How many ticks to go back.
+        '''
+        if self.rewindBuffer and not self.scene.inputLocked:
+            self.rewindBuffer.rewind(ticks)
+
+    def setRewindEnabled(self, enabled):
+        '''
+        Starts or stops recording the history of the game.  A recorded replay log can
+        only move forward, so rewinding must be disabled while recording one.
+
+        :Parameters:
+            ``enabled`` (bool)
+                Whether to keep a :class:`rewind.RewindBuffer`.
+        '''
+        if enabled and not self.rewindBuffer:
+            self.rewindBuffer = RewindBuffer(self)
+        elif not enabled and self.rewindBuffer:
+            self.rewindBuffer.close()
+            self.rewindBuffer = None
+
+    def setTracer(self, tracer):
+        '''
+        Starts recording how long the phases of every tick take, see :mod:`tracing`.
+
+        :Parameters:
+            ``tracer`` (:class:`tracing.Tracer`)
+                The tracer to record to.
+        '''
+        self.scene.tracer = tracer
+
+
+class HeadlessCitizenPac(GameController):
+    '''
+    A game without a window.  Nothing drives it on its own: call
+    :func:`controller.HeadlessCitizenPac.run` (or :func:`model.Scene.advance` directly)
+    to advance it, as fast as the machine allows.  A ``QApplication`` must exist before
+    one is created, e.g. ``QtGui.QApplication([], False)`` which does not need a display.
+
+    Since no event loop runs the Ghosts' timers, the Ghosts change direction every
+    ``settings.ghostMoveTime`` milliseconds of *game* time instead
+    (see :func:`model.Scene.setGhostMoveTicks`).
+
+    :Parameters:
+        ``width`` (float)
+            The width of the game board.
+
+        ``height`` (float)
+            The height of the game board.
+
+        ``seed`` (int)
+            The seed for :func:`model.seedRandom`, ``None`` for a random one.
+
+        ``settings`` (:class:`model.Settings`)
+            The configuration of this game, ``None`` for the defaults.  Every game needs
+            its own.
+    '''
+    def __init__(self, width, height, seed=None, settings=None):
+        super(HeadlessCitizenPac, self).__init__(settings)
+        self.seed  = seedRandom(seed)
+        self.scene = Scene(self, None, self.settings)
+        self.generateScene(width, height)
+        self.scene.setGhostMoveTicks(self.settings.ghostMoveTicks())
+
+    def run(self, ticks):
+        '''
+        Advances the game by up to ``ticks`` ticks, stopping early when the game is paused
+        (e.g. a life was lost, or the game was won).
+
+        :Parameters:
+            ``ticks`` (int)
+                The maximum number of ticks to advance.
+
+        :Return:
+            ``int``
+                The number of ticks that were actually advanced.
+        '''
+        scene = self.scene
+        done  = 0
+        while done < ticks and self.gameRunning:
+            scene.advance()
+            done += 1
+        return done
+
+
+class CitizenPac(GameController):
     '''
     The main controller.  This class is responsible for creating, configuring, and
-    driving the Model and View portions of the Model-View-Controller paradigm.
+    driving the Model and View portions of the Model-View-Controller paradigm.  The
+    rules themselves are inherited from :class:`controller.GameController`.
 
     :Parameters:
 
@@ -81,6 +472,18 @@ class CitizenPac(object):
                 off these labels, and the names are hard-coded in this file.  In short:
                 **do not rename widgets without updating this file!**
 
+        ``seed`` (int)
+            The seed for :func:`model.seedRandom`, ``None`` for a random one.  Playing
+            back a recording requires the same seed it was recorded with.
+
+        ``sceneSize`` (tuple)
+            The ``(width, height)`` of the game board.  By default the size of the
+            graphics view is used; playing back a recording requires the board it was
+            recorded on.
+
+        ``settings`` (:class:`model.Settings`)
+            The configuration of this game, ``None`` for the defaults.
+
     :Attributes:
 
         **Qt Wrappers**
@@ -106,6 +509,11 @@ class CitizenPac(object):
                 The game speed increment for the given game.  Refer to the documentation
                 for :data:`constants.USE_SPEED_BOOST`.
 
+            ``statePath`` (str)
+                When not ``None``, the game is saved to this file with
+                :func:`controller.CitizenPac.saveState` every time it is paused.  Set
+                from the ``--resume`` command line option.
+
         **Mechanics Variables**
             ``view`` (:class:`PyQt4.QtGui.QGraphicsView`)
                 The View portion of the Model-View-Controller paradigm.  Also a
@@ -118,7 +526,7 @@ class CitizenPac(object):
             ``gameTimer`` (:class:`PyQt4.QtCore.QTimer`)
                 The game timer used to trigger updates to all actors in the scene,
                 connected directly to the :func:`model.Scene.advance` method.  Its (and
-                therefore the game's) refresh rate is defined by
+                therefore the game's) refresh rate is ``settings.refreshRate``, see
                 :data:`constants.GAME_REFRESH_RATE`.
 
         **Display Related Variables**
@@ -143,8 +551,22 @@ class CitizenPac(object):
             ``dMessage`` (:class:`PyQt4.QtGui.QGraphicsSimpleTextItem`)
                 The directions message, indicating ``Press <space> to Play``, or that
                 the game has been won or lost.
+
+            ``perfOverlay`` (:class:`view.display.PerfOverlay`)
+                The performance overlay toggled with ``<F3>``, ``None`` until it is
+                first shown.  ``perfMonitor`` (:class:`perfstats.PerfMonitor`) feeds it
+                while it is visible.
+
+            ``paintTracer`` (:class:`tracing.PaintTracer`)
+                Times the paints of the view for tracing and the performance overlay,
+                ``None`` until either needs it.
+
+            ``simulation`` (:class:`simulation.SimulationDriver`)
+                Set while the game is advanced on a worker thread (``--threaded``), which
+                is told about pausing, resuming and losing focus.  ``None`` otherwise.
     '''
-    def __init__(self, app, cpMainWindow):
+    def __init__(self, app, cpMainWindow, seed=None, sceneSize=None, settings=None):
+        super(CitizenPac, self).__init__(settings)
         ################################################################################
         # Get references to the Qt managed elements, create convenience references to  #
         # the items coming from the generated ui, install the focus filter.            #
@@ -156,10 +578,12 @@ class CitizenPac(object):
         ################################################################################
         # Declare internal state, cannot initialize values for most until later.       #
         ################################################################################
-        self.gameRunning  = False
-        self.gameFinished = False
-        self.livesLeft    = constants.NUM_LIVES
-        self.speedIncr    = 0.0
+        self.statePath    = None
+        self.seed         = seedRandom(seed)
+        self.paintTracer  = None
+        self.perfMonitor  = None
+        self.perfOverlay  = None
+        self.simulation   = None
 
         ################################################################################
         # Configure the View Part 1: setup the game stats bar.                         #
@@ -176,9 +600,9 @@ class CitizenPac(object):
         # Portion 2 of the View: the main drawing window (and scene).                  #
         ################################################################################
         self.view  = self.cpMainWindow.citizenPacGraphicsView
-        self.scene = Scene(self, self.view)
+        self.scene = Scene(self, self.view, self.settings)
         self.cpMainWindow.attachScene(self.scene)
-        self.__perform_layout()
+        self.__perform_layout(sceneSize)
 
         ################################################################################
         # Adaptable render hints, some e.g. scene indexing method.                     #
@@ -202,7 +626,7 @@ class CitizenPac(object):
         self.gameTimer.timeout.connect(self.scene.advance)
         # Note: the game has not started!  self.gameTimer.start() is performed in the
         # gameRunningSwitched method.
-        self.gameTimer.setInterval(constants.GAME_REFRESH_RATE)
+        self.gameTimer.setInterval(self.settings.refreshRate)
 
     ####################################################################################
     #
@@ -211,11 +635,16 @@ class CitizenPac(object):
     ##
     #
     ####################################################################################
-    def __perform_layout(self):
+    def __perform_layout(self, sceneSize):
         '''
         This method is responsible for configuring the window and scene sizes, including
         generating all of the food and setting the correct keyboard focus of the entire
         application.
+
+        :Parameters:
+            ``sceneSize`` (tuple)
+                The ``(width, height)`` to use instead of the size of the view, or
+                ``None``.
         '''
         # We need the dimensions of the QGraphicsView item _before_ we can compute the
         # sizes, see http://stackoverflow.com/a/8024124/3814202
@@ -226,23 +655,16 @@ class CitizenPac(object):
         # Now that the layout manager has been executed, we can query the actual
         # starting width and height of the QGraphicsView instance to intialize the
         # starting locations of all the actors in the scene.
-        vRect       = self.view.contentsRect()
-        width       = vRect.width()
-        height      = vRect.height()
-        half_width  = width  * 0.5
-        half_height = height * 0.5
+        if sceneSize:
+            width, height = sceneSize
+        else:
+            vRect  = self.view.contentsRect()
+            width  = vRect.width()
+            height = vRect.height()
 
         # Set the bounding regions of the scene (this is what defines the coordinate
-        # system of the entire game).
-        self.scene.setSceneRect(-half_width, -half_height, width, height)
-
-        # Create all the actors and set the speedIncr now that we have the total food
-        self.scene.generate(width, height)
-        fLen = float(len(self.scene.food))
-        if fLen == 0.0:
-            self.speedIncr = 0.0
-        else:
-            self.speedIncr = (constants.MAX_SPEED - constants.GAME_SPEED_START) / fLen
+        # system of the entire game), create all the actors and set the speedIncr.
+        self.generateScene(width, height)
 
         # Since we want all keyboard input to apply to the scene (e.g. even if the mouse
         # is focused over the scoreboard), now that the context has been initialized we
@@ -366,18 +788,6 @@ class CitizenPac(object):
     ##                    some form of important action occurred.
     #
     ####################################################################################
-    def appLostFocus(self):
-        '''
-        When the application has lost focus, make sure to force CitizenPac to stop
-        moving.  This is called from the :class:`controller.LostFocusFilter` instance
-        created in the constructor of this class.  Without this, because of how the
-        movement is being represented, CitizenPac would keep moving on their own!  For
-        example, if you hold the ``w`` key and then switch to a different application,
-        the ``w`` released event was never sent so CitizenPac keeps moving ``North``.
-        '''
-        if self.scene and self.scene.citizenPac:
-            self.scene.citizenPac.setStationary()
-
     def errorOut(self):
         '''
         Convenience method for students to be able to see slightly more pretty error
@@ -446,85 +856,123 @@ class CitizenPac(object):
         self.cpMainWindow.setCentralWidget(editor)
         # END SYNTAXHIGHLIGHTER EXAMPLE CODE
 
-    def foodConsumed(self):
+    def appLostFocus(self):
         '''
-        This method computes the current score and (if :data:`constants.USE_SPEED_BOOST`
-        is set to ``True``) current game speed.  The score and speed are computed using
-        the :func:`model.Scene.numFoodEaten` method.  This method is also called by
-        :func:`controller.CitizenPac.lostLife` to reset the score and speed boost
-        since the food have all been reinitialized.
+        See :func:`controller.GameController.appLostFocus`.
         '''
-        # Calculate and set the current game score
-        currScore = self.scene.numFoodEaten() * constants.FOOD_VALUE
-        self.gameStats.displayGameScore(currScore)
-
-        # Increase the speed
-        if constants.USE_SPEED_BOOST:
-            # Calculate and set the current game speed
-            speed = constants.GAME_SPEED_START + (self.speedIncr * self.scene.numFoodEaten())
-            constants.setGameSpeed(speed)
+        super(CitizenPac, self).appLostFocus()
+        if self.simulation and not self.scene.inputLocked:
+            self.simulation.setStationary()
 
-            # Compute the boost to display
-            boost = (constants.gameSpeed - constants.GAME_SPEED_START) / \
-                    (constants.MAX_SPEED - constants.GAME_SPEED_START)
-            boost = round(boost * 100.0)
-            self.gameStats.displayGameSpeed(boost)
-
-    def gameWon(self):
+    def displayScore(self, score):
         '''
-        When the game is won, this method triggers the game won message to be displayed
-        by setting ``self.gameFinished = True`` and calling the
-        :func:`controller.CitizenPac.gameRunningSwitched` method.
+        Sets the game score display.  See :func:`controller.GameController.displayScore`.
         '''
-        self.gameFinished = True
-        self.gameRunningSwitched()
+        self.gameStats.displayGameScore(score)
 
-    def gameRunningSwitched(self):
+    def displaySpeedBoost(self, boost):
         '''
-        The game running state can be switched when one of three events occur:
+        Sets the game speed boost progress bar.  See
+        :func:`controller.GameController.displaySpeedBoost`.
+        '''
+        self.gameStats.displayGameSpeed(boost)
 
-        1. The user hit the space bar, to pause or resume the game.
-        2. A life was lost (:func:`controller.CitizenPac.lostLife`)
-        3. The game was won (:func:`controller.CitizenPac.gameWon`)
+    def displayLives(self, lives):
+        '''
+        Sets the lives left display.  See :func:`controller.GameController.displayLives`.
+        '''
+        self.gameStats.setLives(lives)
 
-        The method then propagates to the scene whether or not the game is running,
-        starts / stops the game timer, and triggers the pause / game won / game lost
-        screen to be displayed if the game is not running.
+    def displayRunning(self, running):
         '''
-        self.gameRunning = not self.gameRunning and self.livesLeft > 0.0 and not self.gameFinished
-        self.gameStats.setRunning(self.gameRunning)
-        self.scene.setRunning(self.gameRunning)
+        Checks / unchecks the game running checkbox, starts / stops the game timer, and
+        triggers the pause / game won / game lost screen to be displayed if the game is
+        not running.  When ``self.statePath`` is set, pausing also saves the game.  A
+        worker thread running the game (``self.simulation``) is paused or resumed too.
+        '''
+        self.gameStats.setRunning(running)
+        if self.simulation:
+            self.simulation.setRunning(running)
 
-        if self.gameRunning:
+        if running:
             self.gameTimer.start()
         else:
             self.gameTimer.stop()
+            if self.statePath:
+                self.saveState(self.statePath)
 
         self.__paint_messages()
 
     def lostLife(self):
         '''
-        When CitizenPac collides with a ghost in the :func:`model.Scene.advance` method,
-        this method is called to update the scoreboards.  It proceeds by performing
+        See :func:`controller.GameController.lostLife`.  When ``self.statePath`` is set,
+        the game is saved again after the scene was reset: pausing saved it while
+        CitizenPac was still colliding with the Ghost.
+        '''
+        super(CitizenPac, self).lostLife()
+        if self.statePath:
+            self.saveState(self.statePath)
 
-        1. Updating the number of lives left on the scoreboard and switching the game
-           running state via :func:`controller.CitizenPac.gameRunningSwitched`.
-        2. Resetting the entire scene via :func:`model.Scene.reset`.
-        3. Resetting the score and speed boost via :func:`controller.CitizenPac.foodConsumed`.
+    def __paint_tracer(self):
         '''
-        # Decrease the lives and pause or end the game depending on number of lives
-        self.livesLeft -= 1
-        self.gameStats.setLives(self.livesLeft)
-        self.gameRunningSwitched()
+        Returns the :class:`tracing.PaintTracer` timing the paints of the view, installing
+        it first if nothing needed it before.
+        '''
+        if self.paintTracer is None:
+            self.paintTracer = PaintTracer(self.view, self.scene.tracer, self.view)
+            self.view.viewport().installEventFilter(self.paintTracer)
+        return self.paintTracer
 
-        # Reset the scene
-        try:
-            self.scene.reset()
-        except:
-            self.errorOut()
+    def setTracer(self, tracer):
+        '''
+        See :func:`controller.GameController.setTracer`.  Painting the view is
+        recorded as well.
+        '''
+        super(CitizenPac, self).setTracer(tracer)
+        self.__paint_tracer().tracer = tracer
 
-        # Reset the score and game speed
-        self.foodConsumed()
+    def watchFrames(self, watchdog):
+        '''
+        See :func:`controller.GameController.watchFrames`.
+        '''
+        paintTracer = self.__paint_tracer()
+        paintTracer.startListeners.append(watchdog.paintStarted)
+        paintTracer.listeners.append(watchdog.paintFinished)
+
+    def togglePerfOverlay(self):
+        '''
+        Shows or hides the performance overlay (:class:`view.display.PerfOverlay`).
+        Nothing is measured while it is hidden.
+        '''
+        if self.perfOverlay is None:
+            self.perfOverlay = PerfOverlay(self.scene)
+            self.scene.addItem(self.perfOverlay)
+
+        listeners = self.__paint_tracer().listeners
+        if self.perfMonitor:
+            listeners.remove(self.perfMonitor.paintFinished)
+            self.perfMonitor.close()
+            self.perfMonitor = None
+            self.perfOverlay.stop()
+        else:
+            self.perfMonitor = PerfMonitor(self.scene)
+            listeners.append(self.perfMonitor.paintFinished)
+            self.perfOverlay.start(self.perfMonitor)
+
+    def setTickCallback(self, callback):
+        '''
+        Changes what the game timer calls every :data:`constants.GAME_REFRESH_RATE`
+        milliseconds while the game is running.  By default this is
+        :func:`model.Scene.advance`; e.g. :class:`replay.ReplayPlayer` needs to apply
+        recorded input before every tick.
+
+        :Parameters:
+            ``callback`` (callable)
+                Called without arguments, and responsible for calling
+                :func:`model.Scene.advance`.
+        '''
+        self.gameTimer.timeout.disconnect()
+        self.gameTimer.timeout.connect(callback)
 
 
 # The below copyright notice and code comes from the PyQt4 examples, borrowing
@@ -0,0 +1,199 @@
+'''
+The ``frameexport`` module turns a headless game (a replay, or the autopilot) into an
+image sequence or a video, without a window or a screen recorder.
+
+A :class:`frameexport.FrameExporter` renders the scene into an offscreen ``QImage`` once
+for the board it starts with, and then at the end of every tick that is due for a frame,
+on the thread that advances the game.
+The encoding happens on a pool of worker threads, so that rendering the next frames and
+encoding the previous ones overlap (``QImage.save`` releases the GIL).  Rendered frames
+wait in a queue of at most :data:`constants.EXPORT_QUEUE_FRAMES` frames; when the
+encoders fall behind, rendering blocks until there is room again, so the memory stays
+bounded by the queue plus one frame per worker no matter how long the game is.
+
+The frames either go to a directory as ``frame000000.png``, ``frame000001.png``, ...
+(in any order, every worker writes its own files), or as raw ``Format_RGB32`` pixels
+to the standard input of an encoder command (one worker, in order).  On a little endian
+machine those are ``bgra`` pixels to ``ffmpeg``:
+
+.. code-block:: console
+
+   $ python . --replay game.log --headless --export frames/
+   $ python . --replay game.log --headless --export-pipe \\
+         "ffmpeg -y -f rawvideo -pix_fmt bgra -s 780x700 -r 30 -i - game.mp4"
+
+Frames are taken at a fixed rate of *game* time (``fps``): frame ``i`` shows the game at
+the end of the last tick at or before ``i / fps`` seconds, frame ``0`` the board before
+the first tick.  Ticks while the game is
+paused are not played, so they are not in the video either.
+'''
+
+import multiprocessing
+import os
+import subprocess
+import threading
+
+try:
+    import queue
+except ImportError:
+    # Python 2
+    import Queue as queue
+
+from PyQt4 import QtCore, QtGui
+
+import constants
+from model import SceneObserver
+
+__all__ = ["FrameExporter"]
+
+FILE_NAME = "frame{:06d}.png"
+''' The file name of every frame exported to a directory. '''
+
+
+class FrameExporter(SceneObserver):
+    '''
+    Renders the scene of ``game`` at ``fps`` frames per second of game time, and encodes
+    the frames on worker threads.  Exactly one of ``directory`` and ``pipe`` is given.
+
+    :Parameters:
+        ``game`` (:class:`controller.GameController`)
+            The game to export.  The exporter registers itself with its scene.
+
+        ``directory`` (str)
+            Write every frame as a PNG file into this directory, which is created if
+            needed.
+
+        ``pipe`` (str)
+            Write the raw pixels of every frame to the standard input of this shell
+            command instead.
+
+        ``fps`` (float)
+            The frames per second of game time.
+
+        ``workers`` (int)
+            The number of encoding threads for PNG files, ``None`` for one per core.
+
+    :Attributes:
+        ``frames`` (int)
+            The number of frames rendered so far.
+
+        ``width``, ``height`` (int)
+            The size of the frames, the size of the board.
+    '''
+    def __init__(self, game, directory=None, pipe=None, fps=constants.EXPORT_FPS,
+                 workers=None):
+        if (directory is None) == (pipe is None):
+            raise RuntimeError("Export either to a directory or to a pipe.")
+        self.game      = game
+        self.directory = directory
+        self.fps       = float(fps)
+        self.frames    = 0
+        self.error     = None
+        self.process   = None
+
+        rect        = game.scene.sceneRect()
+        self.source = QtCore.QRectF(rect)
+        self.width  = int(rect.width())
+        self.height = int(rect.height())
+        self.target = QtCore.QRectF(0.0, 0.0, self.width, self.height)
+
+        if pipe is not None:
+            # The encoder needs the frames in order
+            workers = 1
+            try:
+                self.process = subprocess.Popen(pipe, shell=True, stdin=subprocess.PIPE)
+            except OSError as e:
+                raise RuntimeError("Unable to start [{}]: {}".format(pipe, e))
+        else:
+            if not os.path.isdir(directory):
+                os.makedirs(directory)
+            if workers is None:
+                workers = multiprocessing.cpu_count()
+        workers = max(1, workers)
+
+        self.queue   = queue.Queue(constants.EXPORT_QUEUE_FRAMES)
+        self.threads = []
+        for _ in range(workers):
+            thread = threading.Thread(target=self.__encode)
+            thread.daemon = True
+            thread.start()
+            self.threads.append(thread)
+        game.scene.addObserver(self)
+        # Frame 0, the board before the first tick
+        self.tickFinished(game.scene)
+
+    def tickFinished(self, scene):
+        if self.error is not None:
+            # Nothing more to export, close reports the error
+            return
+        # Every frame whose time has come, usually none or one per tick
+        now   = scene.tick * scene.settings.refreshRate
+        image = None
+        while self.frames * 1000.0 / self.fps <= now:
+            if image is None:
+                image = self.render()
+            self.__submit(self.frames, image)
+            self.frames += 1
+
+    def render(self):
+        '''
+        :Return:
+            ``QtGui.QImage``
+                A new image of the whole board as it is now.
+        '''
+        image = QtGui.QImage(self.width, self.height, QtGui.QImage.Format_RGB32)
+        image.fill(0)
+        painter = QtGui.QPainter(image)
+        painter.setRenderHint(QtGui.QPainter.Antialiasing)
+        self.game.scene.render(painter, self.target, self.source)
+        painter.end()
+        return image
+
+    def __submit(self, index, image):
+        # Blocks while the encoders are EXPORT_QUEUE_FRAMES frames behind
+        self.queue.put((index, image))
+
+    def __encode(self):
+        while True:
+            job = self.queue.get()
+            if job is None:
+                return
+            index, image = job
+            if self.error is not None:
+                # Keep draining, so that rendering never blocks forever
+                continue
+            try:
+                if self.process is None:
+                    path = os.path.join(self.directory, FILE_NAME.format(index))
+                    if not image.save(path, "PNG"):
+                        raise IOError("unable to write [{}]".format(path))
+                else:
+                    self.process.stdin.write(
+                        image.bits().asstring(image.byteCount())
+                    )
+            except Exception as e:
+                self.error = "Unable to export frame {}: {}".format(index, e)
+
+    def close(self):
+        '''
+        Stops rendering, waits until every frame has been encoded, and waits for the
+        encoder command to exit.  Raises a ``RuntimeError`` if a frame could not be
+        encoded, or the encoder command failed.
+        '''
+        self.game.scene.removeObserver(self)
+        for _ in self.threads:
+            self.queue.put(None)
+        for thread in self.threads:
+            thread.join()
+        self.threads = []
+        if self.process is not None:
+            try:
+                self.process.stdin.close()
+            except IOError:
+                pass
+            code = self.process.wait()
+            self.process = None
+            if code and self.error is None:
+                self.error = "The encoder exited with code {}.".format(code)
+        if self.error is not None:
+            raise RuntimeError(self.error)
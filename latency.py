@@ -0,0 +1,124 @@
+'''
+The ``latency`` module measures how long it takes for a movement key to show up on
+screen.  A key press or release only changes CitizenPac's ``moveFlags``
+(:func:`view.actors.Actor.queueMove`); the move itself happens in the next tick, and
+the player sees it once the view has been painted after that tick.  A
+:class:`latency.LatencyProbe` timestamps every movement key the scene receives while
+the game is running, and splits its latency in two:
+
+- *input*: from the key event to the end of the tick that applied it, i.e. mostly
+  waiting for the game timer,
+- *display*: from the end of that tick to the end of the next paint of the view.
+
+The report lists the distribution of both and of their sum.  Without a window (or when
+paints are not reported to the probe, see
+:func:`controller.GameController.watchFrames`) only the input latency is known.
+'''
+
+from timeit import default_timer
+
+from PyQt4 import QtCore
+
+from model import SceneObserver
+from perfstats import RollingSamples
+
+__all__ = ["LatencyProbe"]
+
+SAMPLES = 2000
+''' The number of most recent key events the report covers. '''
+
+MOVE_KEYS = (QtCore.Qt.Key_W, QtCore.Qt.Key_A, QtCore.Qt.Key_S, QtCore.Qt.Key_D)
+
+
+class LatencyProbe(SceneObserver):
+    '''
+    Measures the latency of the movement keys of ``scene``, see the module
+    documentation.
+
+    :Parameters:
+        ``scene`` (:class:`model.Scene`)
+            The scene receiving the keys.  The probe registers itself.
+
+        ``path`` (str)
+            The file to write the report to on :func:`latency.LatencyProbe.close`,
+            ``None`` for none.
+
+    :Attributes:
+        ``inputTimes`` / ``displayTimes`` / ``totalTimes``
+        (:class:`perfstats.RollingSamples`)
+            The latencies in seconds, see the module documentation.
+    '''
+    def __init__(self, scene, path=None):
+        self.scene        = scene
+        self.path         = path
+        self.inputTimes   = RollingSamples(SAMPLES)
+        self.displayTimes = RollingSamples(SAMPLES)
+        self.totalTimes   = RollingSamples(SAMPLES)
+        # Key times waiting for a tick, and (key, tick) times waiting for a paint
+        self.pending      = []
+        self.applied      = []
+        scene.addObserver(self)
+
+    def keyEvent(self, scene, key, pressed):
+        # While paused, a key waits for the player rather than for the game
+        if key in MOVE_KEYS and scene.gameRunning:
+            self.pending.append(default_timer())
+
+    def tickFinished(self, scene):
+        if not self.pending:
+            return
+        now = default_timer()
+        for keyTime in self.pending:
+            self.inputTimes.add(now - keyTime)
+            self.applied.append((keyTime, now))
+        del self.pending[:]
+
+    def paintStarted(self):
+        ''' See :class:`tracing.PaintTracer`, nothing to do. '''
+        pass
+
+    def paintFinished(self, start, end):
+        '''
+        Completes the keys applied since the previous paint, see
+        :class:`tracing.PaintTracer`.
+        '''
+        if not self.applied:
+            return
+        for keyTime, tickTime in self.applied:
+            self.displayTimes.add(end - tickTime)
+            self.totalTimes.add(end - keyTime)
+        del self.applied[:]
+
+    def report(self):
+        '''
+        :Return:
+            ``str``
+                The human readable report, in milliseconds.
+        '''
+        out = [
+            "Latency of the last {} movement keys (game refresh rate {} ms).".format(
+                min(self.inputTimes.count, SAMPLES), self.scene.settings.refreshRate
+            ),
+            "",
+            "{:<10} {:>8} {:>8} {:>8} {:>8} {:>8}".format("ms", "count", "p50", "p95",
+                                                        "p99", "max")
+        ]
+        rows = [("input", self.inputTimes), ("display", self.displayTimes),
+                ("total", self.totalTimes)]
+        for name, samples in rows:
+            if samples.count == 0:
+                continue
+            out.append("{:<10} {:>8} {:>8.2f} {:>8.2f} {:>8.2f} {:>8.2f}".format(
+                name, samples.count,
+                *[1000.0 * p for p in samples.percentiles(50, 95, 99, 100)]
+            ))
+        return "\n".join(out) + "\n"
+
+    def close(self):
+        '''
+        Stops measuring, and writes the report.
+        '''
+        self.scene.removeObserver(self)
+        if self.path is not None:
+            with open(self.path, "w") as f:
+                f.write(self.report())
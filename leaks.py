@@ -0,0 +1,239 @@
+'''
+The ``leaks`` module finds memory that grows over the lifetime of the game.  A
+:class:`leaks.LeakDetector` takes a heap snapshot when it is created, every time the
+scene is reset (:func:`model.Scene.reset`, i.e. a life was lost) and when the game is
+won.  A snapshot counts
+
+- the live objects by type (everything the garbage collector tracks),
+- the live Qt objects by class (the ``sip`` wrappers among them; Qt objects that only
+  exist on the C++ side are not visible),
+- the bytes allocated per source line, if ``tracemalloc`` is available (Python 3.4 or
+  newer, or ``pytracemalloc``).
+
+Whatever grew between every pair of the last :data:`constants.LEAK_WINDOW` + 1
+snapshots is a *suspect*: an allocation repeated on every life and never released.
+Each snapshot, and the suspects once there are enough snapshots, are written to the log
+file.  In an automated soak run, call :func:`leaks.LeakDetector.check` at the end.
+'''
+
+import collections
+import gc
+import logging
+import os
+
+import constants
+from model import SceneObserver
+
+try:
+    import sip
+except ImportError:
+    from PyQt4 import sip
+
+try:
+    import tracemalloc
+except ImportError:
+    # Python 2 without pytracemalloc
+    tracemalloc = None
+
+__all__ = ["LeakDetector"]
+
+MAX_SUSPECTS = 20
+''' How many suspects of each kind are logged. '''
+
+SOURCE = os.path.splitext(os.path.abspath(__file__))[0] + ".py"
+''' This file, whose own allocations are left out of the snapshots. '''
+
+
+class HeapSnapshot(object):
+    '''
+    The counts taken by :func:`leaks.LeakDetector.snapshot`.
+
+    :Attributes:
+        ``label`` (str), ``tick`` (int)
+            What triggered the snapshot, and when.
+
+        ``types`` (dict)
+            The number of live objects per type name.
+
+        ``qt`` (dict)
+            The number of live Qt objects per class name.
+
+        ``lines`` (dict)
+            The bytes allocated per ``"file:line"``, empty without ``tracemalloc``.
+
+        ``traced`` (int)
+            The bytes traced by ``tracemalloc`` in total, ``0`` without it.
+    '''
+    # No __dict__, and dicts of strings to ints are not tracked by the garbage collector:
+    # the snapshots kept in the history do not show up in the counts
+    __slots__ = ["label", "tick", "types", "qt", "lines", "traced"]
+
+    def __init__(self, label, tick):
+        self.label  = label
+        self.tick   = tick
+        self.types  = {}
+        self.qt     = {}
+        self.lines  = {}
+        self.traced = 0
+
+
+def _typeName(cls):
+    return "{}.{}".format(cls.__module__, cls.__name__)
+
+
+def _growing(history, attribute):
+    '''
+    :Return:
+        ``list``
+            ``(name, first, last)`` for every key of ``attribute`` that grew from each
+            snapshot in ``history`` to the next, the biggest growth first.
+    '''
+    first  = getattr(history[0], attribute)
+    counts = [getattr(snapshot, attribute) for snapshot in history]
+    grown  = []
+    for name, start in first.items():
+        previous = start
+        for current in counts[1:]:
+            value = current.get(name, 0)
+            if value <= previous:
+                break
+            previous = value
+        else:
+            grown.append((name, start, previous))
+    grown.sort(key=lambda item: item[1] - item[2])
+    return grown
+
+
+class LeakDetector(SceneObserver):
+    '''
+    Takes heap snapshots of the process running ``game``, see the module documentation.
+
+    :Parameters:
+        ``game`` (:class:`controller.GameController`)
+            The game to watch.  Its scene must already have been generated.
+
+        ``path`` (str)
+            The log file, ``None`` to only keep the results in memory.
+
+        ``window`` (int)
+            The number of consecutive growths that make a suspect.
+
+        ``traceMemory`` (bool)
+            Whether to start ``tracemalloc`` (if available) to count bytes per line.  It
+            slows the game down noticeably.
+
+    :Attributes:
+        ``history`` (:class:`collections.deque`)
+            The last ``window + 1`` :class:`leaks.HeapSnapshot` objects.
+
+        ``suspects`` (dict)
+            ``"types"``, ``"qt"`` and ``"lines"`` mapped to the ``(name, first, last)``
+            tuples that grew over the whole of ``history``.  Empty until there are
+            enough snapshots.
+    '''
+    def __init__(self, game, path=None, window=constants.LEAK_WINDOW, traceMemory=True):
+        self.game     = game
+        self.history  = collections.deque(maxlen=window + 1)
+        self.suspects = {}
+        self.finished = bool(game.gameFinished)
+        self.tracing  = False
+        if traceMemory and tracemalloc is not None and not tracemalloc.is_tracing():
+            tracemalloc.start()
+            self.tracing = True
+
+        self.log = logging.getLogger("citizenpac.leaks")
+        self.log.propagate = False
+        self.log.setLevel(logging.INFO)
+        self.handler = logging.FileHandler(path) if path else logging.NullHandler()
+        self.log.addHandler(self.handler)
+
+        game.scene.addObserver(self)
+        self.snapshot("start")
+
+    def sceneReset(self, scene):
+        self.snapshot("reset")
+
+    def tickFinished(self, scene):
+        finished = bool(self.game.gameFinished)
+        if finished and not self.finished:
+            self.snapshot("game won")
+        self.finished = finished
+
+    def snapshot(self, label):
+        '''
+        Takes a heap snapshot now, and updates the suspects.
+
+        :Parameters:
+            ``label`` (str)
+                Why the snapshot was taken, for the log.
+
+        :Return:
+            :class:`leaks.HeapSnapshot`
+                The snapshot.
+        '''
+        # Only count what is actually reachable
+        gc.collect()
+        snapshot = HeapSnapshot(label, self.game.scene.tick)
+        types    = snapshot.types
+        qt       = snapshot.qt
+        wrapper  = sip.simplewrapper
+        for obj in gc.get_objects():
+            if type(obj) is HeapSnapshot:
+                continue
+            name = _typeName(type(obj))
+            types[name] = types.get(name, 0) + 1
+            if isinstance(obj, wrapper):
+                qt[name] = qt.get(name, 0) + 1
+        del obj
+
+        if tracemalloc is not None and tracemalloc.is_tracing():
+            heap  = tracemalloc.take_snapshot().filter_traces([
+                tracemalloc.Filter(False, tracemalloc.__file__),
+                tracemalloc.Filter(False, SOURCE)
+            ])
+            lines = snapshot.lines
+            for stat in heap.statistics("lineno"):
+                frame = stat.traceback[0]
+                lines["{}:{}".format(frame.filename, frame.lineno)] = stat.size
+            snapshot.traced = tracemalloc.get_traced_memory()[0]
+
+        self.history.append(snapshot)
+        self.log.info("# {} at tick {}: {} objects, {} Qt objects, {} bytes traced".format(
+            label, snapshot.tick, sum(types.values()), sum(qt.values()), snapshot.traced
+        ))
+        if len(self.history) == self.history.maxlen:
+            self.__findSuspects()
+        return snapshot
+
+    def __findSuspects(self):
+        history = list(self.history)
+        self.suspects = {}
+        for kind in ("qt", "types", "lines"):
+            grown = _growing(history, kind)
+            if grown:
+                self.suspects[kind] = grown
+        for kind, grown in sorted(self.suspects.items()):
+            lines = ["suspects ({}), grown over the last {} snapshots:".format(
+                kind, len(history) - 1
+            )]
+            for name, first, last in grown[:MAX_SUSPECTS]:
+                lines.append("  {:<60} {:>10} -> {:>10}".format(name, first, last))
+            self.log.info("\n".join(lines))
+
+    def check(self):
+        '''
+        Raises a ``RuntimeError`` naming the suspects, if there are any.
+        '''
+        if self.suspects:
+            names = set(name for grown in self.suspects.values() for name, _, _ in grown)
+            raise RuntimeError("Possible leaks: {}".format(", ".join(sorted(names))))
+
+    def close(self):
+        '''
+        Stops taking snapshots, and closes the log file.
+        '''
+        self.game.scene.removeObserver(self)
+        if self.tracing:
+            tracemalloc.stop()
+        self.log.removeHandler(self.handler)
+        self.handler.close()
@@ -1,9 +1,11 @@
 #Saachi Gopal sg932
 import math
+import random
 from PyQt4 import QtCore, QtGui
 
 import constants
-from view.actors import Actor, CitizenPacActor, GhostActor, Food
+from tracing import NULL_TRACER
+from view.actors import Actor, CitizenPacActor, GhostActor, Food, FoodAnimation
 from view.display import randomColor
 
 '''
@@ -11,7 +13,7 @@ This is the model
 '''
 
 
-def generateFoodGrid(width, height):
+def generateFoodGrid(width, height, settings=None):
     '''
     This method returns a ``list`` of tuples containing all of the coordinates and
     colors for the :class:`view.actors.Food` actors in the scene, given the specified
@@ -68,6 +70,10 @@ def generateFoodGrid(width, height):
             The total height of the game board at the start of the game (before any
             resizing by the user.)
 
+        ``settings`` (:class:`model.Settings`)
+            The ``foodRadius`` and ``foodSparsity`` to use, ``None`` for the values of
+            :mod:`constants`.
+
     :Preconditions:
         *Size Constraints*
             ``width`` and ``height`` are both positive, and are both (individually)
@@ -108,12 +114,15 @@ def generateFoodGrid(width, height):
                what you ``append`` to the list ``all_food`` and make sure it adheres to
                the above specification.
     '''
+    if settings is None:
+        settings = Settings()
+
     # Initial setup
     all_food    = []
     half_width  = width * 0.5
     half_height = height * 0.5
-    diam        = 2.0 * constants.FOOD_RADIUS
-    food_fill   = diam * constants.FOOD_SPARSITY
+    diam        = 2.0 * settings.foodRadius
+    food_fill   = diam * settings.foodSparsity
     half_fill   = food_fill * 0.5
 
     # 1. Compute the x and y scaling factors
@@ -152,6 +161,146 @@ def generateFoodGrid(width, height):
     return all_food
 
 
+def seedRandom(seed=None):
+    '''
+    Seeds every random number generator the game uses (Python's :mod:`random` for the
+    Food and the Ghosts, and ``qrand`` for the actor colors).  Two scenes generated with
+    the same seed and the same width and height are identical.
+
+    :Parameters:
+        ``seed`` (int)
+            The seed to use, or ``None`` to pick a new one.
+
+    :Return:
+        ``int``
+            The seed that was used.
+    '''
+    if seed is None:
+        seed = random.SystemRandom().randint(0, 0xFFFFFFFF)
+    random.seed(seed)
+    QtCore.qsrand(seed & 0xFFFFFFFF)
+    return seed
+
+
+class Settings(object):
+    '''
+    The configuration of one game, and its current speed.  Every
+    :class:`controller.GameController` owns one, shared with its :class:`model.Scene`
+    and the actors, so that several games (e.g. headless games on a thread pool) can run
+    in one process with different settings without interfering.  The defaults are the
+    values of the :mod:`constants` module when the settings are created; change them
+    before the scene is generated.
+
+    :Attributes:
+        ``gameSpeedStart``, ``maxSpeed``, ``useSpeedBoost``
+            See :data:`constants.GAME_SPEED_START`, :data:`constants.MAX_SPEED` and
+            :data:`constants.USE_SPEED_BOOST`.
+
+        ``gameSpeed`` (float)
+            The current speed of the game, updated as Food is eaten.  Every actor
+            moves this far per tick in each direction it moves in.
+
+        ``foodRadius``, ``foodSparsity``, ``splineCoordScale``, ``foodValue``
+            See :data:`constants.FOOD_RADIUS`, :data:`constants.FOOD_SPARSITY`,
+            :data:`constants.SPLINE_COORD_SCALE` and :data:`constants.FOOD_VALUE`.
+
+        ``fullGameMode``, ``numLives``, ``numGhosts``, ``numPlayers``,
+        ``dispersionRadius``
+            See :data:`constants.FULL_GAME_MODE`, :data:`constants.NUM_LIVES`,
+            :data:`constants.NUM_GHOSTS`, :data:`constants.NUM_PLAYERS` and
+            :data:`constants.DISPERSION_RADIUS`.
+
+        ``refreshRate`` (int)
+            How many milliseconds of game time a tick is, see
+            :data:`constants.GAME_REFRESH_RATE`.
+
+        ``ghostMoveTime`` (int)
+            How often (in milliseconds) the Ghosts change direction, see
+            :data:`view.actors.GhostActor.GHOST_MOVE_TIME`.
+    '''
+    def __init__(self):
+        self.gameSpeedStart   = constants.GAME_SPEED_START
+        self.gameSpeed        = constants.GAME_SPEED_START
+        self.maxSpeed         = constants.MAX_SPEED
+        self.useSpeedBoost    = constants.USE_SPEED_BOOST
+        self.foodRadius       = constants.FOOD_RADIUS
+        self.foodSparsity     = constants.FOOD_SPARSITY
+        self.splineCoordScale = constants.SPLINE_COORD_SCALE
+        self.foodValue        = constants.FOOD_VALUE
+        self.fullGameMode     = constants.FULL_GAME_MODE
+        self.numLives         = constants.NUM_LIVES
+        self.numGhosts        = constants.NUM_GHOSTS
+        self.numPlayers       = constants.NUM_PLAYERS
+        self.dispersionRadius = constants.DISPERSION_RADIUS
+        self.refreshRate      = constants.GAME_REFRESH_RATE
+        self.ghostMoveTime    = GhostActor.GHOST_MOVE_TIME
+
+    def ghostMoveTicks(self):
+        '''
+        :Return:
+            ``int``
+                ``ghostMoveTime`` in ticks of game time, at least ``1``.
+        '''
+        return max(1, self.ghostMoveTime // self.refreshRate)
+
+
+class SceneObserver(object):
+    '''
+    Base class for objects that want to follow along with a :class:`model.Scene`, e.g.
+    to record or measure it.  Register an instance with
+    :func:`model.Scene.addObserver`, and override the methods of interest.  Observers
+    are called on every tick, so they should be quick.
+    '''
+    def tickStarted(self, scene):
+        '''
+        Called at the start of :func:`model.Scene.advance`, before anything has moved.
+        ``scene.tick`` is the number of the tick that is about to happen.
+        '''
+        pass
+
+    def tickFinished(self, scene):
+        '''
+        Called at the end of :func:`model.Scene.advance`, after ``scene.tick`` has been
+        incremented.
+        '''
+        pass
+
+    def keyEvent(self, scene, key, pressed):
+        '''
+        Called for every key press / release the scene receives while its input is not
+        locked, before it is handled.
+
+        :Parameters:
+            ``key`` (int)
+                The ``QtCore.Qt.Key_*`` value of the key.
+
+            ``pressed`` (bool)
+                ``True`` for a press, ``False`` for a release.
+        '''
+        pass
+
+    def sceneReset(self, scene):
+        '''
+        Called at the end of :func:`model.Scene.reset`, i.e. after a life was lost.
+        '''
+        pass
+
+    def runningSwitched(self, scene):
+        '''
+        Called at the end of :func:`controller.GameController.gameRunningSwitched`, after
+        the game was paused or resumed.  ``scene.gameRunning`` is the new state.
+        '''
+        pass
+
+    def sceneRestored(self, scene):
+        '''
+        Called at the end of :func:`controller.GameController.restoreSnapshot`, after the
+        state of the scene was replaced all at once.  ``scene.tick`` may have moved in
+        either direction.
+        '''
+        pass
+
+
 class Scene(QtGui.QGraphicsScene):
     '''
     The main model of the game, responsible for creating and maintaining the state of
@@ -195,7 +344,11 @@ class Scene(QtGui.QGraphicsScene):
             actually displayed.
 
         ``citizenPac`` (:class:`view.actors.CitizenPacActor`)
-            The representation of CitizenPac.
+            The representation of CitizenPac, the one the keyboard moves.
+
+        ``players`` (list)
+            Every :class:`view.actors.CitizenPacActor`, ``self.citizenPac`` first.  There
+            are ``settings.numPlayers`` of them.
 
         ``ghosts`` (list)
             A list of :class:`view.actors.GhostActor` instances, representing all of the
@@ -215,19 +368,66 @@ class Scene(QtGui.QGraphicsScene):
             An integer representing how many Food collisions have been detected.  When
             ``foodEaten == len(self.food)``, the ``controller`` is notified that the
             Game has completed.
+
+        ``foodEatenMask`` (bytearray)
+            One byte per entry of ``self.food``, nonzero when that Food has been eaten.
+            This is the authoritative eaten state; Food items read it when painting, so
+            the whole board can be reset or restored with a single slice assignment.
+
+        ``foodAnimation`` (:class:`view.actors.FoodAnimation`)
+            The animation shared by all of the Food, advanced once per tick.
+
+        ``foodEatenThisTick`` (list)
+            The indices of the Food eaten during the current (or last) tick.
+
+        ``movers`` (list)
+            Every CitizenPac (``self.players``) followed by every Ghost, i.e. all of the
+            actors that move.  The order is stable for the lifetime of the scene.
+
+        ``tick`` (int)
+            How many times :func:`model.Scene.advance` has been called.
+
+        ``observers`` (list)
+            The :class:`model.SceneObserver` instances following this scene.
+
+        ``inputLocked`` (bool)
+            When ``True`` keyboard input is ignored, e.g. while a recording is played
+            back.
+
+        ``ghostMoveTicks`` (int)
+            How the Ghosts decide when to change direction, see
+            :func:`model.Scene.setGhostMoveTicks`.
+
+        ``tracer`` (:class:`tracing.Tracer`)
+            Records how long each phase of a tick takes, see :mod:`tracing`.
+
+        ``settings`` (:class:`model.Settings`)
+            The configuration of the game, shared with the controller and the actors.
     '''
-    def __init__(self, controller, view):
+    def __init__(self, controller, view, settings=None):
         super(Scene, self).__init__(view)
         # Parent references
         self.controller  = controller
         self.view        = view
+        self.settings    = settings if settings is not None else Settings()
         # Actor references
         self.citizenPac  = None
+        self.players     = []
         self.ghosts      = []
         self.food        = []
+        self.movers      = []
         # Game state convenience members
-        self.gameRunning = False
-        self.foodEaten   = 0
+        self.gameRunning   = False
+        self.foodEaten     = 0
+        self.foodEatenMask = bytearray()
+        self.foodAnimation = FoodAnimation()
+        self.foodEatenThisTick = []
+        # Bookkeeping for anything following along with the game
+        self.tick           = 0
+        self.observers      = []
+        self.inputLocked    = False
+        self.ghostMoveTicks = None
+        self.tracer         = NULL_TRACER
 
     def generate(self, width, height):
         '''
@@ -262,32 +462,37 @@ class Scene(QtGui.QGraphicsScene):
            performed (this is controlled by ``PyQt4``).
         '''
         # Generate the CitizenPac and Ghost actors.  By default, they are dispersed in
-        # a circular pattern.  There can only be one CitizenPac
-        nActors = float(constants.NUM_GHOSTS + 1)  # All ghosts plus CitizenPac
+        # a circular pattern.  There is one CitizenPac per player
+        settings = self.settings
+        nActors  = float(settings.numGhosts + settings.numPlayers)
         two_pi  = 2.0 * math.pi
         for i in range(int(nActors)):
             # Create the new x and y coordinates on the circle
             t  = (i * two_pi) / nActors
-            cx = math.sin(t) * constants.DISPERSION_RADIUS
-            cy = math.cos(t) * constants.DISPERSION_RADIUS
+            cx = math.sin(t) * settings.dispersionRadius
+            cy = math.cos(t) * settings.dispersionRadius
 
             # The constructor arguments are the same for both, but the class is
             # different.  We negative scaling for the y coordinate because the
             # the Qt coordinate system is positive y down.
-            args = [self, cx, cy, constants.SPLINE_COORD_SCALE, -constants.SPLINE_COORD_SCALE]
+            args = [self, cx, cy, settings.splineCoordScale, -settings.splineCoordScale]
 
-            # If it is the first iteration, create CitizenPac (always at the bottom)
-            actor = CitizenPacActor(*args) if i == 0 else GhostActor(*args)
+            # The first iterations create the CitizenPacs (the first is always at the
+            # bottom)
+            if i < settings.numPlayers:
+                actor = CitizenPacActor(*args)
+            else:
+                actor = GhostActor(*args)
 
             # Make sure to register the actor!
             self.registerActor(actor, cx, cy)
 
         # Generate all of the Food
-        if constants.FULL_GAME_MODE:
+        if settings.fullGameMode:
             try:
-                food_coords = generateFoodGrid(width, height)
+                food_coords = generateFoodGrid(width, height, settings)
                 for cx, cy, color in food_coords:
-                    food = Food(self, cx, cy, color, constants.FOOD_RADIUS)
+                    food = Food(self, cx, cy, color, settings.foodRadius)
                     self.registerActor(food, cx, cy)
             except:
                 self.controller.errorOut()
@@ -314,7 +519,8 @@ class Scene(QtGui.QGraphicsScene):
                 An :class:`view.display.Actor` instance.  Currently the only classes
                 that are registered are
 
-                1. :class:`view.display.CitizenPacActor` (stored in ``self.citizenPac``).
+                1. :class:`view.display.CitizenPacActor` (appended to ``self.players``,
+                   the first one is also stored in ``self.citizenPac``).
                 2. :class:`view.display.GhostActor` (appended to ``self.ghosts``).
                 3. :class:`view.display.Food` (appended to ``self.food``).
 
@@ -344,13 +550,22 @@ class Scene(QtGui.QGraphicsScene):
         # You will also need to update the `advance` method of this class to check for
         # collisions with these new types of actors.
         if type(actor) is CitizenPacActor:
-            if self.citizenPac:
-                raise RuntimeError("There can only be one CitizenPac per game!")
-            self.citizenPac = actor
+            if len(self.players) >= self.settings.numPlayers:
+                raise RuntimeError("There can only be {} CitizenPac(s) per game!".format(
+                    self.settings.numPlayers
+                ))
+            if not self.citizenPac:
+                self.citizenPac = actor
+            # The CitizenPacs come before the Ghosts
+            self.movers.insert(len(self.players), actor)
+            self.players.append(actor)
         elif type(actor) is Food:
+            actor.index = len(self.food)
             self.food.append(actor)
+            self.foodEatenMask.append(0)
         elif type(actor) is GhostActor:
             self.ghosts.append(actor)
+            self.movers.append(actor)
         else:
             raise RuntimeError(
                 "Unknown actor of type [{}] cannot be registered.".format(type(actor))
@@ -363,6 +578,42 @@ class Scene(QtGui.QGraphicsScene):
     def numFoodEaten(self):
         return self.foodEaten
 
+    def addObserver(self, observer):
+        '''
+        Starts notifying ``observer`` (a :class:`model.SceneObserver`) of ticks and input.
+        '''
+        self.observers.append(observer)
+
+    def removeObserver(self, observer):
+        '''
+        Stops notifying ``observer``, which must have been added before.
+        '''
+        self.observers.remove(observer)
+
+    def setGhostMoveTicks(self, ticks):
+        '''
+        By default every :class:`view.actors.GhostActor` changes direction on its own
+        ``QTimer``, i.e. in wall clock time.  That is not reproducible, and does not
+        happen at all without an event loop.  This method stops the timers and instead
+
+        - for ``ticks > 0``, changes the direction of every Ghost at the start of every
+          ``ticks``-th call to :func:`model.Scene.advance`.
+        - for ``ticks == 0``, never changes their direction; whoever called this is
+          responsible for setting their ``moveFlags`` (e.g. a replay).
+
+        Passing ``None`` restarts the timers.
+
+        :Parameters:
+            ``ticks`` (int)
+                See above.
+        '''
+        self.ghostMoveTicks = ticks
+        for ghost in self.ghosts:
+            if ticks is None:
+                ghost.moveTimer.start(self.settings.ghostMoveTime)
+            else:
+                ghost.moveTimer.stop()
+
     def setRunning(self, running):
         self.gameRunning = running
 
@@ -376,13 +627,18 @@ class Scene(QtGui.QGraphicsScene):
         for ghost in self.ghosts:
             ghost.reset()
         
-        self.citizenPac.reset() 
+        for player in self.players:
+            player.reset()
         self.foodEaten = 0
-        
-        for food in self.food:
-            food.reset()
-            food.show()
-        
+        del self.foodEatenThisTick[:]
+
+        # Food never moves, so "resetting" it is just un-eating all of it at once
+        self.foodEatenMask[:] = bytearray(len(self.foodEatenMask))
+        self.foodAnimation.reset()
+        self.update()
+
+        for observer in self.observers:
+            observer.sceneReset(self)
 
     def wrapActor(self, actor, width, height):
         '''
@@ -449,34 +705,81 @@ class Scene(QtGui.QGraphicsScene):
         height = bounds.height()
 
         # Wrap the actors that can move in the game
-        self.wrapActor(self.citizenPac, width, height)
+        for player in self.players:
+            self.wrapActor(player, width, height)
         for ghost in self.ghosts:
             self.wrapActor(ghost, width, height)
 
     def advance(self):
         '''
-        Process collisions.
+        Advances the game by one tick: process collisions, then move the actors.  The
+        observers are notified before and after, and ``self.tick`` is incremented even
+        when the tick ends early because a life was lost.
         '''
-        if self.gameRunning and constants.FULL_GAME_MODE:
-            for ghost in self.ghosts:
-                if self.citizenPac.collidesWithItem(ghost):
-                    self.controller.lostLife()
-                    return
+        tick   = self.tick
+        tracer = self.tracer
+        with tracer.span("tick"):
+            if self.ghostMoveTicks and tick and tick % self.ghostMoveTicks == 0:
+                for ghost in self.ghosts:
+                    ghost.timerEvent()
+            del self.foodEatenThisTick[:]
+            with tracer.span("tickStarted"):
+                for observer in self.observers:
+                    observer.tickStarted(self)
+
+            if not self.__process_collisions():
+                with tracer.span("wrapRelevantActors"):
+                    self.wrapRelevantActors()
+                # Food does not advance itself, the whole board animates in lockstep
+                self.foodAnimation.advance()
+                self.update()
+                with tracer.span("itemAdvance"):
+                    super(Scene, self).advance()
+
+            self.tick = tick + 1
+            with tracer.span("tickFinished"):
+                for observer in self.observers:
+                    observer.tickFinished(self)
+
+    def __process_collisions(self):
+        '''
+        Process collisions.
 
-            for food in self.food:
-                if food.isVisible() and self.citizenPac.collidesWithItem(food):
-                    food.hide()
-                    self.foodEaten += 1
-                    self.controller.foodConsumed()
+        :Return:
+            ``bool``
+                ``True`` if any CitizenPac collided with a Ghost, in which case nothing
+                should move this tick.
+        '''
+        if self.gameRunning and self.settings.fullGameMode:
+            tracer = self.tracer
+            with tracer.span("ghostCollisions"):
+                for player in self.players:
+                    for ghost in self.ghosts:
+                        if player.collidesWithItem(ghost):
+                            self.controller.lostLife()
+                            return True
+
+            with tracer.span("foodScan"):
+                eaten = self.foodEatenMask
+                for player in self.players:
+                    for food in self.food:
+                        if not eaten[food.index] and player.collidesWithItem(food):
+                            eaten[food.index] = 1
+                            self.foodEaten += 1
+                            self.foodEatenThisTick.append(food.index)
+                            self.controller.foodConsumed()
 
             if self.foodEaten == len(self.food):
                 self.controller.gameWon()
 
-        self.wrapRelevantActors()
-        super(Scene, self).advance()
+        return False
 
     def keyPressEvent(self, e):
+        if self.inputLocked:
+            return
         key = e.key()
+        for observer in self.observers:
+            observer.keyEvent(self, key, True)
 
         if key == QtCore.Qt.Key_W:
             self.citizenPac.queueMove(constants.MOVE_NORTH, True)
@@ -491,6 +794,14 @@ class Scene(QtGui.QGraphicsScene):
 
     def keyReleaseEvent(self, e):
         key = e.key()
+        # Only changes what is displayed, so it is allowed even during a replay
+        if key == QtCore.Qt.Key_F3:
+            self.controller.togglePerfOverlay()
+            return
+        if self.inputLocked:
+            return
+        for observer in self.observers:
+            observer.keyEvent(self, key, False)
         if key == QtCore.Qt.Key_W:
             self.citizenPac.queueMove(constants.MOVE_NORTH, False)
         elif key == QtCore.Qt.Key_S:
@@ -501,5 +812,7 @@ class Scene(QtGui.QGraphicsScene):
             self.citizenPac.queueMove(constants.MOVE_WEST, False)
         elif key == QtCore.Qt.Key_Space:
             self.controller.gameRunningSwitched()
+        elif key == QtCore.Qt.Key_Backspace:
+            self.controller.rewind(constants.REWIND_STEP_TICKS)
         else:
             super(Scene, self).keyPressEvent(e)
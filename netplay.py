@@ -0,0 +1,639 @@
+'''
+The ``netplay`` module lets several players share one game over UDP, e.g. several
+windows on the same machine.  A :class:`netplay.GameServer` (``--serve``) runs the game
+without a window and is the only one that advances it: it applies the input of every
+player, ticks at the game's refresh rate, and sends every player what changed.  A
+:class:`netplay.NetClient` joins the server, sends its player's input once per tick and
+keeps a copy of the state, which a :class:`netplay.NetDriver` shows in the window
+(``--connect``).  Every player moves a CitizenPac of their own; the lives and the score
+are shared (see :data:`constants.NUM_PLAYERS`).
+
+Every datagram starts with a ``HEADER`` (magic ``b"CPNP"``, version, code).  All values
+are little endian.
+
++-------------+-----------+------------------------------------------------------------+
+| Code        | Direction | Contents after the header                                  |
++=============+===========+============================================================+
+| ``JOIN``    | to server | Nothing.  Sent until the server answers.                   |
++-------------+-----------+------------------------------------------------------------+
+| ``WELCOME`` | to client | ``HELLO``: the index of the player's CitizenPac in         |
+|             |           | :attr:`model.Scene.players`, the number of players, the    |
+|             |           | board width and height, and the seed, i.e. everything      |
+|             |           | needed to generate the same board.                         |
++-------------+-----------+------------------------------------------------------------+
+| ``REJECT``  | to client | Nothing, every CitizenPac already has a player.            |
++-------------+-----------+------------------------------------------------------------+
+| ``INPUT``   | to server | ``CONTROLS``: sequence number, send time, ``moveFlags``,   |
+|             |           | pause counter, whether a full snapshot is needed.          |
++-------------+-----------+------------------------------------------------------------+
+| ``FULL``    | to client | ``STATE`` (running, echoed send time), a full snapshot     |
+|             |           | (:func:`snapshot.capture`).                                |
++-------------+-----------+------------------------------------------------------------+
+| ``DELTA``   | to client | ``STATE``, and the delta of the tick                       |
+|             |           | (:class:`snapshot.DeltaEncoder`), nothing while paused.    |
++-------------+-----------+------------------------------------------------------------+
+| ``LEAVE``   | both      | Nothing, the player (or the server) quits.                 |
++-------------+-----------+------------------------------------------------------------+
+
+A delta only holds the movers that moved or turned and the Food eaten during the tick,
+so most ticks cost a few dozen bytes per player.  Nothing is ever retransmitted: the
+input carries the full ``moveFlags`` every tick, pausing is a counter (every change
+toggles the game once), and a client that missed a delta asks for a full snapshot with
+its next input.  After a lost life or a win a delta cannot express the change, and
+every player gets a full snapshot.
+
+Both sides measure what the players care about.  The server counts the bytes it sends
+to every player.  Every ``STATE`` echoes the send time of the latest input the server
+applied for that player, so the client measures the end-to-end latency from sending
+input to receiving the first state that includes it (on its own clock, the clocks need
+not agree).  The byte counts are UDP payloads, without the 28 bytes of IPv4 and UDP
+headers per datagram.  ``benchmarks/netplay.py`` measures both on ``localhost``.
+'''
+
+import errno
+import socket
+import struct
+import time
+from timeit import default_timer
+
+from PyQt4 import QtCore, QtNetwork
+
+import constants
+import snapshot
+from model import SceneObserver
+from perfstats import RollingSamples
+
+__all__ = ["GameServer", "NetClient", "NetDriver", "parseAddress"]
+
+MAGIC   = b"CPNP"
+''' The first four bytes of every datagram. '''
+
+VERSION = 1
+''' The version of the protocol. '''
+
+HEADER   = struct.Struct("<4sBB")
+HELLO    = struct.Struct("<BBddQ")
+CONTROLS = struct.Struct("<IdBBB")
+STATE    = struct.Struct("<Bd")
+
+JOIN    = 1
+WELCOME = 2
+REJECT  = 3
+INPUT   = 4
+FULL    = 5
+DELTA   = 6
+LEAVE   = 7
+
+MAX_DATAGRAM = 65507
+''' The largest UDP payload, a full snapshot must fit into one datagram. '''
+
+JOIN_INTERVAL = 0.25
+''' How often (in seconds) a :class:`netplay.NetClient` repeats its ``JOIN``. '''
+
+LATENCY_SAMPLES = 10000
+''' How many of the most recent latencies a :class:`netplay.NetClient` keeps. '''
+
+MOVE_MASK = constants.STATIONARY | constants.MOVE_NORTH | constants.MOVE_SOUTH | \
+            constants.MOVE_EAST  | constants.MOVE_WEST
+
+KEYS = {
+    QtCore.Qt.Key_W: constants.MOVE_NORTH, QtCore.Qt.Key_S: constants.MOVE_SOUTH,
+    QtCore.Qt.Key_D: constants.MOVE_EAST,  QtCore.Qt.Key_A: constants.MOVE_WEST
+}
+
+
+def parseAddress(text, host="127.0.0.1"):
+    '''
+    :Parameters:
+        ``text`` (str)
+            ``HOST:PORT``, or only ``PORT``.
+
+        ``host`` (str)
+            The host if ``text`` has none.
+
+    :Return:
+        ``tuple``
+            ``(host, port)``.  A ``RuntimeError`` is raised if ``text`` is not an
+            address.
+    '''
+    if ":" in text:
+        host, text = text.rsplit(":", 1)
+    try:
+        port = int(text)
+    except ValueError:
+        port = -1
+    if not host or not 0 <= port <= 0xFFFF:
+        raise RuntimeError("Not an address: [{}].".format(text))
+    return host, port
+
+
+def _packet(code, *parts):
+    return b"".join((HEADER.pack(MAGIC, VERSION, code),) + parts)
+
+
+def _code(data):
+    # The code of a datagram of this protocol, None for anything else
+    if len(data) < HEADER.size:
+        return None
+    magic, version, code = HEADER.unpack_from(data)
+    if magic != MAGIC or version != VERSION:
+        return None
+    return code
+
+
+class _Player(object):
+    '''
+    The server side state of one player.
+    '''
+    def __init__(self, index, host, port):
+        self.index       = index
+        self.host        = host
+        self.port        = port
+        self.sequence    = -1
+        self.pauses      = 0
+        self.echo        = 0.0
+        self.resync      = True
+        self.joined      = default_timer()
+        self.lastHeard   = self.joined
+        self.packetsSent = 0
+        self.bytesSent   = 0
+
+    def address(self):
+        return "{}:{}".format(self.host.toString(), self.port)
+
+    def report(self):
+        seconds = max(default_timer() - self.joined, 1e-9)
+        return {
+            "player": self.index, "address": self.address(), "seconds": seconds,
+            "packets": self.packetsSent, "bytes": self.bytesSent,
+            "bytesPerSecond": self.bytesSent / seconds
+        }
+
+
+class GameServer(object):
+    '''
+    Runs ``game`` for the players that join on the UDP port ``port``, see the module
+    documentation.  The game starts paused; any player can resume it.
+
+    :Parameters:
+        ``game`` (:class:`controller.HeadlessCitizenPac`)
+            The game to run, with one CitizenPac per player
+            (``settings.numPlayers``).  Its scene must already have been generated,
+            and nothing else may advance it.
+
+        ``port`` (int)
+            The port to listen on, ``0`` for any free one (see
+            :func:`netplay.GameServer.port`).
+
+        ``host`` (str)
+            The address to listen on.
+
+    :Attributes:
+        ``players`` (dict)
+            The players, by ``(host, port)``.
+
+        ``departed`` (list)
+            The :func:`netplay.GameServer.report` of every player that left.
+    '''
+    def __init__(self, game, port=constants.NET_PORT, host="127.0.0.1"):
+        scene = game.scene
+        if len(snapshot.capture(game)) + HEADER.size + STATE.size > MAX_DATAGRAM:
+            raise RuntimeError("The board is too large for a snapshot to fit a datagram.")
+
+        self.game     = game
+        self.players  = {}
+        self.free     = list(range(len(scene.players)))
+        self.departed = []
+        self.encoder  = snapshot.DeltaEncoder(game)
+
+        self.socket = QtNetwork.QUdpSocket()
+        if not self.socket.bind(QtNetwork.QHostAddress(host), port):
+            raise RuntimeError("Unable to listen on [{}:{}]: {}".format(
+                host, port, self.socket.errorString()
+            ))
+        self.socket.readyRead.connect(self.receive)
+        self.timer = QtCore.QTimer()
+        self.timer.timeout.connect(self.step)
+
+    def port(self):
+        '''
+        :Return:
+            ``int``
+                The port the server listens on.
+        '''
+        return self.socket.localPort()
+
+    def start(self):
+        '''
+        Starts ticking every ``settings.refreshRate`` milliseconds on the event loop.
+        '''
+        self.timer.start(self.game.settings.refreshRate)
+
+    def receive(self):
+        '''
+        Handles every datagram that arrived, called when the socket is readable.
+        '''
+        udp = self.socket
+        while udp.hasPendingDatagrams():
+            data, host, port = udp.readDatagram(udp.pendingDatagramSize())
+            data   = bytes(data)
+            code   = _code(data)
+            key    = (host.toString(), port)
+            player = self.players.get(key)
+            if code == JOIN:
+                self.__join(key, host, port, player)
+            elif player is None:
+                continue
+            elif code == INPUT and len(data) == HEADER.size + CONTROLS.size:
+                self.__input(player, *CONTROLS.unpack_from(data, HEADER.size))
+            elif code == LEAVE:
+                self.__leave(key)
+
+    def __send(self, player, data):
+        self.socket.writeDatagram(data, player.host, player.port)
+        player.packetsSent += 1
+        player.bytesSent   += len(data)
+
+    def __join(self, key, host, port, player):
+        if player is None:
+            if not self.free:
+                self.socket.writeDatagram(_packet(REJECT), host, port)
+                return
+            player = _Player(self.free.pop(0), host, port)
+            self.players[key] = player
+            self.game.scene.players[player.index].setStationary()
+        # Also answers a JOIN repeated because the WELCOME got lost
+        game = self.game
+        rect = game.scene.sceneRect()
+        self.__send(player, _packet(WELCOME, HELLO.pack(
+            player.index, len(game.scene.players), rect.width(), rect.height(), game.seed
+        )))
+
+    def __input(self, player, sequence, sent, flags, pauses, resync):
+        if sequence <= player.sequence or flags & ~MOVE_MASK:
+            # Late, duplicated, or not from a client of this protocol
+            return
+        player.sequence  = sequence
+        player.echo      = sent
+        player.lastHeard = default_timer()
+        player.resync    = player.resync or bool(resync)
+        self.game.scene.players[player.index].moveFlags = flags or constants.STATIONARY
+        # Every change of the counter is one press of the space bar
+        if (pauses - player.pauses) & 1:
+            self.game.gameRunningSwitched()
+        player.pauses = pauses
+
+    def __leave(self, key):
+        player = self.players.pop(key)
+        self.game.scene.players[player.index].setStationary()
+        self.free.append(player.index)
+        self.free.sort()
+        self.departed.append(player.report())
+
+    def step(self):
+        '''
+        Advances the game by one tick if it is running, and sends every player what
+        changed.  Players that have not sent input for :data:`constants.NET_TIMEOUT`
+        seconds are dropped first.
+        '''
+        now = default_timer()
+        for key, player in list(self.players.items()):
+            if now - player.lastHeard > constants.NET_TIMEOUT:
+                self.__leave(key)
+
+        game  = self.game
+        delta = b""
+        if game.gameRunning:
+            game.scene.advance()
+            delta = self.encoder.encode()
+            if delta is None:
+                # A lost life or a win, everybody needs the whole state
+                self.encoder.sync()
+                for player in self.players.values():
+                    player.resync = True
+
+        running = game.gameRunning
+        full    = None
+        for player in self.players.values():
+            state = STATE.pack(running, player.echo)
+            if player.resync:
+                if full is None:
+                    full = snapshot.capture(game)
+                self.__send(player, _packet(FULL, state, full))
+                player.resync = False
+            else:
+                self.__send(player, _packet(DELTA, state, delta))
+
+    def report(self):
+        '''
+        :Return:
+            ``list``
+                A ``dict`` per player who joined, in the order they left (the players
+                still in the game last): ``player``, ``address``, ``seconds``,
+                ``packets`` and ``bytes`` sent to them, and ``bytesPerSecond``.
+        '''
+        current = sorted(self.players.values(), key=lambda player: player.index)
+        return self.departed + [player.report() for player in current]
+
+    def close(self):
+        '''
+        Stops ticking, tells every player that the game is over, and stops listening.
+        '''
+        self.timer.stop()
+        for key, player in list(self.players.items()):
+            self.__send(player, _packet(LEAVE))
+            self.__leave(key)
+        self.socket.close()
+
+
+class NetClient(object):
+    '''
+    Joins the :class:`netplay.GameServer` at ``host``, ``port``.  It only uses the
+    standard library socket module: the constructor waits (up to ``timeout`` seconds)
+    for the server to answer, afterward nothing blocks.  Call
+    :func:`netplay.NetClient.poll` and :func:`netplay.NetClient.send` once per tick.
+
+    :Parameters:
+        ``host`` (str), ``port`` (int)
+            The address of the server.
+
+        ``timeout`` (float)
+            How long to wait for the server, when joining and later on.  A
+            ``RuntimeError`` is raised if it does not answer, or has no CitizenPac left.
+
+    :Attributes:
+        ``player`` (int)
+            The index of this player's CitizenPac in :attr:`model.Scene.players`.
+
+        ``numPlayers`` (int), ``width`` (float), ``height`` (float), ``seed`` (int)
+            The game of the server, see :class:`controller.CitizenPac`.
+
+        ``state`` (:class:`snapshot.State`)
+            The latest state of the game, ``None`` until the first snapshot arrived.
+
+        ``running`` (bool)
+            Whether the game is running.
+
+        ``flags`` (int)
+            The ``moveFlags`` sent for this player's CitizenPac.
+
+        ``latency`` (:class:`perfstats.RollingSamples`)
+            The seconds from sending input until receiving the first state including
+            it.
+
+        ``closed`` (str)
+            Why the game ended for this client (the server quit or stopped answering),
+            ``None`` while it has not.  Leaving with :func:`netplay.NetClient.close`
+            does not set it.
+    '''
+    def __init__(self, host, port=constants.NET_PORT, timeout=constants.NET_TIMEOUT):
+        self.timeout = timeout
+        self.socket  = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        # Only datagrams from the server get through
+        self.socket.connect((host, port))
+        self.socket.settimeout(JOIN_INTERVAL)
+        deadline = default_timer() + timeout
+        while True:
+            self.socket.send(_packet(JOIN))
+            try:
+                data = self.socket.recv(MAX_DATAGRAM)
+            except (socket.timeout, socket.error) as e:
+                if default_timer() >= deadline:
+                    self.socket.close()
+                    raise RuntimeError("No game server at [{}:{}]: {}".format(host, port,
+                                                                               e))
+                if not isinstance(e, socket.timeout):
+                    # Nobody listening (yet) is "connection refused" right away
+                    time.sleep(JOIN_INTERVAL)
+                continue
+            code = _code(data)
+            if code == REJECT:
+                self.socket.close()
+                raise RuntimeError("The game server at [{}:{}] has no CitizenPac "
+                                   "left.".format(host, port))
+            if code == WELCOME and len(data) == HEADER.size + HELLO.size:
+                break
+        (self.player, self.numPlayers, self.width, self.height,
+         self.seed) = HELLO.unpack_from(data, HEADER.size)
+        self.socket.setblocking(False)
+
+        self.state           = None
+        self.running         = False
+        self.resync          = True
+        self.flags           = constants.STATIONARY
+        self.pauses          = 0
+        self.sequence        = 0
+        self.echo            = 0.0
+        self.latency         = RollingSamples(LATENCY_SAMPLES)
+        self.closed          = None
+        self.started         = default_timer()
+        self.lastHeard       = self.started
+        self.packetsReceived = 0
+        self.bytesReceived   = 0
+        self.bytesSent       = 0
+        self.fullSnapshots   = 0
+
+    def move(self, direction, pressed):
+        ''' See :func:`view.actors.Actor.queueMove`, for this player's CitizenPac. '''
+        if pressed:
+            self.flags |= direction
+        else:
+            self.flags &= ~direction
+
+    def setMove(self, flags):
+        ''' Sets the ``moveFlags`` of this player's CitizenPac. '''
+        self.flags = flags or constants.STATIONARY
+
+    def togglePause(self):
+        ''' Pauses or resumes the game for everybody, like the space bar. '''
+        self.pauses = (self.pauses + 1) & 0xFF
+
+    def send(self):
+        '''
+        Sends the current input to the server.
+        '''
+        if self.closed:
+            return
+        self.sequence += 1
+        data = _packet(INPUT, CONTROLS.pack(self.sequence, default_timer(), self.flags,
+                                            self.pauses, self.resync))
+        try:
+            self.socket.send(data)
+        except socket.error as e:
+            self.closed = "Lost the game server: {}".format(e)
+            return
+        self.bytesSent += len(data)
+
+    def poll(self):
+        '''
+        Applies every datagram that arrived since the last call.
+
+        :Return:
+            ``bool``
+                Whether anything arrived.
+        '''
+        if self.closed:
+            return False
+        received = False
+        while True:
+            try:
+                data = self.socket.recv(MAX_DATAGRAM)
+            except socket.error as e:
+                if e.args and e.args[0] in (errno.EAGAIN, errno.EWOULDBLOCK):
+                    break
+                self.closed = "Lost the game server: {}".format(e)
+                return received
+            now  = default_timer()
+            code = _code(data)
+            self.packetsReceived += 1
+            self.bytesReceived   += len(data)
+            self.lastHeard        = now
+            if code == LEAVE:
+                self.closed = "The game server quit."
+                return received
+            if code not in (FULL, DELTA) or len(data) < HEADER.size + STATE.size:
+                continue
+            running, echo = STATE.unpack_from(data, HEADER.size)
+            offset        = HEADER.size + STATE.size
+            if echo > self.echo:
+                self.latency.add(now - echo)
+                self.echo = echo
+            if code == FULL:
+                self.state  = snapshot.decode(data[offset:])
+                self.resync = False
+                self.fullSnapshots += 1
+            elif self.state is None or self.resync:
+                continue
+            elif offset < len(data):
+                tick = snapshot.DELTA.unpack_from(data, offset)[0]
+                if tick <= self.state.tick:
+                    # Late
+                    continue
+                if tick != self.state.tick + 1:
+                    # Missed a delta, wait for a full snapshot
+                    self.resync = True
+                    continue
+                snapshot.applyDelta(self.state, data, offset)
+            self.running = bool(running)
+            received     = True
+        if default_timer() - self.lastHeard > self.timeout:
+            self.closed = "The game server stopped answering."
+        return received
+
+    def report(self):
+        '''
+        :Return:
+            ``dict``
+                ``seconds`` since joining, ``packets`` and ``bytes`` received,
+                ``bytesPerSecond``, ``bytesSent``, ``fullSnapshots`` and the 50th, 95th
+                and 99th percentile ``latency`` in milliseconds.
+        '''
+        seconds = max(default_timer() - self.started, 1e-9)
+        return {
+            "seconds": seconds, "packets": self.packetsReceived,
+            "bytes": self.bytesReceived, "bytesPerSecond": self.bytesReceived / seconds,
+            "bytesSent": self.bytesSent, "fullSnapshots": self.fullSnapshots,
+            "latency": [value * 1000.0 for value in self.latency.percentiles(50, 95, 99)]
+        }
+
+    def close(self):
+        '''
+        Tells the server that this player quits.
+        '''
+        if not self.closed:
+            try:
+                self.socket.send(_packet(LEAVE))
+            except socket.error:
+                pass
+        self.socket.close()
+
+
+class NetDriver(SceneObserver):
+    '''
+    Shows the game of ``client`` in the window of ``game``, and sends the keyboard
+    input to the server.  Like :class:`simulation.SimulationDriver` the scene does not
+    tick on its own: rewinding is disabled, the Ghosts' timers are stopped and every
+    ``settings.refreshRate`` milliseconds the latest state is restored into the scene.
+
+    :Parameters:
+        ``game`` (:class:`controller.CitizenPac`)
+            The window, created with the ``seed``, size and number of players of
+            ``client``.  It keeps a reference in ``game.simulation`` so that it can
+            forward losing focus.
+
+        ``client`` (:class:`netplay.NetClient`)
+            The connection to the server.
+    '''
+    def __init__(self, game, client):
+        self.game   = game
+        self.client = client
+        game.setRewindEnabled(False)
+        game.scene.setGhostMoveTicks(0)
+        # The timer of the game keeps running while the server does, it must not tick
+        game.setTickCallback(lambda: None)
+        game.simulation = self
+        game.scene.addObserver(self)
+
+        self.timer = QtCore.QTimer()
+        self.timer.timeout.connect(self.sync)
+        self.timer.start(game.settings.refreshRate)
+
+    def keyEvent(self, scene, key, pressed):
+        # The scene moves its own CitizenPac as well, until the next sync overwrites it
+        direction = KEYS.get(key)
+        if direction is not None:
+            self.client.move(direction, pressed)
+        elif key == QtCore.Qt.Key_Space and not pressed:
+            self.client.togglePause()
+
+    def setRunning(self, running):
+        ''' Pausing is sent by :func:`netplay.NetDriver.keyEvent`, nothing to do. '''
+        pass
+
+    def setStationary(self):
+        ''' Forwards :func:`controller.GameController.appLostFocus`. '''
+        self.client.setMove(constants.STATIONARY)
+
+    def sync(self):
+        '''
+        Receives what the server sent, restores it into the scene and updates the
+        displays that changed, then sends the input.  Quits the application when the
+        game is over for the client.
+        '''
+        client = self.client
+        if client.poll():
+            self.show()
+        client.send()
+        if client.closed:
+            QtCore.QCoreApplication.quit()
+
+    def show(self):
+        '''
+        Restores the latest state of the client into the scene, and updates the displays
+        that changed.
+        '''
+        client  = self.client
+        game    = self.game
+        scene   = game.scene
+        lives   = game.livesLeft
+        eaten   = scene.foodEaten
+        running = game.gameRunning
+        snapshot.restore(game, snapshot.encode(client.state))
+        game.gameRunning = client.running
+        scene.setRunning(client.running)
+
+        if game.livesLeft != lives:
+            game.displayLives(game.livesLeft)
+        if scene.foodEaten != eaten:
+            game.displayScore(scene.foodEaten * game.settings.foodValue)
+            if game.settings.useSpeedBoost:
+                game.displaySpeedBoost(game.speedBoost())
+        if client.running != running:
+            game.displayRunning(client.running)
+
+    def close(self):
+        ''' Stops showing the game, and leaves it. '''
+        self.timer.stop()
+        self.game.scene.removeObserver(self)
+        self.game.simulation = None
+        self.client.close()
@@ -0,0 +1,112 @@
+'''
+The ``perfstats`` module keeps rolling statistics about how long ticks and paints take,
+for the performance overlay (see :class:`view.display.PerfOverlay`).  Recording a sample
+is a single store into a preallocated array; the percentiles are only computed when
+somebody asks for them.
+'''
+
+import array
+from timeit import default_timer
+
+from model import SceneObserver
+
+__all__ = ["RollingSamples", "PerfMonitor"]
+
+WINDOW = 500
+''' The number of most recent samples the percentiles are computed over. '''
+
+
+class RollingSamples(object):
+    '''
+    The most recent ``capacity`` samples of some measurement.
+
+    :Parameters:
+        ``capacity`` (int)
+            How many samples to keep.
+    '''
+    def __init__(self, capacity=WINDOW):
+        self.samples = array.array("d", [0.0]) * capacity
+        self.count   = 0
+
+    def add(self, value):
+        '''
+        Records ``value``, replacing the oldest sample once the window is full.
+        '''
+        samples = self.samples
+        samples[self.count % len(samples)] = value
+        self.count += 1
+
+    def mean(self):
+        '''
+        :Return:
+            ``float``
+                The mean of the samples in the window, ``0.0`` if there are none.
+        '''
+        n = min(self.count, len(self.samples))
+        return sum(self.samples[:n]) / n if n else 0.0
+
+    def percentiles(self, *ps):
+        '''
+        :Parameters:
+            ``ps`` (float)
+                The percentiles to compute, each in ``[0, 100]``.
+
+        :Return:
+            ``list``
+                The (nearest rank) percentiles of the samples in the window, in the
+                order asked for.  ``0.0`` for each if there are no samples yet.
+        '''
+        n = min(self.count, len(self.samples))
+        if n == 0:
+            return [0.0] * len(ps)
+        ordered = sorted(self.samples[:n])
+        return [ordered[min(n - 1, int(p / 100.0 * n))] for p in ps]
+
+
+class PerfMonitor(SceneObserver):
+    '''
+    Measures every tick of ``scene`` and every paint reported to
+    :func:`perfstats.PerfMonitor.paintFinished`.  The tick time is measured from the
+    moment the observers are notified that the tick started to the moment they are
+    notified that it finished, so it covers everything but the Ghosts' steering.
+
+    :Parameters:
+        ``scene`` (:class:`model.Scene`)
+            The scene to measure.  The monitor registers itself.
+
+    :Attributes:
+        ``tickTimes`` / ``paintTimes`` (:class:`perfstats.RollingSamples`)
+            The most recent durations, in seconds.
+
+        ``ticks`` / ``paints`` (int)
+            How many ticks / paints have been measured.
+    '''
+    def __init__(self, scene):
+        self.scene      = scene
+        self.tickTimes  = RollingSamples()
+        self.paintTimes = RollingSamples()
+        self.ticks      = 0
+        self.paints     = 0
+        self.tickStart  = 0.0
+        scene.addObserver(self)
+
+    def tickStarted(self, scene):
+        self.tickStart = default_timer()
+
+    def tickFinished(self, scene):
+        self.tickTimes.add(default_timer() - self.tickStart)
+        self.ticks += 1
+
+    def paintFinished(self, start, end):
+        '''
+        Records a paint that took from ``start`` to ``end`` (``timeit.default_timer``
+        seconds), see :class:`tracing.PaintTracer`.
+        '''
+        self.paintTimes.add(end - start)
+        self.paints += 1
+
+    def close(self):
+        '''
+        Stops measuring ticks.
+        '''
+        self.scene.removeObserver(self)
@@ -0,0 +1,217 @@
+'''
+The ``profiling`` module profiles a bounded window of gameplay with ``cProfile``, e.g.
+
+.. code-block:: console
+
+   $ python citizenpac --profile out                            # 30 seconds of play
+   $ python citizenpac --replay game.log --headless --profile out
+
+A :class:`profiling.ProfileSession` starts when the space bar first starts the game (or
+right away when playing back a recording), and stops after ``seconds`` of play or when
+the recording ends.  It then writes to its directory:
+
++--------------------+----------------------------------------------------------------+
+| File               | Contents                                                       |
++====================+================================================================+
+| ``profile.pstats`` | The raw statistics, for ``pstats`` / snakeviz / gprof2dot.     |
++--------------------+----------------------------------------------------------------+
+| ``summary.txt``    | The functions with the most cumulative time.                   |
++--------------------+----------------------------------------------------------------+
+| ``modules.txt``    | Own time and calls per module: ``model``, ``view.actors``,     |
+|                    | ``controller``, ..., and everything outside of the game.       |
++--------------------+----------------------------------------------------------------+
+| ``profile.folded`` | Collapsed stacks (``outer;...;inner microseconds``) for        |
+|                    | ``flamegraph.pl`` or speedscope.                               |
++--------------------+----------------------------------------------------------------+
+
+``cProfile`` only records who called whom, not complete stacks, so the collapsed
+stacks are reconstructed: the time of a function is split over its callers in
+proportion to the time each caller spent in it.  For anything but recursion this is
+exact in total and usually very close per stack.
+'''
+
+import cProfile
+import os
+import pstats
+import sys
+from timeit import default_timer
+
+from PyQt4 import QtCore
+
+import constants
+from model import SceneObserver
+
+__all__ = ["ProfileSession"]
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+''' The directory of the game, files below it are reported as modules of the game. '''
+
+MIN_STACK_TIME = 1e-5
+''' Reconstructed stacks with less time than this (in seconds) are left out. '''
+
+MAX_STACK_DEPTH = 64
+''' Reconstructed stacks are cut off at this depth. '''
+
+
+def moduleName(filename):
+    '''
+    :Return:
+        ``str``
+            The dotted module name of ``filename`` if it is part of the game (e.g.
+            ``view.actors``), ``"<builtin>"`` for functions implemented in C and
+            ``"<external>"`` for everything else.
+    '''
+    if filename == "~" or filename.startswith("<"):
+        return "<builtin>"
+    path = os.path.abspath(filename)
+    if not path.startswith(ROOT + os.sep):
+        return "<external>"
+    module = os.path.splitext(os.path.relpath(path, ROOT))[0]
+    return module.replace(os.sep, ".")
+
+
+def functionName(func):
+    filename, line, name = func
+    if filename == "~":
+        return name
+    return "{}:{}".format(moduleName(filename), name)
+
+
+class ProfileSession(SceneObserver):
+    '''
+    Profiles up to ``seconds`` of ``game``, see the module documentation.
+
+    :Parameters:
+        ``game`` (:class:`controller.GameController`)
+            The game to profile.
+
+        ``directory`` (str)
+            Where to write the results, created if needed.
+
+        ``seconds`` (float)
+            How long to profile for, at most.  ``None`` for no limit.
+
+        ``stopWhen`` (callable)
+            Called after every tick; the session stops as soon as it returns ``True``
+            (e.g. :func:`replay.ReplayPlayer.finished`).
+
+    :Attributes:
+        ``state`` (str)
+            ``"waiting"``, ``"profiling"`` or ``"done"``.
+    '''
+    def __init__(self, game, directory, seconds=constants.PROFILE_SECONDS, stopWhen=None):
+        self.game      = game
+        self.directory = directory
+        self.seconds   = seconds
+        self.stopWhen  = stopWhen
+        self.state     = "waiting"
+        self.profiler  = cProfile.Profile()
+        self.started   = 0.0
+        game.scene.addObserver(self)
+
+    def keyEvent(self, scene, key, pressed):
+        # The release of the space bar is what starts the game
+        if key == QtCore.Qt.Key_Space and not pressed:
+            self.start()
+
+    def tickFinished(self, scene):
+        if self.state != "profiling":
+            return
+        if self.seconds is not None and default_timer() - self.started >= self.seconds:
+            self.stop()
+        elif self.stopWhen is not None and self.stopWhen():
+            self.stop()
+
+    def start(self):
+        '''
+        Starts profiling, unless it already started.
+        '''
+        if self.state != "waiting":
+            return
+        self.state   = "profiling"
+        self.started = default_timer()
+        self.profiler.enable()
+
+    def stop(self):
+        '''
+        Stops profiling (if it is running) and writes the results.  Calling this more
+        than once does nothing.
+        '''
+        if self.state != "profiling":
+            return
+        self.profiler.disable()
+        self.state = "done"
+        self.game.scene.removeObserver(self)
+        self.write()
+
+    def write(self):
+        '''
+        Writes the results to ``self.directory``.
+        '''
+        if not os.path.isdir(self.directory):
+            os.makedirs(self.directory)
+        self.profiler.dump_stats(os.path.join(self.directory, "profile.pstats"))
+
+        with open(os.path.join(self.directory, "summary.txt"), "w") as f:
+            stats = pstats.Stats(self.profiler, stream=f)
+            stats.sort_stats("cumulative").print_stats(60)
+        stats = stats.stats
+
+        with open(os.path.join(self.directory, "modules.txt"), "w") as f:
+            self.__writeModules(stats, f)
+        with open(os.path.join(self.directory, "profile.folded"), "w") as f:
+            self.__writeStacks(stats, f)
+
+    def __writeModules(self, stats, f):
+        total   = sum(entry[2] for entry in stats.values()) or 1e-9
+        modules = {}
+        for func, (cc, nc, tt, ct, callers) in stats.items():
+            name  = moduleName(func[0])
+            entry = modules.setdefault(name, [0.0, 0])
+            entry[0] += tt
+            entry[1] += nc
+
+        f.write("{:<24} {:>12} {:>8} {:>12}\n".format("module", "own time (s)", "%",
+                                                       "calls"))
+        for name, (tt, nc) in sorted(modules.items(), key=lambda item: -item[1][0]):
+            f.write("{:<24} {:>12.4f} {:>8.2f} {:>12}\n".format(name, tt,
+                                                                 100.0 * tt / total, nc))
+
+    def __writeStacks(self, stats, f):
+        callees = {}
+        for func, entry in stats.items():
+            for caller in entry[4]:
+                callees.setdefault(caller, []).append(func)
+        roots = [func for func, entry in stats.items() if not entry[4]]
+
+        folded = {}
+
+        def visit(func, path, weight):
+            cc, nc, tt, ct, callers = stats[func]
+            path = path + [functionName(func)]
+            key  = ";".join(path)
+            folded[key] = folded.get(key, 0.0) + tt * weight
+            if len(path) >= MAX_STACK_DEPTH:
+                return
+            for callee in callees.get(func, ()):
+                calleeCt = stats[callee][3]
+                edgeCt   = stats[callee][4][func][3]
+                if callee == func or calleeCt <= 0.0:
+                    continue
+                share = weight * edgeCt
+                if share >= MIN_STACK_TIME:
+                    visit(callee, path, share / calleeCt)
+
+        # Deep recursion in the reconstruction is bounded by MAX_STACK_DEPTH
+        limit = sys.getrecursionlimit()
+        sys.setrecursionlimit(max(limit, 4 * MAX_STACK_DEPTH + 100))
+        try:
+            for root in roots:
+                visit(root, [], 1.0)
+        finally:
+            sys.setrecursionlimit(limit)
+
+        for stack, seconds in sorted(folded.items()):
+            micros = int(round(seconds * 1e6))
+            if micros > 0:
+                f.write("{} {}\n".format(stack, micros))
@@ -0,0 +1,342 @@
+'''
+The ``replay`` module records the input of a game to a compact binary log, and plays
+such a log back: either in the window at normal speed, or headless as fast as the
+machine allows (see :class:`controller.HeadlessCitizenPac`).
+
+A game is deterministic given its seed (:func:`model.seedRandom`), the size of the
+board, and *when* every actor's ``moveFlags`` changed.  The Ghosts change direction on
+wall clock timers, so their changes are recorded exactly like CitizenPac's.  Changes are
+sampled at the start of every tick, which is the only moment they have any effect.
+
+Every ``keyframeInterval`` ticks the complete state (:func:`snapshot.capture`) is stored
+as well, which is what allows :func:`replay.ReplayPlayer.seek` to jump into the middle
+of a long recording.  The layout (all values little endian) is a ``HEADER`` followed by
+any number of ``EVENT`` records:
+
++------------------+------------------------------------------------------------------+
+| Block            | Contents                                                         |
++==================+==================================================================+
+| ``HEADER``       | magic ``b"CPRL"``, version, number of movers, seed, board width, |
+|                  | board height, keyframe interval.                                 |
++------------------+------------------------------------------------------------------+
+| ``EVENT``        | tick, code, value.  For a code below :data:`replay.PAUSE_TOGGLE` |
+|                  | the code is an index into :attr:`model.Scene.movers` and the     |
+|                  | value is its new ``moveFlags``.                                  |
++------------------+------------------------------------------------------------------+
+| ``PAUSE_TOGGLE`` | The space bar was released.                                      |
++------------------+------------------------------------------------------------------+
+| ``KEYFRAME``     | Followed by a ``uint32`` length and that many bytes of snapshot. |
++------------------+------------------------------------------------------------------+
+| ``END``          | The recording stopped at this tick.                              |
++------------------+------------------------------------------------------------------+
+'''
+
+import array
+import struct
+
+from PyQt4 import QtCore
+
+import snapshot
+from model import SceneObserver
+
+__all__ = ["InputRecorder", "ReplayLog", "ReplayPlayer"]
+
+MAGIC   = b"CPRL"
+''' The first four bytes of every replay log. '''
+
+VERSION = 1
+''' The version of the log layout written by :class:`replay.InputRecorder`. '''
+
+KEYFRAME_INTERVAL = 1000
+''' The default number of ticks between two keyframes (10 seconds of game time). '''
+
+PAUSE_TOGGLE = 0xF0
+KEYFRAME     = 0xF1
+END          = 0xFF
+
+HEADER = struct.Struct("<4sHHQddI")
+EVENT  = struct.Struct("<IBB")
+LENGTH = struct.Struct("<I")
+
+
+class InputRecorder(SceneObserver):
+    '''
+    Records the input of ``game`` to the file ``path`` until
+    :func:`replay.InputRecorder.close` is called.  Events are buffered in memory and
+    written out with every keyframe.
+
+    :Parameters:
+        ``game`` (:class:`controller.GameController`)
+            The game to record.  Its scene must already have been generated.
+
+        ``path`` (str)
+            The file to write the log to.
+
+        ``keyframeInterval`` (int)
+            The number of ticks between two keyframes.
+    '''
+    def __init__(self, game, path, keyframeInterval=KEYFRAME_INTERVAL):
+        scene = game.scene
+        rect  = scene.sceneRect()
+
+        self.game             = game
+        self.keyframeInterval = keyframeInterval
+        self.lastFlags        = [None] * len(scene.movers)
+        self.buffer           = bytearray(HEADER.pack(
+            MAGIC, VERSION, len(scene.movers), game.seed,
+            rect.width(), rect.height(), keyframeInterval
+        ))
+        self.stream           = open(path, "wb")
+        scene.addObserver(self)
+
+    def tickStarted(self, scene):
+        tick      = scene.tick
+        lastFlags = self.lastFlags
+        for i, actor in enumerate(scene.movers):
+            flags = actor.moveFlags
+            if flags != lastFlags[i]:
+                lastFlags[i] = flags
+                self.buffer += EVENT.pack(tick, i, flags)
+
+        if tick % self.keyframeInterval == 0:
+            data = snapshot.capture(self.game)
+            self.buffer += EVENT.pack(tick, KEYFRAME, 0)
+            self.buffer += LENGTH.pack(len(data))
+            self.buffer += data
+            self.flush()
+
+    def sceneReset(self, scene):
+        # Every mover was made stationary behind the recorder's back, record them all
+        # again at the next tick
+        self.lastFlags = [None] * len(scene.movers)
+
+    def keyEvent(self, scene, key, pressed):
+        if key == QtCore.Qt.Key_Space and not pressed:
+            self.buffer += EVENT.pack(scene.tick, PAUSE_TOGGLE, 0)
+
+    def flush(self):
+        '''
+        Writes all buffered events to the file.
+        '''
+        self.stream.write(self.buffer)
+        self.stream.flush()
+        del self.buffer[:]
+
+    def close(self):
+        '''
+        Stops recording, marks the end of the log and closes the file.  Calling this more
+        than once does nothing.
+        '''
+        if self.stream.closed:
+            return
+        scene = self.game.scene
+        scene.removeObserver(self)
+        self.buffer += EVENT.pack(scene.tick, END, 0)
+        self.flush()
+        self.stream.close()
+
+
+class ReplayLog(object):
+    '''
+    A log written by :class:`replay.InputRecorder`, parsed into parallel arrays.
+
+    :Parameters:
+        ``data`` (bytes)
+            The contents of the log.
+
+    :Attributes:
+        ``seed`` (int)
+            The seed the recorded game was generated with.
+
+        ``width`` / ``height`` (float)
+            The size of the recorded game board.
+
+        ``numMovers`` (int)
+            The number of movers in the recorded scene.
+
+        ``ticks`` / ``codes`` / ``values`` (:class:`array.array`)
+            One entry per event, see the module documentation.
+
+        ``keyframes`` (list)
+            A ``(eventIndex, tick, data)`` tuple per keyframe, in order.
+
+        ``endTick`` (int)
+            The tick the recording stopped at.
+    '''
+    def __init__(self, data):
+        if len(data) < HEADER.size:
+            raise RuntimeError("Replay log is truncated ({} bytes).".format(len(data)))
+        (magic, version, self.numMovers, self.seed,
+         self.width, self.height, self.keyframeInterval) = HEADER.unpack_from(data, 0)
+        if magic != MAGIC:
+            raise RuntimeError("Not a CitizenPac replay log (magic was {!r}).".format(magic))
+        if version != VERSION:
+            raise RuntimeError("Unsupported replay log version [{}].".format(version))
+
+        self.ticks     = array.array("I")
+        self.codes     = array.array("B")
+        self.values    = array.array("B")
+        self.keyframes = []
+        self.endTick   = 0
+
+        offset = HEADER.size
+        size   = len(data)
+        while offset + EVENT.size <= size:
+            tick, code, value = EVENT.unpack_from(data, offset)
+            offset += EVENT.size
+            if code == KEYFRAME:
+                length, = LENGTH.unpack_from(data, offset)
+                offset += LENGTH.size
+                self.keyframes.append((len(self.ticks), tick, data[offset:offset + length]))
+                offset += length
+            self.ticks.append(tick)
+            self.codes.append(code)
+            self.values.append(value)
+            self.endTick = max(self.endTick, tick)
+
+    def __len__(self):
+        return len(self.ticks)
+
+    @classmethod
+    def load(cls, path):
+        '''
+        Reads and parses the log stored in ``path``.
+
+        :Parameters:
+            ``path`` (str)
+                The file to read.
+
+        :Return:
+            :class:`replay.ReplayLog`
+                The parsed log.
+        '''
+        with open(path, "rb") as f:
+            return cls(f.read())
+
+
+class ReplayPlayer(object):
+    '''
+    Plays ``log`` back into ``game``.  Keyboard input and the Ghosts' own timers are
+    disabled for the lifetime of the player, everything comes from the log.
+
+    - In the window, call :func:`replay.ReplayPlayer.start` and the game timer does the
+      rest.
+    - Headless, call :func:`replay.ReplayPlayer.run`.
+
+    :Parameters:
+        ``game`` (:class:`controller.GameController`)
+            A freshly created game with the seed and board size of ``log``.
+
+        ``log`` (:class:`replay.ReplayLog`)
+            The log to play back.
+    '''
+    def __init__(self, game, log):
+        if log.numMovers != len(game.scene.movers):
+            raise RuntimeError(
+                "The log has {} movers, but the scene has {}.".format(
+                    log.numMovers, len(game.scene.movers)
+                )
+            )
+        self.game   = game
+        self.log    = log
+        self.cursor = 0
+        game.scene.inputLocked = True
+        game.scene.setGhostMoveTicks(0)
+
+    def applyPending(self):
+        '''
+        Applies every event recorded up to and including the current tick.
+        '''
+        game   = self.game
+        log    = self.log
+        tick   = game.scene.tick
+        movers = game.scene.movers
+        cursor = self.cursor
+        while cursor < len(log) and log.ticks[cursor] <= tick:
+            code = log.codes[cursor]
+            if code < PAUSE_TOGGLE:
+                movers[code].moveFlags = log.values[cursor]
+            elif code == PAUSE_TOGGLE:
+                game.gameRunningSwitched()
+            cursor += 1
+        self.cursor = cursor
+
+    def step(self):
+        '''
+        Plays back one tick.  The input for the next tick is applied right away, since
+        it may resume a game that just paused itself (e.g. after losing a life) and
+        nothing would call this method again otherwise.
+        '''
+        self.applyPending()
+        if self.game.gameRunning:
+            self.game.scene.advance()
+            self.applyPending()
+        if self.game.gameRunning and self.finished():
+            self.game.gameRunningSwitched()
+
+    def finished(self):
+        '''
+        :Return:
+            ``bool``
+                ``True`` once every event has been applied and the recorded number of
+                ticks has been played back.
+        '''
+        return self.cursor >= len(self.log) and self.game.scene.tick >= self.log.endTick
+
+    def start(self):
+        '''
+        Starts playing back in the window: the game timer calls
+        :func:`replay.ReplayPlayer.step` instead of :func:`model.Scene.advance`, and
+        the recorded input of tick ``0`` (usually the first press of the space bar)
+        starts it.
+        '''
+        self.game.setTickCallback(self.step)
+        self.applyPending()
+
+    def run(self, ticks=None):
+        '''
+        Plays back as fast as possible until the end of the log, or until the game
+        stops on its own (e.g. it was over before the recording ended).
+
+        :Parameters:
+            ``ticks`` (int)
+                Stop after this many ticks instead, ``None`` for no limit.
+
+        :Return:
+            ``int``
+                The number of ticks that were played back.
+        '''
+        scene = self.game.scene
+        start = scene.tick
+        while not self.finished():
+            if ticks is not None and scene.tick - start >= ticks:
+                break
+            before = (scene.tick, self.cursor)
+            self.step()
+            if (scene.tick, self.cursor) == before:
+                break
+        return scene.tick - start
+
+    def seek(self, tick):
+        '''
+        Jumps to ``tick``: restores the last keyframe at or before it, then plays back
+        the remaining ticks as fast as possible.
+
+        :Parameters:
+            ``tick`` (int)
+                The tick to jump to.
+        '''
+        keyframe = None
+        for candidate in self.log.keyframes:
+            if candidate[1] > tick:
+                break
+            keyframe = candidate
+        if keyframe is None:
+            raise RuntimeError("There is no keyframe at or before tick [{}].".format(tick))
+
+        eventIndex, keyTick, data = keyframe
+        self.game.restoreSnapshot(data)
+        self.cursor = eventIndex + 1
+        # Keyframes are only ever taken while the game is running
+        self.game.gameRunningSwitched()
+        self.run(tick - keyTick)
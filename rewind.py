@@ -0,0 +1,220 @@
+'''
+The ``rewind`` module keeps the recent history of a game in memory so that it can be
+stepped back through, e.g. to look at what led up to a lost life.
+
+Every tick is recorded as a delta against the previous one (:class:`snapshot.DeltaEncoder`),
+which for a running game is typically a hundred bytes or so.  Every
+:data:`constants.REWIND_KEYFRAME_INTERVAL` ticks, and whenever something happens that a
+delta cannot express (a life lost, a snapshot restored), a full snapshot starts a new
+*segment* instead.  The buffer is capped at :data:`constants.REWIND_BUFFER_BYTES`; when
+it is full, whole segments are dropped from the oldest end.  A snapshot restored from
+elsewhere (e.g. ``--resume``) did not follow from what was recorded before it, so it
+starts the history over.
+
+Recording costs one :func:`snapshot.DeltaEncoder.encode` per tick, i.e. a handful of
+comparisons per mover.  Rewinding reconstructs the state from the closest earlier
+snapshot, so it costs at most ``REWIND_KEYFRAME_INTERVAL`` deltas.
+'''
+
+import array
+import collections
+
+import constants
+import snapshot
+from model import SceneObserver
+
+__all__ = ["RewindBuffer"]
+
+
+class _Segment(object):
+    '''
+    A full snapshot, followed by the deltas of the consecutive ticks after it.
+
+    :Attributes:
+        ``tick`` (int)
+            The tick the snapshot was taken at.
+
+        ``keyframe`` (bytes)
+            The snapshot.
+
+        ``deltas`` (bytearray)
+            The deltas, the ``i``-th one leads to tick ``tick + i + 1``.
+
+        ``offsets`` (:class:`array.array`)
+            Where each of the deltas starts in ``deltas``.
+    '''
+    def __init__(self, tick, keyframe):
+        self.tick     = tick
+        self.keyframe = keyframe
+        self.deltas   = bytearray()
+        self.offsets  = array.array("I")
+
+    def endTick(self):
+        return self.tick + len(self.offsets)
+
+    def size(self):
+        return len(self.keyframe) + len(self.deltas) + \
+            self.offsets.itemsize * len(self.offsets)
+
+
+class RewindBuffer(SceneObserver):
+    '''
+    Records every tick of ``game`` so that it can be rewound with
+    :func:`rewind.RewindBuffer.rewind`.  The buffer registers itself with the scene, and
+    records the state at the end of every tick.
+
+    :Parameters:
+        ``game`` (:class:`controller.GameController`)
+            The game to record.  Its scene must already have been generated.
+
+        ``maxBytes`` (int)
+            The most memory the recorded history may use.  The newest segment is always
+            kept, even if it alone is larger.
+
+        ``keyframeInterval`` (int)
+            The number of ticks between two full snapshots.
+
+    :Attributes:
+        ``size`` (int)
+            The memory currently used by the recorded history, in bytes.
+    '''
+    def __init__(self, game, maxBytes=constants.REWIND_BUFFER_BYTES,
+                 keyframeInterval=constants.REWIND_KEYFRAME_INTERVAL):
+        self.game             = game
+        self.maxBytes         = maxBytes
+        self.keyframeInterval = keyframeInterval
+        self.segments         = collections.deque()
+        self.size             = 0
+        self.__rewinding      = False
+        self.encoder          = snapshot.DeltaEncoder(game)
+        self.__keyframe(game.scene)
+        game.scene.addObserver(self)
+
+    def close(self):
+        '''
+        Stops recording and frees the recorded history.
+        '''
+        self.game.scene.removeObserver(self)
+        self.segments.clear()
+        self.size = 0
+
+    def __keyframe(self, scene):
+        # A rewind moves the tick backwards, the history after it no longer happened
+        self.__discardAfter(scene.tick - 1)
+        segment = _Segment(scene.tick, snapshot.capture(self.game))
+        self.segments.append(segment)
+        self.size += segment.size()
+        self.encoder.sync()
+        self.__trim()
+
+    def __trim(self):
+        segments = self.segments
+        while self.size > self.maxBytes and len(segments) > 1:
+            self.size -= segments.popleft().size()
+
+    def __discardAfter(self, tick):
+        segments = self.segments
+        while segments and segments[-1].tick > tick:
+            self.size -= segments.pop().size()
+        if segments and segments[-1].endTick() > tick:
+            segment = segments[-1]
+            keep    = tick - segment.tick
+            self.size -= segment.size()
+            del segment.deltas[segment.offsets[keep]:]
+            del segment.offsets[keep:]
+            self.size += segment.size()
+
+    def tickFinished(self, scene):
+        segment = self.segments[-1]
+        delta   = None
+        if scene.tick - segment.tick < self.keyframeInterval:
+            delta = self.encoder.encode()
+        if delta is None:
+            self.__keyframe(scene)
+            return
+
+        segment.offsets.append(len(segment.deltas))
+        segment.deltas += delta
+        self.size += len(delta) + segment.offsets.itemsize
+        if self.size > self.maxBytes:
+            self.__trim()
+
+    def sceneRestored(self, scene):
+        # The buffer has to end at the current tick again before the next rewind
+        if not self.__rewinding:
+            self.segments.clear()
+            self.size = 0
+        self.__keyframe(scene)
+
+    def oldestTick(self):
+        '''
+        :Return:
+            ``int``
+                The earliest tick that can still be rewound to.
+        '''
+        return self.segments[0].tick
+
+    def newestTick(self):
+        '''
+        :Return:
+            ``int``
+                The latest recorded tick, normally the current one.
+        '''
+        return self.segments[-1].endTick()
+
+    def stateAt(self, tick):
+        '''
+        Reconstructs the state of the game at ``tick``.
+
+        :Parameters:
+            ``tick`` (int)
+                The tick, between :func:`rewind.RewindBuffer.oldestTick` and
+                :func:`rewind.RewindBuffer.newestTick` (inclusive).
+
+        :Return:
+            ``bytes``
+                The state as a snapshot, see :func:`snapshot.capture`.
+        '''
+        if not self.oldestTick() <= tick <= self.newestTick():
+            raise RuntimeError(
+                "Tick [{}] is not in the rewind buffer (ticks {} to {}).".format(
+                    tick, self.oldestTick(), self.newestTick()
+                )
+            )
+        for segment in reversed(self.segments):
+            if segment.tick <= tick:
+                break
+        if tick == segment.tick:
+            return segment.keyframe
+        state  = snapshot.decode(segment.keyframe)
+        offset = 0
+        for _ in range(tick - segment.tick):
+            offset = snapshot.applyDelta(state, segment.deltas, offset)
+        return snapshot.encode(state)
+
+    def rewind(self, ticks):
+        '''
+        Jumps back ``ticks`` ticks (or as far back as the buffer goes), see
+        :func:`controller.GameController.restoreSnapshot`.  The game is left paused, and
+        the history after the new current tick is discarded: resuming the game records a
+        new one.  Does nothing when no earlier tick was recorded.
+
+        :Parameters:
+            ``ticks`` (int)
+                How many ticks to go back.
+
+        :Return:
+            ``int``
+                The tick the game is at now.
+        '''
+        current = self.game.scene.tick
+        tick    = max(self.oldestTick(), current - ticks)
+        if tick >= current:
+            return current
+        # Restoring calls sceneRestored, which discards the history after tick
+        self.__rewinding = True
+        try:
+            self.game.restoreSnapshot(self.stateAt(tick))
+        finally:
+            self.__rewinding = False
+        return tick
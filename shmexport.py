@@ -0,0 +1,274 @@
+'''
+The ``shmexport`` module publishes the state of a running game into a memory mapped file,
+so that other processes on the same machine (dashboards, bots, recorders) can follow
+the game without screen captures or sockets.  On Linux, put the file in ``/dev/shm`` and
+it never touches the disk.
+
+The file is a fixed size ring of ``slots`` frames, and :class:`shmexport.StateExporter`
+writes one frame per tick, plus one whenever the game is paused, resumed or restored
+between ticks.  Each frame is written with a single ``struct.pack_into`` plus one copy
+of :attr:`model.Scene.foodEatenMask`, straight into the mapping.  The layout (all values
+little endian) is a ``HEADER`` padded to ``HEADER_SIZE`` bytes followed by the slots:
+
++----------------+--------------------------------------------------------------------+
+| Block          | Contents                                                           |
++================+====================================================================+
+| ``HEADER``     | magic ``b"CPSM"``, version, number of movers, number of Food,      |
+|                | number of slots, slot size, live (``0`` once the game exited),     |
+|                | sequence number of the latest complete frame (``0`` for none).     |
++----------------+--------------------------------------------------------------------+
+| frame          | ``FRAME`` (sequence number, tick, lives left, Food eaten, score,   |
+|                | running, finished, :math:`(x, y)` of every mover, ``moveFlags`` of |
+|                | every mover), the Food eaten mask, and the sequence number again.  |
++----------------+--------------------------------------------------------------------+
+
+Frame ``seq`` lives in slot ``seq % slots``.  The writer stores the leading sequence
+number first and the trailing one last; a reader does the opposite (trailing, contents,
+leading) and only trusts the frame if both match the sequence number it wanted.  If the
+writer lapped the reader in the meantime they cannot match, and the reader simply tries
+the latest frame again.  See :class:`shmexport.StateReader`.
+'''
+
+import mmap
+import struct
+
+from model import SceneObserver
+
+__all__ = ["StateExporter", "StateReader", "Frame", "frameStruct", "frameValues"]
+
+MAGIC       = b"CPSM"
+''' The first four bytes of every exported file. '''
+
+VERSION     = 1
+''' The version of the layout written by :class:`shmexport.StateExporter`. '''
+
+SLOTS       = 8
+''' The default number of frames in the ring. '''
+
+HEADER      = struct.Struct("<4sHHIIIB3xQ")
+HEADER_SIZE = 64
+LIVE_OFFSET = 20
+SEQ_OFFSET  = 24
+SEQ         = struct.Struct("<Q")
+LIVE        = struct.Struct("<B")
+
+
+def frameStruct(numMovers):
+    '''
+    :Return:
+        :class:`struct.Struct`
+            The leading part of a frame for a scene with ``numMovers`` movers, everything
+            up to the Food eaten mask.
+    '''
+    return struct.Struct("<QQiIdBB2x{}d{}B".format(2 * numMovers, numMovers))
+
+
+def frameValues(game, seq):
+    '''
+    :Return:
+        ``list``
+            The values of the leading part of a frame (see
+            :func:`shmexport.frameStruct`) describing the current state of ``game``.
+    '''
+    scene  = game.scene
+    values = [seq, scene.tick, int(game.livesLeft), scene.foodEaten,
+              scene.foodEaten * game.settings.foodValue, game.gameRunning,
+              bool(game.gameFinished)]
+    flags  = []
+    for actor in scene.movers:
+        values.append(actor.x())
+        values.append(actor.y())
+        flags.append(actor.moveFlags)
+    values.extend(flags)
+    return values
+
+
+class Frame(object):
+    '''
+    One frame read by :func:`shmexport.StateReader.read`.
+
+    :Attributes:
+        ``seq`` (int)
+            The sequence number of the frame, increasing by one per published frame.
+
+        ``tick`` (int)
+            :attr:`model.Scene.tick` when the frame was written.
+
+        ``livesLeft`` (int), ``foodEaten`` (int), ``score`` (float)
+            The score board.
+
+        ``running`` (bool), ``finished`` (bool)
+            Whether the game was running, and whether it was over.
+
+        ``positions`` (tuple)
+            :math:`(x, y)` of CitizenPac and then every Ghost, flattened.
+
+        ``flags`` (tuple)
+            The ``moveFlags`` in the same order.
+
+        ``foodEatenMask`` (bytes)
+            One byte per Food, nonzero when eaten.
+    '''
+    def __init__(self, values, numMovers, foodEatenMask):
+        (self.seq, self.tick, self.livesLeft, self.foodEaten, self.score, running,
+         finished) = values[:7]
+        self.running       = bool(running)
+        self.finished      = bool(finished)
+        self.positions     = values[7:7 + 2 * numMovers]
+        self.flags         = values[7 + 2 * numMovers:]
+        self.foodEatenMask = foodEatenMask
+
+
+class StateExporter(SceneObserver):
+    '''
+    Publishes the state of ``game`` into the file ``path`` at the end of every tick, once
+    immediately, and whenever the game is paused, resumed or restored (e.g. rewound), so
+    that a paused game is not left looking like it runs.  The file is created (or
+    replaced) with its final size.
+
+    :Parameters:
+        ``game`` (:class:`controller.GameController`)
+            The game to publish.  Its scene must already have been generated.
+
+        ``path`` (str)
+            The file to map, e.g. ``/dev/shm/citizenpac``.
+
+        ``slots`` (int)
+            The number of frames in the ring, i.e. how far a reader may fall behind.
+    '''
+    def __init__(self, game, path, slots=SLOTS):
+        scene = game.scene
+
+        self.game       = game
+        self.numMovers  = len(scene.movers)
+        self.numFood    = len(scene.food)
+        self.frame      = frameStruct(self.numMovers)
+        self.slots      = slots
+        self.slotSize   = self.frame.size + self.numFood + SEQ.size
+        self.seq        = 0
+
+        size        = HEADER_SIZE + slots * self.slotSize
+        self.stream = open(path, "w+b")
+        self.stream.truncate(size)
+        self.mapping = mmap.mmap(self.stream.fileno(), size)
+        HEADER.pack_into(self.mapping, 0, MAGIC, VERSION, self.numMovers, self.numFood,
+                         slots, self.slotSize, 1, 0)
+
+        self.publish()
+        scene.addObserver(self)
+
+    def tickFinished(self, scene):
+        self.publish()
+
+    def runningSwitched(self, scene):
+        self.publish()
+
+    def sceneRestored(self, scene):
+        self.publish()
+
+    def publish(self):
+        '''
+        Writes the current state of the game as the next frame.
+        '''
+        mapping = self.mapping
+        seq     = self.seq + 1
+        start   = HEADER_SIZE + (seq % self.slots) * self.slotSize
+        foodAt  = start + self.frame.size
+
+        self.frame.pack_into(mapping, start, *frameValues(self.game, seq))
+        # Python 2 only accepts a str here
+        mapping[foodAt:foodAt + self.numFood] = bytes(self.game.scene.foodEatenMask)
+        SEQ.pack_into(mapping, foodAt + self.numFood, seq)
+        SEQ.pack_into(mapping, SEQ_OFFSET, seq)
+        self.seq = seq
+
+    def close(self):
+        '''
+        Stops publishing and marks the file as no longer live.  The file itself is left
+        in place for readers to notice.  Calling this more than once does nothing.
+        '''
+        if self.stream.closed:
+            return
+        self.game.scene.removeObserver(self)
+        LIVE.pack_into(self.mapping, LIVE_OFFSET, 0)
+        self.mapping.close()
+        self.stream.close()
+
+
+class StateReader(object):
+    '''
+    Reads the frames published by a :class:`shmexport.StateExporter`, possibly in
+    another process.
+
+    :Parameters:
+        ``path`` (str)
+            The file the exporter writes to.
+
+    :Attributes:
+        ``numMovers`` (int), ``numFood`` (int)
+            The size of the exported scene.
+    '''
+    def __init__(self, path):
+        with open(path, "rb") as f:
+            self.mapping = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        if len(self.mapping) < HEADER_SIZE:
+            raise RuntimeError("[{}] is too small to be a state export.".format(path))
+        (magic, version, self.numMovers, self.numFood, self.slots, self.slotSize, _,
+         _) = HEADER.unpack_from(self.mapping, 0)
+        if magic != MAGIC:
+            raise RuntimeError("Not a CitizenPac state export (magic was {!r}).".format(magic))
+        if version != VERSION:
+            raise RuntimeError("Unsupported state export version [{}].".format(version))
+        self.frame = frameStruct(self.numMovers)
+
+    def latest(self):
+        '''
+        :Return:
+            ``int``
+                The sequence number of the latest complete frame, ``0`` if there is none.
+        '''
+        return SEQ.unpack_from(self.mapping, SEQ_OFFSET)[0]
+
+    def live(self):
+        '''
+        :Return:
+            ``bool``
+                ``False`` once the exporting game has exited.
+        '''
+        return LIVE.unpack_from(self.mapping, LIVE_OFFSET)[0] != 0
+
+    def read(self, seq=None):
+        '''
+        Reads one frame.
+
+        :Parameters:
+            ``seq`` (int)
+                The sequence number of the frame to read, ``None`` for the latest one.
+
+        :Return:
+            :class:`shmexport.Frame`
+                The frame, or ``None`` if it is not available: not written yet, already
+                overwritten, or being overwritten while it was read.
+        '''
+        if seq is None:
+            seq = self.latest()
+        if seq <= 0:
+            return None
+        mapping = self.mapping
+        start   = HEADER_SIZE + (seq % self.slots) * self.slotSize
+        foodAt  = start + self.frame.size
+        # Opposite order of the writer, see the module documentation
+        if SEQ.unpack_from(mapping, foodAt + self.numFood)[0] != seq:
+            return None
+        values = self.frame.unpack_from(mapping, start)
+        mask   = mapping[foodAt:foodAt + self.numFood]
+        # The leading number last, after the contents have been copied
+        if SEQ.unpack_from(mapping, start)[0] != seq:
+            return None
+        return Frame(values, self.numMovers, mask)
+
+    def close(self):
+        '''
+        Unmaps the file.
+        '''
+        self.mapping.close()
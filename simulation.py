@@ -0,0 +1,495 @@
+'''
+The ``simulation`` module runs the game on a worker thread (``--threaded``), so that a
+slow paint no longer delays the next tick and a slow tick no longer delays the paint.
+
+The items of a ``QGraphicsScene`` may only be touched by the GUI thread, so the worker
+does not advance :class:`model.Scene` at all.  It advances a
+:class:`simulation.Simulation` instead: the same rules on plain Python values, i.e. a
+:class:`snapshot.State` plus the bounding rectangles that :func:`model.Scene.advance`
+collides (the actors do not override ``shape``, so Qt collides their bounding
+rectangles too).  Communication between the two threads is limited to
+
+- **state**: after every tick the worker encodes the state with
+  :func:`snapshot.encode` and publishes the resulting ``bytes`` (immutable) through a
+  :class:`simulation.StateBuffer`.  The GUI thread picks up the latest one on every
+  refresh of the view and restores it into the scene with :func:`snapshot.restore`,
+  skipping whatever it was too slow to show.
+- **input**: key presses, pausing and resuming are appended to a
+  :class:`collections.deque`, which the worker drains at the start of every tick.
+  Appending and popping are atomic, so neither side ever waits for the other.
+
+The worker ticks at a fixed rate (the game's ``settings.refreshRate``) against absolute
+deadlines, catching up on at most :data:`constants.SIMULATION_MAX_LAG` late ticks.  Keep
+in mind that the Python code of both threads still takes turns on the interpreter lock;
+what runs in parallel is Qt's own painting, which releases it.
+
+Everything that observes the ticks of :class:`model.Scene` (recording, the bot API,
+rewinding, ...) sees nothing while the worker runs, see
+:class:`simulation.SimulationDriver`.
+
+Because a :class:`simulation.Simulation` holds no Qt objects it is also cheap to copy:
+players that search ahead advance throwaway clones of it, see
+:func:`simulation.Simulation.clone`.
+'''
+
+import collections
+import random
+import threading
+from timeit import default_timer
+
+from PyQt4 import QtCore
+
+import constants
+import snapshot
+from model import SceneObserver
+from view.actors import FoodAnimation
+
+__all__ = ["Frame", "Simulation", "StateBuffer", "SimulationThread", "SimulationDriver"]
+
+INPUT_MOVE       = 0
+''' ``(INPUT_MOVE, direction, pressed)``: a movement key of CitizenPac. '''
+
+INPUT_STATIONARY = 1
+''' ``(INPUT_STATIONARY,)``: CitizenPac stops, e.g. the application lost focus. '''
+
+INPUT_RUNNING    = 2
+''' ``(INPUT_RUNNING, running)``: the game was paused or resumed. '''
+
+DIRECTIONS = [constants.MOVE_NORTH, constants.MOVE_SOUTH, constants.MOVE_EAST,
+              constants.MOVE_WEST]
+
+Frame = collections.namedtuple("Frame", ["sequence", "inputs", "running", "data"])
+'''
+One published state: its ``sequence`` number (incremented with every publication), how
+many ``inputs`` had been applied to it, whether the game is ``running``, and the encoded
+snapshot ``data``.
+'''
+
+
+def _rect(rect, dx=0.0, dy=0.0):
+    return (rect.left() + dx, rect.top() + dy, rect.right() + dx, rect.bottom() + dy)
+
+
+def _shift(rect, dx, dy):
+    return (rect[0] + dx, rect[1] + dy, rect[2] + dx, rect[3] + dy)
+
+
+def _overlap(a, b):
+    return a[0] < b[2] and b[0] < a[2] and a[1] < b[3] and b[1] < a[3]
+
+
+def _turn(flags, rng):
+    # The same as view.actors.GhostActor.timerEvent, on a plain integer
+    dirs = list(DIRECTIONS)
+    rng.shuffle(dirs)
+    if rng.random() < 0.5:
+        for d in dirs:
+            if (flags & d) == d:
+                return flags & ~d
+        return constants.STATIONARY
+    for d in dirs:
+        if not (flags & d) == d:
+            return flags | d
+    return flags
+
+
+class Simulation(object):
+    '''
+    The state and rules of ``game`` without any Qt objects, advanced with
+    :func:`simulation.Simulation.advance`.  Created on the GUI thread from the current
+    state of the game; only the worker thread uses it afterward.
+
+    A planner that looks ahead takes a :func:`simulation.Simulation.clone`, advances it
+    and throws it away.  Everything that never changes (the board, the settings) is
+    shared by all clones, and so is ``state.foodEatenMask`` until one of them changes it:
+    it is replaced by a copy rather than modified in place (copy-on-write).
+
+    :Parameters:
+        ``game`` (:class:`controller.GameController`)
+            The game to simulate.  Its scene must already have been generated.
+
+    :Attributes:
+        ``state`` (:class:`snapshot.State`)
+            The state of the game.
+
+        ``running`` (bool)
+            Whether the game is running, only then does it advance.
+
+        ``random`` (:class:`random.Random`)
+            Steers the Ghosts, seeded with the game's seed.  The worker must not share
+            the :mod:`random` module with the GUI thread.
+
+        ``settings`` (:class:`model.Settings`)
+            The settings of the game.  Only read, the current speed is
+            ``state.gameSpeed``.
+
+        ``sharedFood`` (bool)
+            Whether ``state.foodEatenMask`` may be shared with a clone (or the original),
+            and must be copied before it is modified.
+    '''
+    def __init__(self, game):
+        scene = game.scene
+        rect  = scene.sceneRect()
+
+        self.state          = snapshot.decode(snapshot.capture(game))
+        self.running        = game.gameRunning
+        self.random         = random.Random(game.seed)
+        self.settings       = game.settings
+        self.width          = rect.width()
+        self.height         = rect.height()
+        self.starts         = [(actor.cx, actor.cy) for actor in scene.movers]
+        self.moverRects     = [_rect(actor.boundingRect()) for actor in scene.movers]
+        self.foodRects      = [_rect(food.boundingRect(), food.x(), food.y())
+                               for food in scene.food]
+        self.ghostMoveTicks = game.settings.ghostMoveTicks()
+        self.sharedFood     = False
+
+    def clone(self):
+        '''
+        :Return:
+            :class:`simulation.Simulation`
+                An independent copy that continues exactly like this one would,
+                including the Ghosts' random turns.  It shares the board and, until
+                either side eats Food or loses a life, the Food eaten mask.
+        '''
+        clone = object.__new__(type(self))
+        clone.__dict__.update(self.__dict__)
+
+        # The scalars are immutable, only the arrays and the animation are copied
+        state = self.state
+        copy  = snapshot.State(self.settings)
+        copy.__dict__.update(state.__dict__)
+        copy.positions = state.positions[:]
+        copy.flags     = state.flags[:]
+        copy.animation = FoodAnimation()
+        copy.animation.outerSweep = state.animation.outerSweep
+        copy.animation.innerSweep = state.animation.innerSweep
+        copy.animation.decreasing = state.animation.decreasing
+        clone.state = copy
+        # Not seeded at all, setstate overwrites whatever seeding (slowly) would set
+        clone.random = random.Random.__new__(random.Random)
+        clone.random.setstate(self.random.getstate())
+        self.sharedFood = clone.sharedFood = True
+        return clone
+
+    def move(self, direction, pressed):
+        ''' See :func:`view.actors.Actor.queueMove`, for CitizenPac. '''
+        flags = self.state.flags
+        if pressed:
+            flags[0] |= direction
+        else:
+            flags[0] &= ~direction
+
+    def setStationary(self):
+        ''' See :func:`controller.GameController.appLostFocus`. '''
+        self.state.flags[0] = constants.STATIONARY
+
+    def setRunning(self, running):
+        ''' Pauses or resumes the game, a finished game cannot be resumed. '''
+        state = self.state
+        self.running = running and state.livesLeft > 0 and not state.gameFinished
+
+    def advance(self):
+        '''
+        Advances the game by one tick, see :func:`model.Scene.advance`.
+        '''
+        state = self.state
+        tick  = state.tick
+        if tick and tick % self.ghostMoveTicks == 0:
+            flags = state.flags
+            for i in range(self.settings.numPlayers, len(flags)):
+                flags[i] = _turn(flags[i], self.random)
+        if not self.__process_collisions():
+            self.__wrap()
+            state.animation.advance()
+            self.__move()
+        state.tick = tick + 1
+
+    def __process_collisions(self):
+        if not (self.running and self.settings.fullGameMode):
+            return False
+        state     = self.state
+        positions = state.positions
+        movers    = [_shift(rect, positions[2 * i], positions[2 * i + 1])
+                     for i, rect in enumerate(self.moverRects)]
+        players   = movers[:self.settings.numPlayers]
+        for citizen in players:
+            for ghost in movers[len(players):]:
+                if _overlap(citizen, ghost):
+                    self.__lost_life()
+                    return True
+
+        eaten = state.foodEatenMask
+        for citizen in players:
+            for index, rect in enumerate(self.foodRects):
+                if not eaten[index] and _overlap(citizen, rect):
+                    if self.sharedFood:
+                        eaten = state.foodEatenMask = bytearray(eaten)
+                        self.sharedFood = False
+                    eaten[index] = 1
+                    state.foodEaten += 1
+                    self.__update_speed()
+
+        if state.foodEaten == len(eaten):
+            # See controller.GameController.gameWon
+            state.gameFinished = True
+            self.running       = False
+        return False
+
+    def __lost_life(self):
+        # See controller.GameController.lostLife and model.Scene.reset
+        state = self.state
+        state.livesLeft -= 1
+        self.running     = False
+        for i, (cx, cy) in enumerate(self.starts):
+            state.positions[2 * i]     = cx
+            state.positions[2 * i + 1] = cy
+            state.flags[i]             = constants.STATIONARY
+        state.foodEaten = 0
+        state.foodEatenMask = bytearray(len(state.foodEatenMask))
+        self.sharedFood     = False
+        state.animation.reset()
+        self.__update_speed()
+
+    def __update_speed(self):
+        # See controller.GameController.foodConsumed
+        settings = self.settings
+        if settings.useSpeedBoost:
+            state = self.state
+            state.gameSpeed = settings.gameSpeedStart + state.speedIncr * state.foodEaten
+
+    def __wrap(self):
+        # See model.Scene.wrapActor
+        positions = self.state.positions
+        width     = self.width
+        height    = self.height
+        for i in range(0, len(positions), 2):
+            x, y = positions[i], positions[i + 1]
+            if x < -0.5 * width:
+                positions[i] = x + width
+            elif x > 0.5 * width:
+                positions[i] = x - width
+            if y < -0.5 * height:
+                positions[i + 1] = y + height
+            elif y > 0.5 * height:
+                positions[i + 1] = y - height
+
+    def __move(self):
+        # See view.actors.Actor.advance
+        state     = self.state
+        positions = state.positions
+        speed     = state.gameSpeed
+        for i, flags in enumerate(state.flags):
+            if flags == constants.STATIONARY:
+                continue
+            dx = dy = 0.0
+            if flags & constants.MOVE_NORTH:
+                dy -= 1.0
+            if flags & constants.MOVE_SOUTH:
+                dy += 1.0
+            if flags & constants.MOVE_EAST:
+                dx += 1.0
+            if flags & constants.MOVE_WEST:
+                dx -= 1.0
+            positions[2 * i]     += speed * dx
+            positions[2 * i + 1] += speed * dy
+
+
+class StateBuffer(object):
+    '''
+    A double buffer of :class:`simulation.Frame` instances: the writer fills the back
+    slot and then flips which slot is the front, the reader always reads the front.
+    Frames are immutable and storing a reference is atomic, so a reader never sees a
+    half written frame and never has to wait.
+
+    :Parameters:
+        ``frame`` (:class:`simulation.Frame`)
+            What to read until the first :func:`simulation.StateBuffer.publish`.
+    '''
+    def __init__(self, frame):
+        self.slots = [frame, frame]
+        self.front = 0
+
+    def publish(self, frame):
+        ''' Makes ``frame`` the latest one, called by the writer only. '''
+        back = 1 - self.front
+        self.slots[back] = frame
+        self.front = back
+
+    def latest(self):
+        ''' :Return: :class:`simulation.Frame` -- the latest frame published. '''
+        return self.slots[self.front]
+
+
+class SimulationThread(QtCore.QThread):
+    '''
+    Advances ``simulation`` every ``simulation.settings.refreshRate`` milliseconds while
+    it is running, and publishes the state to ``self.buffer`` whenever it changed.
+
+    :Parameters:
+        ``simulation`` (:class:`simulation.Simulation`)
+            The simulation to advance.  Only this thread touches it once started.
+
+    :Attributes:
+        ``buffer`` (:class:`simulation.StateBuffer`)
+            The latest state.
+
+        ``input`` (:class:`collections.deque`)
+            The pending ``INPUT_*`` commands, see
+            :func:`simulation.SimulationThread.post`.
+
+        ``posted`` (int), ``handled`` (int)
+            How many commands have been posted (by the GUI thread) and applied (by the
+            worker) so far.
+
+        ``lateTicks`` (int)
+            How many ticks started after their deadline.
+    '''
+    def __init__(self, simulation, parent=None):
+        super(SimulationThread, self).__init__(parent)
+        self.simulation = simulation
+        self.input      = collections.deque()
+        self.stopped    = threading.Event()
+        self.sequence   = 0
+        self.posted     = 0
+        self.handled    = 0
+        self.lateTicks  = 0
+        self.buffer     = StateBuffer(self.__frame())
+
+    def post(self, *command):
+        ''' Queues an ``INPUT_*`` command for the next tick, called by the GUI thread. '''
+        self.posted += 1
+        self.input.append(command)
+
+    def stop(self):
+        ''' Stops the thread and waits for it to finish. '''
+        self.stopped.set()
+        self.wait()
+
+    def __frame(self):
+        simulation = self.simulation
+        return Frame(self.sequence, self.handled, simulation.running,
+                     snapshot.encode(simulation.state))
+
+    def __drain(self):
+        simulation = self.simulation
+        pending    = self.input
+        changed    = False
+        while pending:
+            command = pending.popleft()
+            if command[0] == INPUT_MOVE:
+                simulation.move(command[1], command[2])
+            elif command[0] == INPUT_STATIONARY:
+                simulation.setStationary()
+            elif command[0] == INPUT_RUNNING:
+                simulation.setRunning(command[1])
+            self.handled += 1
+            changed = True
+        return changed
+
+    def run(self):
+        simulation = self.simulation
+        period     = simulation.settings.refreshRate / 1000.0
+        maxLag     = constants.SIMULATION_MAX_LAG * period
+        deadline   = default_timer()
+        while not self.stopped.is_set():
+            changed = self.__drain()
+            if simulation.running:
+                simulation.advance()
+                changed = True
+            if changed:
+                self.sequence += 1
+                self.buffer.publish(self.__frame())
+
+            deadline += period
+            now       = default_timer()
+            if now > deadline:
+                self.lateTicks += 1
+                if now - deadline > maxLag:
+                    # Too far behind to catch up, drop the backlog
+                    deadline = now
+            else:
+                self.stopped.wait(deadline - now)
+
+
+class SimulationDriver(SceneObserver):
+    '''
+    Moves the ticks of ``game`` to a :class:`simulation.SimulationThread`, and shows its
+    latest state in the window every time the game timer fires.  Rewinding is disabled
+    and the Ghosts' timers are stopped, the worker steers them.
+
+    Nothing that observes the ticks of the scene sees anything while the driver runs,
+    only keyboard input is observed (and forwarded to the worker).
+
+    :Parameters:
+        ``game`` (:class:`controller.CitizenPac`)
+            The game to run.  It keeps a reference in ``game.simulation`` so that it can
+            forward pausing, resuming and losing focus.
+    '''
+    def __init__(self, game):
+        self.game     = game
+        self.sequence = 0
+        game.setRewindEnabled(False)
+        game.scene.setGhostMoveTicks(0)
+
+        self.thread = SimulationThread(Simulation(game))
+        game.simulation = self
+        game.setTickCallback(self.sync)
+        game.scene.addObserver(self)
+        self.thread.start()
+
+    def keyEvent(self, scene, key, pressed):
+        # The scene moves its own CitizenPac as well, until the next sync overwrites it
+        direction = {
+            QtCore.Qt.Key_W: constants.MOVE_NORTH, QtCore.Qt.Key_S: constants.MOVE_SOUTH,
+            QtCore.Qt.Key_D: constants.MOVE_EAST,  QtCore.Qt.Key_A: constants.MOVE_WEST
+        }.get(key)
+        if direction is not None:
+            self.thread.post(INPUT_MOVE, direction, pressed)
+
+    def setRunning(self, running):
+        ''' Forwards :func:`controller.GameController.gameRunningSwitched`. '''
+        self.thread.post(INPUT_RUNNING, running)
+
+    def setStationary(self):
+        ''' Forwards :func:`controller.GameController.appLostFocus`. '''
+        self.thread.post(INPUT_STATIONARY)
+
+    def sync(self):
+        '''
+        Restores the latest state published by the worker into the scene, and updates
+        the displays that changed.  Called by the game timer, i.e. on the GUI thread.
+        '''
+        frame = self.thread.buffer.latest()
+        if frame.sequence == self.sequence:
+            return
+        self.sequence = frame.sequence
+
+        game    = self.game
+        scene   = game.scene
+        lives   = game.livesLeft
+        eaten   = scene.foodEaten
+        running = game.gameRunning
+        # A frame from before the latest pause or resume says nothing about running
+        current = frame.inputs >= self.thread.posted
+        if current:
+            running = frame.running
+        snapshot.restore(game, frame.data)
+        game.gameRunning = running
+        scene.setRunning(running)
+
+        if game.livesLeft != lives:
+            game.displayLives(game.livesLeft)
+        if scene.foodEaten != eaten:
+            game.displayScore(scene.foodEaten * game.settings.foodValue)
+            if game.settings.useSpeedBoost:
+                game.displaySpeedBoost(game.speedBoost())
+        if not running:
+            # The worker paused itself: a life was lost, or the game was won
+            game.displayRunning(False)
+
+    def close(self):
+        ''' Stops the worker thread. '''
+        self.game.scene.removeObserver(self)
+        self.thread.stop()
+        self.game.simulation = None
@@ -0,0 +1,159 @@
+'''
+The ``slowframes`` module catches intermittent stutters in the act.  A
+:class:`slowframes.FrameWatchdog` runs a background thread that notices when the main
+thread has been inside a tick (:func:`model.Scene.advance`) or a paint for longer than
+:data:`constants.WATCHDOG_THRESHOLD` times the game's ``settings.refreshRate``.  It then
+samples the main thread's stack every :data:`constants.WATCHDOG_SAMPLE_INTERVAL`
+milliseconds until that frame is over, and logs the samples as collapsed stacks (one
+``outer;...;inner count`` line per distinct stack, the input format of ``flamegraph.pl``
+and speedscope) to a rotating log file.
+
+In a normal frame the main thread only stores a tuple when the frame starts and
+``None`` when it ends; the watchdog thread wakes up a few times per threshold to look at
+it, and only does real work once a frame is already late.
+'''
+
+import logging
+import logging.handlers
+import os
+import sys
+import threading
+from timeit import default_timer
+
+import constants
+from model import SceneObserver
+
+try:
+    from threading import get_ident
+except ImportError:
+    # Python 2
+    from thread import get_ident
+
+__all__ = ["FrameWatchdog"]
+
+MAX_BYTES    = 1024 * 1024
+''' The size at which the log file is rotated. '''
+
+BACKUP_COUNT = 3
+''' How many rotated log files are kept. '''
+
+
+class FrameWatchdog(SceneObserver):
+    '''
+    Watches the ticks of ``scene`` (and the paints reported to it, see
+    :class:`tracing.PaintTracer`), and logs a profile of every frame that overruns the
+    threshold to ``path``.  Must be created on the main thread.
+
+    :Parameters:
+        ``scene`` (:class:`model.Scene`)
+            The scene to watch.  The watchdog registers itself.
+
+        ``path`` (str)
+            The log file, rotated at :data:`slowframes.MAX_BYTES`.
+
+        ``threshold`` (float)
+            How many times ``scene.settings.refreshRate`` a frame may take before it is
+            sampled.
+
+    :Attributes:
+        ``slowFrames`` (int)
+            How many slow frames have been logged.
+    '''
+    def __init__(self, scene, path, threshold=None):
+        if threshold is None:
+            threshold = constants.WATCHDOG_THRESHOLD
+        self.scene      = scene
+        self.limit      = threshold * scene.settings.refreshRate / 1000.0
+        self.interval   = constants.WATCHDOG_SAMPLE_INTERVAL / 1000.0
+        self.mainThread = get_ident()
+        self.current    = None
+        self.slowFrames = 0
+        self.names      = {}
+
+        self.log = logging.getLogger("citizenpac.watchdog")
+        self.log.propagate = False
+        self.log.setLevel(logging.INFO)
+        self.handler = logging.handlers.RotatingFileHandler(
+            path, maxBytes=MAX_BYTES, backupCount=BACKUP_COUNT
+        )
+        self.log.addHandler(self.handler)
+
+        self.stopped = threading.Event()
+        self.thread  = threading.Thread(target=self.__watch, name="FrameWatchdog")
+        self.thread.daemon = True
+        self.thread.start()
+        scene.addObserver(self)
+
+    ####################################################################################
+    # Main thread: mark where frames start and end.                                    #
+    ####################################################################################
+    def tickStarted(self, scene):
+        self.current = ("tick {}".format(scene.tick), default_timer())
+
+    def tickFinished(self, scene):
+        self.current = None
+
+    def paintStarted(self):
+        ''' To be called right before the view paints. '''
+        self.current = ("paint", default_timer())
+
+    def paintFinished(self, start, end):
+        ''' To be called right after the view painted. '''
+        self.current = None
+
+    ####################################################################################
+    # Watchdog thread.                                                                 #
+    ####################################################################################
+    def __watch(self):
+        poll = self.limit / 4.0
+        while not self.stopped.wait(poll):
+            frame = self.current
+            if frame is not None and default_timer() - frame[1] > self.limit:
+                self.__sample(frame)
+
+    def __sample(self, frame):
+        stacks  = {}
+        samples = 0
+        wait    = self.stopped.wait
+        # The main thread replaces self.current when the frame ends
+        while not wait(self.interval) and self.current is frame:
+            top = sys._current_frames().get(self.mainThread)
+            if top is None:
+                break
+            stack = self.__collapse(top)
+            stacks[stack] = stacks.get(stack, 0) + 1
+            samples += 1
+        if not samples:
+            return
+
+        self.slowFrames += 1
+        lines = ["# slow {}: {:.1f} ms, {} samples".format(
+            frame[0], (default_timer() - frame[1]) * 1000.0, samples
+        )]
+        for stack, count in sorted(stacks.items(), key=lambda item: -item[1]):
+            lines.append("{} {}".format(stack, count))
+        self.log.info("\n".join(lines))
+
+    def __collapse(self, top):
+        names = self.names
+        parts = []
+        while top is not None:
+            code = top.f_code
+            name = names.get(code)
+            if name is None:
+                module = os.path.splitext(os.path.basename(code.co_filename))[0]
+                name   = names[code] = "{}:{}".format(module, code.co_name)
+            parts.append(name)
+            top = top.f_back
+        parts.reverse()
+        return ";".join(parts)
+
+    def close(self):
+        '''
+        Stops the watchdog thread and closes the log file.
+        '''
+        self.scene.removeObserver(self)
+        self.stopped.set()
+        self.thread.join()
+        self.log.removeHandler(self.handler)
+        self.handler.close()
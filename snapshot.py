@@ -0,0 +1,501 @@
+'''
+The ``snapshot`` module saves and restores the complete state of a game in a compact,
+versioned binary format.  A snapshot is written with one bulk write and read back with
+one bulk read, and restoring one only updates the actors that already exist in the
+scene -- nothing is rebuilt.  The food state is a single block of bytes that is copied
+straight into :attr:`model.Scene.foodEatenMask`, so restoring does not get any slower as
+the amount of Food grows.
+
+A snapshot only makes sense for a scene with the same number of actors as the one it
+was taken from, i.e. the same window size and the same :class:`model.Settings`.  The
+layout of version ``2`` (all values little endian) is:
+
++--------------+----------------------------------------------------------------------+
+| Block        | Contents                                                             |
++==============+======================================================================+
+| ``HEADER``   | magic ``b"CPSN"``, version, number of movers, number of Food.        |
++--------------+----------------------------------------------------------------------+
+| ``SCALARS``  | lives left, game finished, Food animation decreasing, speed          |
+|              | increment, game speed, Food animation outer / inner sweep, number of |
+|              | Food eaten, :attr:`model.Scene.tick`.                                |
++--------------+----------------------------------------------------------------------+
+| positions    | ``2 * numMovers`` doubles, :math:`(x, y)` of CitizenPac then Ghosts. |
++--------------+----------------------------------------------------------------------+
+| move flags   | ``numMovers`` bytes, the ``moveFlags`` in the same order.            |
++--------------+----------------------------------------------------------------------+
+| food         | ``numFood`` bytes, a copy of :attr:`model.Scene.foodEatenMask`.      |
++--------------+----------------------------------------------------------------------+
+
+Version ``1`` is identical except that it does not store the tick, it can still be
+restored (the tick is then left as is).
+
+Consecutive states of a running game differ very little, so there is also a *delta*
+encoding of what changed during a single tick (see :class:`snapshot.DeltaEncoder`):
+
++-----------------+-------------------------------------------------------------------+
+| Block           | Contents                                                          |
++=================+===================================================================+
+| ``DELTA``       | tick, ``DELTA_*`` flags, number of movers, number of Food.        |
++-----------------+-------------------------------------------------------------------+
+| ``DELTA_MOVER`` | One per mover that moved or turned: index, :math:`x`, :math:`y`, |
+|                 | ``moveFlags``.                                                    |
++-----------------+-------------------------------------------------------------------+
+| ``DELTA_FOOD``  | One per Food eaten during the tick: its index.                    |
++-----------------+-------------------------------------------------------------------+
+| ``DELTA_SPEED`` | Only with :data:`snapshot.DELTA_SPEED_CHANGED`: the game speed.   |
++-----------------+-------------------------------------------------------------------+
+
+The Food animation is not stored at all, :data:`snapshot.DELTA_ANIMATED` says whether it
+advanced and :func:`snapshot.applyDelta` advances it again.
+
+The functions in this module operate on a *game*, which is any object with the ``scene``,
+``livesLeft``, ``speedIncr`` and ``gameFinished`` attributes of
+:class:`controller.CitizenPac`.  They do not touch the display; refreshing the score
+board etc. is up to the caller (see :func:`controller.GameController.restoreSnapshot`).
+'''
+
+import array
+import os
+import struct
+import sys
+import tempfile
+
+from model import Settings
+from view.actors import FoodAnimation
+
+__all__ = [
+    "MAGIC", "VERSION", "State", "capture", "decode", "encode", "restore", "save", "load",
+    "DeltaEncoder", "applyDelta"
+]
+
+MAGIC   = b"CPSN"
+''' The first four bytes of every snapshot. '''
+
+VERSION = 2
+''' The version of the snapshot layout written by :func:`snapshot.capture`. '''
+
+HEADER  = struct.Struct("<4sHHI")
+SCALARS = {
+    1: struct.Struct("<iBBddddI"),
+    2: struct.Struct("<iBBddddIQ")
+}
+
+DELTA       = struct.Struct("<IBBH")
+DELTA_MOVER = struct.Struct("<BddB")
+DELTA_FOOD  = struct.Struct("<I")
+DELTA_SPEED = struct.Struct("<d")
+
+DELTA_ANIMATED      = 0x01
+''' The Food animation advanced by one step during the tick. '''
+
+DELTA_SPEED_CHANGED = 0x02
+''' The game speed changed during the tick, a ``DELTA_SPEED`` record is included. '''
+
+
+def _arrayToBytes(arr):
+    # Snapshots are little endian no matter where they were written
+    if sys.byteorder != "little":
+        arr = array.array(arr.typecode, arr)
+        arr.byteswap()
+    # Python 3 renamed tostring / fromstring
+    if hasattr(arr, "tobytes"):
+        return arr.tobytes()
+    return arr.tostring()
+
+
+def _arrayFromBytes(typecode, data):
+    arr = array.array(typecode)
+    if hasattr(arr, "frombytes"):
+        arr.frombytes(data)
+    else:
+        arr.fromstring(data)
+    if sys.byteorder != "little":
+        arr.byteswap()
+    return arr
+
+
+class State(object):
+    '''
+    A decoded snapshot, see :func:`snapshot.decode`.  Unlike the encoded form it can be
+    modified in place, e.g. by :func:`snapshot.applyDelta`, and encoded again with
+    :func:`snapshot.encode`.
+
+    :Parameters:
+        ``settings`` (:class:`model.Settings`)
+            The settings whose ``gameSpeedStart`` the game speed starts at, the defaults
+            if ``None``.
+
+    :Attributes:
+        ``livesLeft`` (int), ``gameFinished`` (bool), ``speedIncr`` (float)
+            The state of the game.
+
+        ``gameSpeed`` (float)
+            The current game speed, see :class:`model.Settings`.
+
+        ``animation`` (:class:`view.actors.FoodAnimation`)
+            The state of the Food animation.
+
+        ``foodEaten`` (int)
+            The number of Food eaten.
+
+        ``tick`` (int)
+            The value of :attr:`model.Scene.tick`, ``None`` for a version ``1`` snapshot.
+
+        ``positions`` (:class:`array.array`)
+            :math:`(x, y)` of every mover, flattened.
+
+        ``flags`` (:class:`array.array`)
+            The ``moveFlags`` of every mover.
+
+        ``foodEatenMask`` (bytearray)
+            A copy of :attr:`model.Scene.foodEatenMask`.
+    '''
+    def __init__(self, settings=None):
+        if settings is None:
+            settings = Settings()
+        self.livesLeft     = 0
+        self.gameFinished  = False
+        self.speedIncr     = 0.0
+        self.gameSpeed     = settings.gameSpeedStart
+        self.animation     = FoodAnimation()
+        self.foodEaten     = 0
+        self.tick          = None
+        self.positions     = array.array("d")
+        self.flags         = array.array("B")
+        self.foodEatenMask = bytearray()
+
+
+def capture(game):
+    '''
+    Captures the current state of ``game``.
+
+    :Parameters:
+        ``game`` (:class:`controller.CitizenPac`)
+            The game to capture.
+
+    :Return:
+        ``bytes``
+            The encoded snapshot, see the module documentation for the layout.
+    '''
+    scene     = game.scene
+    movers    = scene.movers
+    animation = scene.foodAnimation
+
+    positions = array.array("d")
+    flags     = array.array("B")
+    for actor in movers:
+        positions.append(actor.x())
+        positions.append(actor.y())
+        flags.append(actor.moveFlags)
+
+    return b"".join([
+        HEADER.pack(MAGIC, VERSION, len(movers), len(scene.food)),
+        SCALARS[VERSION].pack(int(game.livesLeft), bool(game.gameFinished),
+                              animation.decreasing, game.speedIncr,
+                              game.settings.gameSpeed, animation.outerSweep,
+                              animation.innerSweep, scene.foodEaten, scene.tick),
+        _arrayToBytes(positions),
+        _arrayToBytes(flags),
+        bytes(scene.foodEatenMask)
+    ])
+
+
+def decode(data):
+    '''
+    Decodes a snapshot without restoring it anywhere.
+
+    :Parameters:
+        ``data`` (bytes)
+            The encoded snapshot.
+
+    :Return:
+        :class:`snapshot.State`
+            The decoded state.  A ``RuntimeError`` is raised if ``data`` is not a valid
+            snapshot.
+    '''
+    if len(data) < HEADER.size:
+        raise RuntimeError("Snapshot is truncated ({} bytes).".format(len(data)))
+    magic, version, numMovers, numFood = HEADER.unpack_from(data, 0)
+    if magic != MAGIC:
+        raise RuntimeError("Not a CitizenPac snapshot (magic was {!r}).".format(magic))
+    if version not in SCALARS:
+        raise RuntimeError("Unsupported snapshot version [{}].".format(version))
+    scalars  = SCALARS[version]
+    offset   = HEADER.size + scalars.size
+    posEnd   = offset + 16 * numMovers
+    flagsEnd = posEnd + numMovers
+    if len(data) != flagsEnd + numFood:
+        raise RuntimeError("Snapshot size does not match its header.")
+
+    values = scalars.unpack_from(data, HEADER.size)
+    state  = State()
+    (state.livesLeft, gameFinished, decreasing, state.speedIncr, state.gameSpeed,
+     state.animation.outerSweep, state.animation.innerSweep, state.foodEaten) = values[:8]
+    state.gameFinished         = bool(gameFinished)
+    state.animation.decreasing = bool(decreasing)
+    if version >= 2:
+        state.tick = values[8]
+    state.positions     = _arrayFromBytes("d", data[offset:posEnd])
+    state.flags         = _arrayFromBytes("B", data[posEnd:flagsEnd])
+    state.foodEatenMask = bytearray(data[flagsEnd:])
+    return state
+
+
+def encode(state):
+    '''
+    Encodes a :class:`snapshot.State` in the layout written by :func:`snapshot.capture`.
+
+    :Parameters:
+        ``state`` (:class:`snapshot.State`)
+            The state to encode.  Its ``tick`` must not be ``None``.
+
+    :Return:
+        ``bytes``
+            The encoded snapshot.
+    '''
+    animation = state.animation
+    return b"".join([
+        HEADER.pack(MAGIC, VERSION, len(state.flags), len(state.foodEatenMask)),
+        SCALARS[VERSION].pack(int(state.livesLeft), bool(state.gameFinished),
+                              animation.decreasing, state.speedIncr, state.gameSpeed,
+                              animation.outerSweep, animation.innerSweep, state.foodEaten,
+                              state.tick),
+        _arrayToBytes(state.positions),
+        _arrayToBytes(state.flags),
+        bytes(state.foodEatenMask)
+    ])
+
+
+def restore(game, data):
+    '''
+    Restores a state previously produced by :func:`snapshot.capture` into ``game``.  The
+    game is always left paused.
+
+    :Parameters:
+        ``game`` (:class:`controller.CitizenPac`)
+            The game to restore into.  Its scene must already have been generated.
+
+        ``data`` (bytes)
+            The encoded snapshot.
+
+    :Preconditions:
+        *Matching Scene*
+            The snapshot must have been captured from a scene with the same number of
+            movers and Food as ``game.scene``, otherwise a ``RuntimeError`` is raised
+            and ``game`` is left untouched.
+    '''
+    scene  = game.scene
+    movers = scene.movers
+
+    # Validate everything before modifying anything
+    state = decode(data)
+    if len(state.flags) != len(movers) or len(state.foodEatenMask) != len(scene.food):
+        raise RuntimeError(
+            "Snapshot has {} movers and {} Food, but the scene has {} and {}.".format(
+                len(state.flags), len(state.foodEatenMask), len(movers), len(scene.food)
+            )
+        )
+
+    # The game is paused while it is being restored
+    game.gameRunning  = False
+    scene.setRunning(False)
+    game.livesLeft    = state.livesLeft
+    game.gameFinished = state.gameFinished
+    game.speedIncr    = state.speedIncr
+    game.settings.gameSpeed = state.gameSpeed
+
+    positions = state.positions
+    for i, actor in enumerate(movers):
+        actor.setPos(positions[2 * i], positions[2 * i + 1])
+        actor.moveFlags = state.flags[i]
+
+    animation            = scene.foodAnimation
+    animation.outerSweep = state.animation.outerSweep
+    animation.innerSweep = state.animation.innerSweep
+    animation.decreasing = state.animation.decreasing
+    scene.foodEaten      = state.foodEaten
+    scene.foodEatenMask[:] = state.foodEatenMask
+    if state.tick is not None:
+        scene.tick = state.tick
+    scene.update()
+
+
+def save(game, path):
+    '''
+    Captures ``game`` and writes the snapshot to ``path`` in a single write.  The
+    snapshot is written to a temporary file next to ``path`` first, which then replaces
+    ``path``: a crash while saving leaves the previous file intact, never a truncated
+    one.
+
+    :Parameters:
+        ``game`` (:class:`controller.CitizenPac`)
+            The game to save.
+
+        ``path`` (str)
+            The file to (over)write.
+    '''
+    data = capture(game)
+    directory, name = os.path.split(os.path.abspath(path))
+    fd, temporary   = tempfile.mkstemp(prefix=name + ".", suffix=".tmp", dir=directory)
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(data)
+            f.flush()
+            os.fsync(f.fileno())
+        # os.rename only replaces an existing file atomically on POSIX
+        getattr(os, "replace", os.rename)(temporary, path)
+    except:
+        os.remove(temporary)
+        raise
+
+
+def load(game, path):
+    '''
+    Reads the snapshot stored in ``path`` in a single read and restores it into ``game``
+    with :func:`snapshot.restore`.
+
+    :Parameters:
+        ``game`` (:class:`controller.CitizenPac`)
+            The game to restore into.
+
+        ``path`` (str)
+            The file to read.
+    '''
+    with open(path, "rb") as f:
+        data = f.read()
+    restore(game, data)
+
+
+class DeltaEncoder(object):
+    '''
+    Encodes what changed in ``game`` since the previous call, one tick at a time.  Call
+    :func:`snapshot.DeltaEncoder.sync` whenever a full snapshot of the game is taken, and
+    :func:`snapshot.DeltaEncoder.encode` after every following tick.
+
+    Only what normally happens during a tick can be expressed as a delta: actors moving,
+    Food being eaten, the game speed changing and the Food animation advancing.  Anything
+    else (a life lost, the game won, a restored snapshot) requires a new full snapshot.
+
+    :Parameters:
+        ``game`` (:class:`controller.GameController`)
+            The game to encode.  Its scene must already have been generated.
+    '''
+    def __init__(self, game):
+        self.game = game
+        self.sync()
+
+    def sync(self):
+        '''
+        Makes the current state of the game the one the next delta is relative to.
+        '''
+        game      = self.game
+        scene     = game.scene
+        animation = scene.foodAnimation
+        self.movers       = [(a.x(), a.y(), a.moveFlags) for a in scene.movers]
+        self.tick         = scene.tick
+        self.livesLeft    = game.livesLeft
+        self.gameFinished = game.gameFinished
+        self.foodEaten    = scene.foodEaten
+        self.gameSpeed    = game.settings.gameSpeed
+        self.animation    = (animation.outerSweep, animation.innerSweep,
+                             animation.decreasing)
+
+    def encode(self):
+        '''
+        Encodes the changes since the last call (or :func:`snapshot.DeltaEncoder.sync`),
+        and makes the current state the new reference.  The Food eaten is read from
+        :attr:`model.Scene.foodEatenThisTick`, so this must be called once per tick,
+        after it.
+
+        :Return:
+            ``bytes``
+                The encoded delta, or ``None`` if the changes cannot be expressed as
+                one.  The reference is not updated in that case; take a full snapshot
+                and call :func:`snapshot.DeltaEncoder.sync`.
+        '''
+        game  = self.game
+        scene = game.scene
+        eaten = scene.foodEatenThisTick
+        if (scene.tick != self.tick + 1 or game.livesLeft != self.livesLeft or
+                game.gameFinished != self.gameFinished or
+                scene.foodEaten != self.foodEaten + len(eaten)):
+            return None
+
+        changed   = 0
+        animation = scene.foodAnimation
+        current   = (animation.outerSweep, animation.innerSweep, animation.decreasing)
+        if current != self.animation:
+            # The only change a delta can express is a single step
+            expected            = FoodAnimation()
+            expected.outerSweep, expected.innerSweep, expected.decreasing = self.animation
+            expected.advance()
+            if current != (expected.outerSweep, expected.innerSweep, expected.decreasing):
+                return None
+            changed |= DELTA_ANIMATED
+
+        parts  = [None]
+        last   = self.movers
+        moved  = 0
+        for i, actor in enumerate(scene.movers):
+            mover = (actor.x(), actor.y(), actor.moveFlags)
+            if mover != last[i]:
+                last[i] = mover
+                parts.append(DELTA_MOVER.pack(i, mover[0], mover[1], mover[2]))
+                moved += 1
+        for index in eaten:
+            parts.append(DELTA_FOOD.pack(index))
+        speed  = game.settings.gameSpeed
+        if speed != self.gameSpeed:
+            changed |= DELTA_SPEED_CHANGED
+            parts.append(DELTA_SPEED.pack(speed))
+        parts[0] = DELTA.pack(scene.tick, changed, moved, len(eaten))
+
+        self.tick      = scene.tick
+        self.foodEaten = scene.foodEaten
+        self.gameSpeed = speed
+        self.animation = current
+        return b"".join(parts)
+
+
+def applyDelta(state, data, offset=0):
+    '''
+    Applies one delta produced by :func:`snapshot.DeltaEncoder.encode` to ``state``.
+
+    :Parameters:
+        ``state`` (:class:`snapshot.State`)
+            The state to modify, it must be the one the delta was encoded against.
+
+        ``data`` (bytes)
+            A buffer containing the delta.
+
+        ``offset`` (int)
+            Where in ``data`` the delta starts.
+
+    :Return:
+        ``int``
+            The offset just past the delta, i.e. of the next one in ``data``.
+    '''
+    tick, changed, moved, eaten = DELTA.unpack_from(data, offset)
+    offset += DELTA.size
+
+    positions = state.positions
+    for _ in range(moved):
+        i, x, y, flags = DELTA_MOVER.unpack_from(data, offset)
+        offset += DELTA_MOVER.size
+        positions[2 * i]     = x
+        positions[2 * i + 1] = y
+        state.flags[i]       = flags
+
+    mask = state.foodEatenMask
+    for _ in range(eaten):
+        mask[DELTA_FOOD.unpack_from(data, offset)[0]] = 1
+        offset += DELTA_FOOD.size
+    state.foodEaten += eaten
+
+    if changed & DELTA_SPEED_CHANGED:
+        state.gameSpeed = DELTA_SPEED.unpack_from(data, offset)[0]
+        offset += DELTA_SPEED.size
+    if changed & DELTA_ANIMATED:
+        state.animation.advance()
+    state.tick = tick
+    return offset
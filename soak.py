@@ -0,0 +1,319 @@
+'''
+The ``soak`` module plays the game for as long as it is left alone (``--soak``), the way
+a kiosk runs for days, and watches for anything that drifts.
+
+A :class:`soak.SoakRunner` lets an :class:`autopilot.Autopilot` play through
+:func:`view.actors.Actor.queueMove`, i.e. the same calls the keyboard makes.  Whenever the
+game pauses itself it is resumed: after a lost life (the scene was reset) the same game
+continues, after a win or the last life a new game starts from the state captured when
+the runner was created.  In the window the pause screen shows for about a second in
+between; without a window (``--headless``) the game runs as fast as possible, and every
+tick is rendered into an offscreen image so that painting is exercised too.
+
+Every ``interval`` seconds one CSV row (see ``COLUMNS``) is appended to the log:
+
+- the games, wins, losses and lives lost so far,
+- the 50th, 95th and 99th percentile tick and the 95th percentile paint since the
+  previous row, in milliseconds,
+- the resident memory of the process (``None`` where it cannot be read),
+- the number of live Qt objects (the ``sip`` wrappers the garbage collector tracks) and
+  of all objects the garbage collector tracks.
+
+The first row is the baseline.  A later row that crossed one of the thresholds (growth
+of the resident memory or of the Qt objects, slowdown of the 95th percentile tick)
+names it in its ``drift`` column, and the first crossing of each is reported on
+``stderr``.  An automated run calls :func:`soak.SoakRunner.check` at the end.
+'''
+
+import csv
+import gc
+import os
+import sys
+from timeit import default_timer
+
+from PyQt4 import QtCore, QtGui
+
+import constants
+import snapshot
+from autopilot import Autopilot
+from model import SceneObserver
+from perfstats import RollingSamples
+
+try:
+    import sip
+except ImportError:
+    from PyQt4 import sip
+
+try:
+    import resource
+except ImportError:
+    # Windows
+    resource = None
+
+__all__ = ["SoakRunner", "residentMemory"]
+
+COLUMNS = [
+    "elapsed_seconds", "ticks", "games", "wins", "losses", "lives_lost", "tick_p50_ms",
+    "tick_p95_ms", "tick_p99_ms", "paint_p95_ms", "rss_bytes", "qt_objects",
+    "gc_objects", "drift"
+]
+
+WINDOW = 10000
+''' How many of the most recent ticks and paints of an interval the percentiles cover. '''
+
+RESUME_DELAY = 1000
+''' How long (in milliseconds) the window shows the pause screen before resuming. '''
+
+CHUNK_TICKS = 100
+''' How many ticks a headless run plays between looking at the clock. '''
+
+
+def residentMemory():
+    '''
+    :Return:
+        ``int``
+            The resident memory of this process in bytes, ``None`` if it cannot be
+            read.  Outside of Linux this is the peak rather than the current value.
+    '''
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (IOError, OSError, ValueError, AttributeError):
+        pass
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Kilobytes on Linux, bytes on macOS
+    return peak if sys.platform == "darwin" else peak * 1024
+
+
+class SoakRunner(SceneObserver):
+    '''
+    Plays ``game`` game after game and logs samples to ``path``, see the module
+    documentation.  Call :func:`soak.SoakRunner.start` in the window, or
+    :func:`soak.SoakRunner.run` without one.
+
+    :Parameters:
+        ``game`` (:class:`controller.GameController`)
+            The game to play.  Its scene must already have been generated.
+
+        ``path`` (str)
+            The CSV log file.
+
+        ``interval`` (float)
+            The seconds between two samples.
+
+        ``maxRssGrowth`` (int), ``maxQtGrowth`` (int), ``maxSlowdown`` (float)
+            The thresholds, see :data:`constants.SOAK_MAX_RSS_GROWTH`,
+            :data:`constants.SOAK_MAX_QT_GROWTH` and
+            :data:`constants.SOAK_MAX_TICK_SLOWDOWN`.
+
+        ``offscreen`` (bool)
+            Render every tick into an offscreen image, for games without a window.
+
+    :Attributes:
+        ``baseline`` (dict)
+            The first row, ``None`` until it has been taken.
+
+        ``drift`` (dict)
+            The thresholds that have been crossed (``"rss"``, ``"qt_objects"``,
+            ``"tick_p95"``), mapped to the first value that crossed them.
+    '''
+    def __init__(self, game, path, interval=constants.SOAK_INTERVAL,
+                 maxRssGrowth=constants.SOAK_MAX_RSS_GROWTH,
+                 maxQtGrowth=constants.SOAK_MAX_QT_GROWTH,
+                 maxSlowdown=constants.SOAK_MAX_TICK_SLOWDOWN, offscreen=False):
+        self.game         = game
+        self.interval     = interval
+        self.maxRssGrowth = maxRssGrowth
+        self.maxQtGrowth  = maxQtGrowth
+        self.maxSlowdown  = maxSlowdown
+        self.pilot        = Autopilot(game, keys=True)
+        self.initial      = snapshot.capture(game)
+        self.tickTimes    = RollingSamples(WINDOW)
+        self.paintTimes   = RollingSamples(WINDOW)
+        self.tickStart    = 0.0
+        self.ticks        = 0
+        self.games        = 1
+        self.wins         = 0
+        self.losses       = 0
+        self.livesLost    = 0
+        self.baseline     = None
+        self.drift        = {}
+        self.timer        = None
+
+        self.image = None
+        if offscreen:
+            rect        = game.scene.sceneRect()
+            self.image  = QtGui.QImage(int(rect.width()), int(rect.height()),
+                                       QtGui.QImage.Format_RGB32)
+            self.target = QtCore.QRectF(0.0, 0.0, rect.width(), rect.height())
+            self.source = QtCore.QRectF(rect)
+
+        self.stream = open(path, "w")
+        self.writer = csv.DictWriter(self.stream, COLUMNS, lineterminator="\n")
+        self.writer.writeheader()
+        self.stream.flush()
+        self.started    = default_timer()
+        self.lastSample = self.started
+        game.scene.addObserver(self)
+        game.watchFrames(self)
+
+    def tickStarted(self, scene):
+        self.tickStart = default_timer()
+
+    def tickFinished(self, scene):
+        now = default_timer()
+        self.tickTimes.add(now - self.tickStart)
+        self.ticks += 1
+        if self.image is not None:
+            self.__render()
+        if now - self.lastSample >= self.interval:
+            self.sample()
+
+    def sceneReset(self, scene):
+        self.livesLost += 1
+
+    def paintStarted(self):
+        ''' See :class:`tracing.PaintTracer`, nothing to do. '''
+        pass
+
+    def paintFinished(self, start, end):
+        ''' Records a paint of the view, see :class:`tracing.PaintTracer`. '''
+        self.paintTimes.add(end - start)
+
+    def __render(self):
+        start = default_timer()
+        self.image.fill(0)
+        painter = QtGui.QPainter(self.image)
+        painter.setRenderHint(QtGui.QPainter.Antialiasing)
+        self.game.scene.render(painter, self.target, self.source)
+        painter.end()
+        self.paintFinished(start, default_timer())
+
+    def resume(self):
+        '''
+        Resumes the game if it paused itself, starting a new game first if it is over.
+        '''
+        game = self.game
+        if game.gameRunning:
+            return
+        if game.gameFinished or game.livesLeft <= 0:
+            if game.gameFinished:
+                self.wins += 1
+            else:
+                self.losses += 1
+            game.restoreSnapshot(self.initial)
+            self.games += 1
+        game.gameRunningSwitched()
+
+    def start(self):
+        '''
+        Starts playing in the window: a timer resumes the game whenever it paused, and
+        keeps sampling while it is paused.
+        '''
+        self.timer = QtCore.QTimer()
+        self.timer.timeout.connect(self.__poll)
+        self.timer.start(RESUME_DELAY)
+        self.resume()
+
+    def __poll(self):
+        self.resume()
+        if default_timer() - self.lastSample >= self.interval:
+            self.sample()
+
+    def run(self, seconds=None):
+        '''
+        Plays as fast as possible, without a window.
+
+        :Parameters:
+            ``seconds`` (float)
+                How long to play, ``None`` until interrupted (``Ctrl+C``).
+
+        :Return:
+            ``int``
+                The number of ticks played.
+        '''
+        ticks = self.ticks
+        try:
+            while seconds is None or default_timer() - self.started < seconds:
+                self.resume()
+                self.game.run(CHUNK_TICKS)
+        except KeyboardInterrupt:
+            pass
+        return self.ticks - ticks
+
+    def sample(self):
+        '''
+        Logs one row now, and checks it against the baseline.
+
+        :Return:
+            ``dict``
+                The row, see ``COLUMNS``.
+        '''
+        now     = default_timer()
+        objects = gc.get_objects()
+        wrapper = sip.simplewrapper
+        qt      = sum(1 for obj in objects if isinstance(obj, wrapper))
+        ticks   = self.tickTimes.percentiles(50, 95, 99)
+        row     = {
+            "elapsed_seconds": round(now - self.started, 3), "ticks": self.ticks,
+            "games": self.games, "wins": self.wins, "losses": self.losses,
+            "lives_lost": self.livesLost, "tick_p50_ms": ticks[0] * 1000.0,
+            "tick_p95_ms": ticks[1] * 1000.0, "tick_p99_ms": ticks[2] * 1000.0,
+            "paint_p95_ms": self.paintTimes.percentiles(95)[0] * 1000.0,
+            "rss_bytes": residentMemory(), "qt_objects": qt,
+            "gc_objects": len(objects)
+        }
+        del objects
+
+        if self.baseline is None:
+            self.baseline = row
+        row["drift"] = ";".join(self.__drift(row))
+        self.writer.writerow(row)
+        self.stream.flush()
+
+        # Percentiles per interval
+        self.tickTimes  = RollingSamples(WINDOW)
+        self.paintTimes = RollingSamples(WINDOW)
+        self.lastSample = default_timer()
+        return row
+
+    def __drift(self, row):
+        base    = self.baseline
+        crossed = []
+        if row["rss_bytes"] is not None and base["rss_bytes"] is not None and \
+                row["rss_bytes"] - base["rss_bytes"] > self.maxRssGrowth:
+            crossed.append(("rss", base["rss_bytes"], row["rss_bytes"]))
+        if row["qt_objects"] - base["qt_objects"] > self.maxQtGrowth:
+            crossed.append(("qt_objects", base["qt_objects"], row["qt_objects"]))
+        if base["tick_p95_ms"] > 0.0 and \
+                row["tick_p95_ms"] > base["tick_p95_ms"] * self.maxSlowdown:
+            crossed.append(("tick_p95", base["tick_p95_ms"], row["tick_p95_ms"]))
+        for name, first, value in crossed:
+            if name not in self.drift:
+                self.drift[name] = value
+                sys.stderr.write("Soak drift after {:.0f}s: {} went from {} to {}.\n"
+                                 .format(row["elapsed_seconds"], name, first, value))
+        return [name for name, _, _ in crossed]
+
+    def check(self):
+        '''
+        Raises a ``RuntimeError`` naming the thresholds that were crossed, if any.
+        '''
+        if self.drift:
+            raise RuntimeError("Soak drift: {}".format(", ".join(sorted(self.drift))))
+
+    def close(self):
+        '''
+        Takes a last sample, stops playing and closes the log.
+        '''
+        if self.stream.closed:
+            return
+        if self.ticks:
+            self.sample()
+        if self.timer is not None:
+            self.timer.stop()
+        self.pilot.close()
+        self.game.scene.removeObserver(self)
+        self.stream.close()
@@ -0,0 +1,391 @@
+'''
+The ``spectate`` module mirrors one game on any number of displays on the same machine,
+without running the game more than once.  A :class:`spectate.SpectatorServer`
+(``--spectate-server``) listens on a local socket like :class:`botapi.BotServer`, encodes
+the state of the game once per tick, and writes the very same bytes to every spectator.
+A :class:`spectate.SpectatorClient` reads the stream and keeps a copy of the state, which
+a :class:`spectate.SpectatorDriver` shows in a window (``--spectate``).
+
+The server sends a ``HELLO`` (magic ``b"CPSP"``, version, number of players, board width
+and height, seed, i.e. everything needed to generate the same board), then frames.  A
+frame is a ``FRAME`` header (kind, whether the game is running, size of the payload)
+followed by the payload.  All values are little endian.
+
++--------------+-----------------------------------------------------------------------+
+| Kind         | Payload                                                               |
++==============+=======================================================================+
+| ``KEYFRAME`` | A full snapshot (:func:`snapshot.capture`).                           |
++--------------+-----------------------------------------------------------------------+
+| ``DELTA``    | The delta of one tick (:class:`snapshot.DeltaEncoder`).               |
++--------------+-----------------------------------------------------------------------+
+
+A keyframe is encoded every :data:`constants.SPECTATE_KEYFRAME_TICKS` ticks, whenever a
+delta cannot express what happened (a lost life, a win), and whenever the game changed
+without ticking (paused, resumed or rewound).  A spectator that connects receives the
+latest keyframe and every delta since, so it catches up right away.  A spectator that
+does not keep up skips frames rather than slowing the game down: once more than
+``MAX_PENDING`` bytes are waiting to be written to it, it gets nothing until the next
+keyframe.
+
+Per tick the server encodes one delta (and one snapshot every keyframe interval) no
+matter how many spectators there are; every spectator only costs a write of the shared
+bytes.  ``benchmarks/spectate.py`` measures how the tick time grows with the number of
+spectators.
+'''
+
+import errno
+import socket
+import struct
+from timeit import default_timer
+
+from PyQt4 import QtCore, QtNetwork
+
+import constants
+import snapshot
+from model import SceneObserver
+from netplay import NetDriver
+
+__all__ = ["SpectatorServer", "SpectatorClient", "SpectatorDriver"]
+
+MAGIC   = b"CPSP"
+''' The first four bytes the server sends. '''
+
+VERSION = 1
+''' The version of the protocol spoken by :class:`spectate.SpectatorServer`. '''
+
+HELLO = struct.Struct("<4sHBddQ")
+FRAME = struct.Struct("<BBI")
+
+KEYFRAME = 1
+DELTA    = 2
+
+MAX_PENDING = 1 << 20
+''' A spectator with more than this many bytes not yet sent to it skips frames. '''
+
+READ_SIZE = 1 << 16
+''' How many bytes a :class:`spectate.SpectatorClient` reads at a time. '''
+
+
+class _Spectator(object):
+    '''
+    The server side state of one connected spectator.
+    '''
+    def __init__(self, connection):
+        self.connection    = connection
+        self.behind        = False
+        self.framesSkipped = 0
+
+
+class SpectatorServer(SceneObserver):
+    '''
+    Accepts spectators on the local socket ``name`` and streams ``game`` to them, see the
+    module documentation.
+
+    :Parameters:
+        ``game`` (:class:`controller.GameController`)
+            The game to stream.  Its scene must already have been generated, and it must
+            run on the Qt event loop.
+
+        ``name`` (str)
+            The name of the local socket.  On Unix this is a path, or a file name in the
+            temporary directory if it is not absolute; any stale socket is removed.
+
+        ``keyframeTicks`` (int)
+            The ticks between two keyframes, see
+            :data:`constants.SPECTATE_KEYFRAME_TICKS`.
+
+    :Attributes:
+        ``spectators`` (list)
+            The connected spectators.
+
+        ``frames`` (int), ``keyframes`` (int), ``bytesEncoded`` (int)
+            The frames encoded so far, how many of them were keyframes, and their size.
+    '''
+    def __init__(self, game, name, keyframeTicks=constants.SPECTATE_KEYFRAME_TICKS):
+        scene = game.scene
+        rect  = scene.sceneRect()
+
+        self.game          = game
+        self.keyframeTicks = max(1, keyframeTicks)
+        self.spectators    = []
+        self.hello         = HELLO.pack(MAGIC, VERSION, len(scene.players), rect.width(),
+                                        rect.height(), game.seed)
+        self.encoder       = snapshot.DeltaEncoder(game)
+        # The latest keyframe and every delta since, what a new spectator needs
+        self.backlog       = []
+        self.running       = game.gameRunning
+        self.frames        = 0
+        self.keyframes     = 0
+        self.bytesEncoded  = 0
+        self.__keyframe()
+
+        QtNetwork.QLocalServer.removeServer(name)
+        self.server = QtNetwork.QLocalServer()
+        if not self.server.listen(name):
+            raise RuntimeError(
+                "Unable to listen on [{}]: {}".format(name, self.server.errorString())
+            )
+        self.server.newConnection.connect(self.__accept)
+        # Pausing, resuming and rewinding happen between ticks
+        self.timer = QtCore.QTimer()
+        self.timer.timeout.connect(self.poll)
+        self.timer.start(game.settings.refreshRate)
+        scene.addObserver(self)
+
+    def fullServerName(self):
+        '''
+        :Return:
+            ``str``
+                The path (or pipe name) spectators connect to.
+        '''
+        return str(self.server.fullServerName())
+
+    def __accept(self):
+        catchUp = b"".join(self.backlog)
+        while self.server.hasPendingConnections():
+            connection = self.server.nextPendingConnection()
+            spectator  = _Spectator(connection)
+            self.spectators.append(spectator)
+            # Spectators have nothing to say
+            connection.readyRead.connect(connection.readAll)
+            connection.disconnected.connect(
+                lambda spectator=spectator: self.__drop(spectator)
+            )
+            connection.write(self.hello + catchUp)
+
+    def __drop(self, spectator):
+        if spectator in self.spectators:
+            self.spectators.remove(spectator)
+            spectator.connection.deleteLater()
+
+    def __keyframe(self):
+        data = snapshot.capture(self.game)
+        self.encoder.sync()
+        self.__publish(KEYFRAME, data)
+
+    def __publish(self, kind, payload):
+        running = self.game.gameRunning
+        frame   = FRAME.pack(kind, running, len(payload)) + payload
+        self.running       = running
+        self.frames       += 1
+        self.bytesEncoded += len(frame)
+        if kind == KEYFRAME:
+            self.keyframes += 1
+            self.backlog    = [frame]
+        else:
+            self.backlog.append(frame)
+
+        for spectator in self.spectators:
+            if spectator.behind and kind != KEYFRAME:
+                spectator.framesSkipped += 1
+                continue
+            connection = spectator.connection
+            if connection.bytesToWrite() > MAX_PENDING:
+                # A delta only applies to the frame before it, wait for a keyframe
+                spectator.behind         = True
+                spectator.framesSkipped += 1
+                continue
+            spectator.behind = False
+            connection.write(frame)
+
+    def tickFinished(self, scene):
+        delta = None
+        if scene.tick % self.keyframeTicks:
+            delta = self.encoder.encode()
+        if delta is None:
+            self.__keyframe()
+        else:
+            self.__publish(DELTA, delta)
+
+    def poll(self):
+        '''
+        Sends a keyframe if the game was paused, resumed or rewound since the last frame.
+        Called every ``settings.refreshRate`` milliseconds.
+        '''
+        game = self.game
+        if game.gameRunning != self.running or game.scene.tick != self.encoder.tick:
+            self.__keyframe()
+
+    def report(self):
+        '''
+        :Return:
+            ``dict``
+                The ``spectators`` connected, the ``frames`` and ``keyframes`` encoded,
+                ``bytesEncoded``, and the ``framesSkipped`` for spectators that did not
+                keep up.
+        '''
+        return {
+            "spectators": len(self.spectators), "frames": self.frames,
+            "keyframes": self.keyframes, "bytesEncoded": self.bytesEncoded,
+            "framesSkipped": sum(s.framesSkipped for s in self.spectators)
+        }
+
+    def close(self):
+        '''
+        Disconnects every spectator and stops listening.
+        '''
+        self.timer.stop()
+        self.game.scene.removeObserver(self)
+        for spectator in list(self.spectators):
+            spectator.connection.abort()
+            self.__drop(spectator)
+        self.server.close()
+
+
+class SpectatorClient(object):
+    '''
+    Connects to the :class:`spectate.SpectatorServer` at ``path``.  Like
+    :class:`botapi.BotClient` it only uses the standard library socket module and Unix
+    domain sockets: the constructor waits for the ``HELLO``, afterward nothing blocks.
+    Call :func:`spectate.SpectatorClient.poll` once per tick.
+
+    :Parameters:
+        ``path`` (str)
+            The socket to connect to, see
+            :func:`spectate.SpectatorServer.fullServerName`.
+
+        ``timeout`` (float)
+            How long to wait for the ``HELLO``.  A ``RuntimeError`` is raised if the
+            server does not answer, or is not a spectator server.
+
+    :Attributes:
+        ``numPlayers`` (int), ``width`` (float), ``height`` (float), ``seed`` (int)
+            The game of the server, see :class:`controller.CitizenPac`.
+
+        ``state`` (:class:`snapshot.State`)
+            The latest state of the game, ``None`` until the first keyframe arrived.
+
+        ``running`` (bool)
+            Whether the game is running.
+
+        ``closed`` (str)
+            Why the stream ended (the server quit), ``None`` while it has not.
+    '''
+    def __init__(self, path, timeout=constants.NET_TIMEOUT):
+        self.socket = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.socket.settimeout(timeout)
+        self.buffer = bytearray()
+        try:
+            self.socket.connect(path)
+            while len(self.buffer) < HELLO.size:
+                chunk = self.socket.recv(READ_SIZE)
+                if not chunk:
+                    raise socket.error("connection closed")
+                self.buffer += chunk
+        except (socket.timeout, socket.error) as e:
+            self.socket.close()
+            raise RuntimeError("No spectator server at [{}]: {}".format(path, e))
+        (magic, version, self.numPlayers, self.width, self.height,
+         self.seed) = HELLO.unpack_from(bytes(self.buffer[:HELLO.size]))
+        if magic != MAGIC or version != VERSION:
+            self.socket.close()
+            raise RuntimeError("Not a CitizenPac spectator server, or an unsupported "
+                               "version.")
+        del self.buffer[:HELLO.size]
+        self.socket.setblocking(False)
+
+        self.state          = None
+        self.running        = False
+        self.closed         = None
+        self.started        = default_timer()
+        self.frames         = 0
+        self.keyframes      = 0
+        self.bytesReceived  = HELLO.size
+
+    def poll(self):
+        '''
+        Applies every complete frame that arrived since the last call.
+
+        :Return:
+            ``bool``
+                Whether the state changed.
+        '''
+        if self.closed:
+            return False
+        while True:
+            try:
+                chunk = self.socket.recv(READ_SIZE)
+            except socket.error as e:
+                if e.args and e.args[0] in (errno.EAGAIN, errno.EWOULDBLOCK):
+                    break
+                self.closed = "Lost the spectator server: {}".format(e)
+                break
+            if not chunk:
+                self.closed = "The spectator server quit."
+                break
+            self.buffer        += chunk
+            self.bytesReceived += len(chunk)
+
+        changed = False
+        buffer  = self.buffer
+        offset  = 0
+        while len(buffer) - offset >= FRAME.size:
+            kind, running, size = FRAME.unpack_from(buffer, offset)
+            start = offset + FRAME.size
+            if len(buffer) - start < size:
+                break
+            offset       = start + size
+            self.frames += 1
+            if kind == KEYFRAME:
+                self.state      = snapshot.decode(bytes(buffer[start:offset]))
+                self.keyframes += 1
+            elif self.state is None:
+                continue
+            else:
+                tick = snapshot.DELTA.unpack_from(buffer, start)[0]
+                if tick != self.state.tick + 1:
+                    # The server skipped frames, wait for the next keyframe
+                    self.state = None
+                    continue
+                snapshot.applyDelta(self.state, buffer, start)
+            self.running = bool(running)
+            changed      = True
+        del buffer[:offset]
+        return changed
+
+    def send(self):
+        ''' Spectators do not play, nothing to send. '''
+        pass
+
+    def report(self):
+        '''
+        :Return:
+            ``dict``
+                ``seconds`` since connecting, ``frames`` and ``keyframes`` received,
+                ``bytes`` received and ``bytesPerSecond``.
+        '''
+        seconds = max(default_timer() - self.started, 1e-9)
+        return {
+            "seconds": seconds, "frames": self.frames, "keyframes": self.keyframes,
+            "bytes": self.bytesReceived, "bytesPerSecond": self.bytesReceived / seconds
+        }
+
+    def close(self):
+        self.socket.close()
+
+
+class SpectatorDriver(NetDriver):
+    '''
+    Shows the game of ``client`` in the window of ``game``, see
+    :class:`netplay.NetDriver`.  The keyboard cannot change the game: the scene's input
+    is locked, only ``<F3>`` (the performance overlay) still works.
+
+    :Parameters:
+        ``game`` (:class:`controller.CitizenPac`)
+            The window, created with the ``seed``, size and number of players of
+            ``client``.
+
+        ``client`` (:class:`spectate.SpectatorClient`)
+            The connection to the server.
+    '''
+    def __init__(self, game, client):
+        super(SpectatorDriver, self).__init__(game, client)
+        game.scene.inputLocked = True
+
+    def keyEvent(self, scene, key, pressed):
+        ''' The input is locked, nothing to do. '''
+        pass
+
+    def setStationary(self):
+        ''' Spectators do not move anything, nothing to do. '''
+        pass
@@ -0,0 +1,199 @@
+'''
+The ``tracing`` module measures where the time of every tick goes.  The phases of
+:func:`model.Scene.advance`, the score board updates and the painting of the view are
+wrapped in *spans*:
+
+.. code-block:: py
+
+   with self.tracer.span("wrapRelevantActors"):
+       self.wrapRelevantActors()
+
+By default :attr:`model.Scene.tracer` is :data:`tracing.NULL_TRACER`, whose spans do
+nothing at all.  Running the game with ``--trace FILE`` (or with the environment
+variable ``CITIZENPAC_TRACE=FILE``) installs a :class:`tracing.Tracer` instead, which
+writes every span to ``FILE`` in the Chrome trace event format on exit.  Open the file
+in https://ui.perfetto.dev or ``chrome://tracing``.
+'''
+
+import json
+import os
+import threading
+from timeit import default_timer
+
+from PyQt4 import QtCore
+
+try:
+    from threading import get_ident
+except ImportError:
+    # Python 2
+    from thread import get_ident
+
+__all__ = ["NULL_TRACER", "NullTracer", "Tracer", "PaintTracer"]
+
+MAX_EVENTS = 2000000
+''' A :class:`tracing.Tracer` stops recording after this many spans (a few hundred MB). '''
+
+
+class _NullSpan(object):
+    def __enter__(self):
+        return self
+
+    def __exit__(self, excType, excValue, tb):
+        return False
+
+
+class NullTracer(object):
+    '''
+    A tracer that records nothing, see :data:`tracing.NULL_TRACER`.
+    '''
+    enabled = False
+    NULL_SPAN = _NullSpan()
+
+    def span(self, name):
+        '''
+        :Return:
+            A context manager that does nothing.
+        '''
+        return self.NULL_SPAN
+
+    def close(self):
+        pass
+
+
+NULL_TRACER = NullTracer()
+''' The tracer used unless tracing was enabled. '''
+
+
+class _Span(object):
+    __slots__ = ["tracer", "name", "start"]
+
+    def __init__(self, tracer, name):
+        self.tracer = tracer
+        self.name   = name
+
+    def __enter__(self):
+        self.start = default_timer()
+        return self
+
+    def __exit__(self, excType, excValue, tb):
+        self.tracer.complete(self.name, self.start, default_timer())
+        return False
+
+
+class Tracer(object):
+    '''
+    Records spans in memory, and writes them to ``path`` in the Chrome trace event format
+    when :func:`tracing.Tracer.close` is called.
+
+    :Parameters:
+        ``path`` (str)
+            The JSON file to write.
+
+    :Attributes:
+        ``dropped`` (int)
+            The number of spans not recorded because :data:`tracing.MAX_EVENTS` was
+            reached.
+    '''
+    enabled = True
+
+    def __init__(self, path):
+        self.path    = path
+        self.origin  = default_timer()
+        self.events  = []
+        self.dropped = 0
+        self.threads = {}
+
+    def span(self, name):
+        '''
+        :Parameters:
+            ``name`` (str)
+                The name of the phase, shown on the span in the trace viewer.
+
+        :Return:
+            A context manager that records how long its body took.
+        '''
+        return _Span(self, name)
+
+    def complete(self, name, start, end):
+        '''
+        Records a span that has already finished.
+
+        :Parameters:
+            ``name`` (str)
+                The name of the phase.
+
+            ``start`` / ``end`` (float)
+                When it started and ended, in seconds of ``timeit.default_timer``.
+        '''
+        if len(self.events) >= MAX_EVENTS:
+            self.dropped += 1
+            return
+        tid = get_ident()
+        if tid not in self.threads:
+            self.threads[tid] = threading.current_thread().name
+        self.events.append((name, start, end, tid))
+
+    def close(self):
+        '''
+        Writes the recorded spans to ``self.path``.
+        '''
+        pid    = os.getpid()
+        origin = self.origin
+        events = [
+            {"name": "thread_name", "ph": "M", "pid": pid, "tid": tid,
+             "args": {"name": name}}
+            for tid, name in self.threads.items()
+        ]
+        for name, start, end, tid in self.events:
+            events.append({
+                "name": name, "cat": "citizenpac", "ph": "X", "pid": pid, "tid": tid,
+                "ts": (start - origin) * 1e6, "dur": (end - start) * 1e6
+            })
+        with open(self.path, "w") as f:
+            json.dump({"traceEvents": events, "displayTimeUnit": "ms",
+                       "otherData": {"dropped": self.dropped}}, f)
+
+
+class PaintTracer(QtCore.QObject):
+    '''
+    An event filter that times every paint of a :class:`PyQt4.QtGui.QGraphicsView`.
+    Install it on the view's viewport: it paints the viewport itself, between two
+    timestamps, instead of letting the event through.  Each paint is recorded as a
+    ``paint`` span, and reported to every callable in ``listeners`` as
+    ``listener(start, end)``.  The callables in ``startListeners`` are called without
+    arguments right before painting.
+
+    :Parameters:
+        ``view`` (:class:`PyQt4.QtGui.QGraphicsView`)
+            The view being painted.
+
+        ``tracer`` (:class:`tracing.Tracer`)
+            The tracer to record to, may be :data:`tracing.NULL_TRACER`.
+
+    :Attributes:
+        ``listeners`` (list)
+            The callables to report every paint to.
+
+        ``startListeners`` (list)
+            The callables to notify when a paint starts.
+    '''
+    def __init__(self, view, tracer, parent=None):
+        super(PaintTracer, self).__init__(parent)
+        self.view      = view
+        self.tracer    = tracer
+        self.listeners      = []
+        self.startListeners = []
+
+    def eventFilter(self, obj, event):
+        if event.type() != QtCore.QEvent.Paint:
+            return False
+        for listener in self.startListeners:
+            listener()
+        start = default_timer()
+        self.view.viewportEvent(event)
+        end   = default_timer()
+        if self.tracer.enabled:
+            self.tracer.complete("paint", start, end)
+        for listener in self.listeners:
+            listener(start, end)
+        return True
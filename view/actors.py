@@ -36,6 +36,9 @@ class Actor(QtGui.QGraphicsItem):
             The starting location :math:`c_y` of this Actor, saved so that the game can
             be reset.
 
+        ``settings`` (:class:`model.Settings`)
+            The settings of the scene, e.g. the current game speed.
+
     The coordinate :math:`(c_x, c_y)` represents the **center** of the Actor's starting
     location, and should never change.  To acquire the *current* position of the actor,
     use the ``x()`` and ``y()`` methods respectively, these methods are inherited from
@@ -58,6 +61,7 @@ class Actor(QtGui.QGraphicsItem):
         self.cx        = cx
         self.cy        = cy
         self.scene     = scene
+        self.settings  = scene.settings
         self.moveFlags = constants.STATIONARY
 
     def boundingRect(self):
@@ -200,17 +204,80 @@ class Actor(QtGui.QGraphicsItem):
             # Using the computed move direction, update the position.
             
             currPos = QtCore.QPointF(self.x(), self.y())
-            self.setPos(currPos + constants.gameSpeed * move)
+            self.setPos(currPos + self.settings.gameSpeed * move)
             self.update()
 
 
+class FoodAnimation(object):
+    '''
+    The "chomping" animation shared by every :class:`view.actors.Food` in a scene.  All
+    of the Food is created at the same time and reset at the same time, so the sweep
+    angles of every Food are always identical.  Rather than advancing (and storing) the
+    same three numbers once per Food, the :class:`model.Scene` owns one instance of this
+    class and advances it once per tick.
+
+    :Attributes:
+        ``outerSweep`` (float)
+            The sweep angle (in degrees) of the outer arc.
+
+        ``innerSweep`` (float)
+            The sweep angle (in degrees) of the inner arc.
+
+        ``decreasing`` (bool)
+            Whether the outer arc is currently shrinking (and the inner arc growing).
+    '''
+    def __init__(self):
+        self.outerSweep = 360.0
+        self.innerSweep = 0.0
+        self.decreasing = True
+
+    def advance(self):
+        '''
+        Advances the animation by one tick.
+        '''
+        # If decreasing, reduce outer radius and increase inner radius
+        if self.decreasing:
+            self.outerSweep -= 1.0
+            self.innerSweep += 1.0
+            if self.outerSweep <= 0.0:
+                self.decreasing = False
+        # Otherwise, reverse: increase outer radius and decrease inner radius
+        else:
+            self.outerSweep += 1.0
+            self.innerSweep -= 1.0
+            if self.outerSweep >= 360.0:
+                self.decreasing = True
+
+    def reset(self):
+        '''
+        Sets ``self.decreasing`` to ``False``, "restarting" the animation of the Food.
+        '''
+        self.decreasing = False
+
+
 class Food(Actor):
     '''
     Animated food.
+
+    Whether or not a Food has been eaten is **not** stored on the Food itself, it is the
+    entry ``scene.foodEatenMask[self.index]``.  Eaten Food is simply not painted, which
+    allows the whole board to be restored (e.g. :func:`model.Scene.reset`) without
+    touching every Food.  The animation is shared, see :class:`view.actors.FoodAnimation`.
+
+    :Attributes:
+        ``index`` (int)
+            The position of this Food in ``scene.food``, assigned by
+            :func:`model.Scene.registerActor`.
+
+        ``animation`` (:class:`view.actors.FoodAnimation`)
+            The animation shared with all other Food in the scene.
     '''
     def __init__(self, scene, cx, cy, color, radius):
         super(Food, self).__init__(scene, cx, cy)
 
+        self.index     = -1
+        self.animation = scene.foodAnimation
+
         self.outerRadius = radius
         self.innerRadius = 0.5 * self.outerRadius
 
@@ -220,10 +287,6 @@ class Food(Actor):
         blue  = 255 - color.blue()
         self.innerColor = QtGui.QColor(red, green, blue)
 
-        self.outerSweep = 360.0
-        self.innerSweep = 0.0
-        self.decreasing = True
-
         self.innerBoundingRect = self.computeBoundingRect(self.innerRadius)
         self.outerBoundingRect = self.computeBoundingRect(self.outerRadius)
 
@@ -241,13 +304,27 @@ class Food(Actor):
         # Return the bounding rectangle
         return QtCore.QRectF(topLeft, bottomRight)
 
+    def isEaten(self):
+        '''
+        Returns whether or not this Food has been eaten.
+
+        :Return:
+            ``bool``
+                ``True`` if CitizenPac has eaten this Food, ``False`` otherwise.
+        '''
+        return self.scene.foodEatenMask[self.index] != 0
+
     def boundingRect(self):
         return self.outerBoundingRect
 
     def paint(self, painter, option, widget):
+        # Eaten food is still part of the scene, it just is not drawn
+        if self.scene.foodEatenMask[self.index]:
+            return
+
         # Paint the outer path first
         outerPath = QtGui.QPainterPath()
-        outerPath.arcTo(self.outerBoundingRect, self.startAngle, self.outerSweep)
+        outerPath.arcTo(self.outerBoundingRect, self.startAngle, self.animation.outerSweep)
         # outerPath.addEllipse(self.outerBoundingRect)
         outerPath.closeSubpath()
         painter.setBrush(self.outerColor)
@@ -255,45 +332,12 @@ class Food(Actor):
 
         # Paint the inner path second
         innerPath = QtGui.QPainterPath()
-        innerPath.arcTo(self.innerBoundingRect, self.startAngle, self.innerSweep)
+        innerPath.arcTo(self.innerBoundingRect, self.startAngle, self.animation.innerSweep)
         # innerPath.addEllipse(self.innerBoundingRect)
         innerPath.closeSubpath()
         painter.setBrush(self.innerColor)
         painter.drawPath(innerPath)
 
-    def advance(self, phase):
-        if phase == 1:
-            # If decreasing, reduce outer radius and increase inner radius
-            if self.decreasing:
-                self.outerSweep -= 1.0
-                self.innerSweep += 1.0
-                if self.outerSweep == 0.0:
-                    self.decreasing = False
-            # Otherwise, reverse: increase outer radius and decrease inner radius
-            else:
-                self.outerSweep += 1.0
-                self.innerSweep -= 1.0
-                if self.outerSweep == 360.0:
-                    self.decreasing = True
-
-            self.update()
-
-    def reset(self):
-        '''
-        This method resets the ``self.innerRadius`` and ``self.outerRadius`` to the
-        initial starting positions, and sets ``self.decreasing`` to ``False``, thus
-        "restarting" the animation of the Food.
-
-        After, it calls the ``super`` class ``reset`` method
-        (:func:`view.actors.Actor.reset`) so that the position will be reset as well.
-        This is necessary, for example, if you wanted to incorporate moving Food into
-        the game as well.
-        '''
-        self.outerRadius = 360.0
-        self.innerRadius = 0.0
-        self.decreasing  = False
-        super(Food, self).reset()
-
 
 class SplineDrawer(Actor):
     '''
@@ -448,7 +492,8 @@ class GhostActor(SplineDrawer):
     GHOST_MOVE_TIME = 1000
     '''
     How frequently a GhostActor should randomly change its direction.  This time is
-    specified in milliseconds, i.e. ``1000`` means **1 second**.
+    specified in milliseconds, i.e. ``1000`` means **1 second**.  It is the default of
+    ``ghostMoveTime`` in :class:`model.Settings`, which is what the Ghosts use.
     '''
 
     def __init__(self, scene, cx, cy, sx, sy):
@@ -456,7 +501,7 @@ class GhostActor(SplineDrawer):
         self.moveFlags = constants.STATIONARY
         self.moveTimer = QtCore.QTimer()
         self.moveTimer.timeout.connect(self.timerEvent)
-        self.moveTimer.start(GhostActor.GHOST_MOVE_TIME)
+        self.moveTimer.start(self.settings.ghostMoveTime)
 
     def timerEvent(self):
         # shuffle so there is no direction bias
@@ -504,7 +549,7 @@ class CitizenPacActor(SplineDrawer):
         '''
         # Grab the current coordinates, call the student move code, then
         # calculate what their move direction was
-        if phase == 1 and not constants.FULL_GAME_MODE:
+        if phase == 1 and not self.settings.fullGameMode:
             if phase == 1:
                 sx = self.x()
                 sy = self.y()
@@ -552,10 +597,10 @@ class CitizenPacActor(SplineDrawer):
                 (x = {:4.1f}, y = {:4.1f})
 
             Recall that the game speed affects this directly!  The current gameSpeed
-            from constants.py is:
+            from the scene's settings is:
 
                 {:4.4f}
             {}
         '''.format(stationary, nx, ny, north, sx, sy, south,
                    ex, ey, east, wx, wy, west,
-                   self.mx, self.my, constants.gameSpeed, "*" * 44)))
+                   self.mx, self.my, self.settings.gameSpeed, "*" * 44)))
@@ -5,8 +5,10 @@ The primary display interfaces.
 # FILE VERSION: released 5/5/2017 @ 13:00
 
 import random
+from timeit import default_timer
 from PyQt4 import QtCore, QtGui
 
+import constants
 from qt_configs import Ui_CitizenPacMainWindow
 
 
@@ -149,3 +151,94 @@ class GameStats(object):
                 The value to display on the game ``scoreBoard``.
         '''
         self.numLives.display(float(val))
+
+
+class PerfOverlay(QtGui.QGraphicsSimpleTextItem):
+    '''
+    The performance overlay, toggled with ``<F3>``: ticks and paints per second, the
+    rolling 50th / 95th / 99th percentile of the tick and paint times against the
+    budget of one tick (``settings.refreshRate`` of the scene), and how many items are
+    in the scene.
+
+    Painting it costs next to nothing: the text is only recomputed every
+    :data:`constants.PERF_OVERLAY_REFRESH` milliseconds, and in between the item is
+    drawn from a cached pixmap.  It turns red when the 95th percentiles of a tick and a
+    paint together exceed the budget.
+
+    :Parameters:
+        ``scene`` (:class:`model.Scene`)
+            The scene being measured.  The overlay still needs to be added to it.
+
+    :Attributes:
+        ``monitor`` (:class:`perfstats.PerfMonitor`)
+            Where the measurements come from while the overlay is shown.
+    '''
+    def __init__(self, scene):
+        super(PerfOverlay, self).__init__()
+        self.gameScene = scene
+        self.monitor   = None
+        self.lastTime  = 0.0
+        self.lastTicks = 0
+        self.lastPaint = 0
+
+        self.setFlag(QtGui.QGraphicsItem.ItemIgnoresTransformations)
+        self.setCacheMode(QtGui.QGraphicsItem.DeviceCoordinateCache)
+        self.setZValue(1000.0)
+        self.setFont(QtGui.QFont("mono", 11))
+        self.hide()
+
+        self.refreshTimer = QtCore.QTimer()
+        self.refreshTimer.setInterval(constants.PERF_OVERLAY_REFRESH)
+        self.refreshTimer.timeout.connect(self.refresh)
+
+    def start(self, monitor):
+        '''
+        Shows the overlay, and starts refreshing it from ``monitor``.
+        '''
+        self.monitor   = monitor
+        self.lastTime  = default_timer()
+        self.lastTicks = monitor.ticks
+        self.lastPaint = monitor.paints
+        self.refresh()
+        self.show()
+        self.refreshTimer.start()
+
+    def stop(self):
+        '''
+        Hides the overlay.
+        '''
+        self.refreshTimer.stop()
+        self.hide()
+        self.monitor = None
+
+    def refresh(self):
+        '''
+        Recomputes the text from the measurements since the previous refresh.
+        '''
+        monitor = self.monitor
+        scene   = self.gameScene
+        now     = default_timer()
+        elapsed = max(now - self.lastTime, 1e-6)
+        tps     = (monitor.ticks  - self.lastTicks) / elapsed
+        fps     = (monitor.paints - self.lastPaint) / elapsed
+        self.lastTime, self.lastTicks, self.lastPaint = now, monitor.ticks, monitor.paints
+
+        tick   = [t * 1000.0 for t in monitor.tickTimes.percentiles(50, 95, 99)]
+        paint  = [t * 1000.0 for t in monitor.paintTimes.percentiles(50, 95, 99)]
+        budget = float(scene.settings.refreshRate)
+        self.setText("\n".join([
+            "{:6.1f} ticks/s {:6.1f} paints/s   budget {:.0f} ms".format(tps, fps, budget),
+            "tick  p50 {:6.2f} p95 {:6.2f} p99 {:6.2f} ms".format(*tick),
+            "paint p50 {:6.2f} p95 {:6.2f} p99 {:6.2f} ms".format(*paint),
+            "items {}  food {}/{}  ghosts {}".format(
+                len(scene.items()), len(scene.food) - scene.numFoodEaten(), len(scene.food),
+                len(scene.ghosts)
+            )
+        ]))
+
+        if tick[1] + paint[1] > budget:
+            self.setBrush(QtGui.QBrush(QtGui.QColor(255, 64, 64)))
+        else:
+            self.setBrush(QtGui.QBrush(QtGui.QColor(64, 255, 64)))
+        bounds = scene.sceneRect()
+        self.setPos(bounds.left(), bounds.top())